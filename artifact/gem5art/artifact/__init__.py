@@ -26,15 +26,25 @@
 
 """This is the gem5 artifact package"""
 
-from .artifact import Artifact
+from .artifact import Artifact, ArtifactRecord
 from .common_queries import getByName, getDiskImages, getLinuxBinaries, getgem5Binaries
+from .common_queries import getAncestors, getDescendants
+from .common_queries import getRecordsByName, getRecordsByType
 from ._artifactdb import getDBConnection
+from ._artifactcache import ArtifactCache, getArtifactCache
 
 __all__ = [
     "Artifact",
+    "ArtifactRecord",
     "getByName",
     "getDiskImages",
     "getLinuxBinaries",
     "getgem5Binaries",
+    "getAncestors",
+    "getDescendants",
+    "getRecordsByName",
+    "getRecordsByType",
     "getDBConnection",
+    "ArtifactCache",
+    "getArtifactCache",
     ]
@@ -0,0 +1,200 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file defines a node-local cache of the files of artifacts.
+
+Many workers on the same node often use the same kernels, disk images, and
+gem5 binaries. The cache keeps one local copy of each file, named by the
+artifact's hash, and evicts the least recently used files when the cache is
+larger than its byte budget.
+
+The cache can be shared by many processes. It uses three kinds of locks
+(see flock(2)), all of which are released automatically if a process dies:
+- <hash>.fetch: held exclusively while fetching a file into the cache, so
+  that concurrent workers don't fetch the same file twice.
+- <hash>.lock: held shared while a file is in use. Eviction skips files
+  which are in use.
+- .evict: held exclusively while evicting.
+"""
+
+from contextlib import contextmanager
+import fcntl
+import os
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+from ._artifactdb import getDBConnection
+from ._sparse import sparseCopy
+from .artifact import Artifact, getHash
+
+class ArtifactCache:
+    """
+    A node-local cache of artifact files stored in a directory.
+
+    max_bytes is the budget for the (allocated) size of all of the cached
+    files. If it is 0, nothing is ever evicted.
+    """
+
+    path: Path
+    max_bytes: int
+
+    def __init__(self, path: Union[str, Path], max_bytes: int = 0) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok = True)
+
+    @contextmanager
+    def open(self, artifact: Artifact, cwd: str = '.',
+             executable: bool = False) -> Iterator[Path]:
+        """Returns the path of the cached copy of the artifact's file,
+        fetching it first if it is not in the cache. The file will not be
+        evicted until the context exits.
+
+        The file is copied from the artifact's path (relative to cwd) if it
+        exists on this node and has the right hash. Otherwise, it is
+        downloaded from the database. The hash of the file is checked before
+        it is added to the cache.
+
+        The cached copy is executable if executable is true (e.g., for the
+        gem5 binary) or if the local file is executable.
+        """
+        entry = self.path / artifact.hash
+        with open(self.path / f'{artifact.hash}.lock', 'a') as use_lock:
+            while True:
+                if not entry.exists():
+                    self._fetch(artifact, entry, cwd, executable)
+                fcntl.flock(use_lock, fcntl.LOCK_SH)
+                if entry.exists():
+                    break
+                # The file was evicted before we locked it
+                fcntl.flock(use_lock, fcntl.LOCK_UN)
+
+            if executable and not os.access(entry, os.X_OK):
+                # Cached by a user which did not execute it
+                os.chmod(entry, 0o555)
+
+            # Keep track of the last use for the LRU policy
+            os.utime(entry)
+            self.evict()
+            try:
+                yield entry
+            finally:
+                fcntl.flock(use_lock, fcntl.LOCK_UN)
+
+    def _fetch(self, artifact: Artifact, entry: Path, cwd: str,
+               executable: bool) -> None:
+        """Copy the file for the artifact into the cache."""
+        with open(self.path / f'{artifact.hash}.fetch', 'a') as fetch_lock:
+            fcntl.flock(fetch_lock, fcntl.LOCK_EX)
+            if entry.exists():
+                # Someone else fetched it while we were waiting
+                return
+
+            tmp = self.path / f'{artifact.hash}.{os.getpid()}.tmp'
+            try:
+                src = Path(cwd) / artifact.path
+                copied = False
+                if src.is_file():
+                    executable = executable or os.access(src, os.X_OK)
+                    sparseCopy(src, tmp)
+                    copied = getHash(tmp) == artifact.hash
+                if not copied:
+                    # The local file is missing or has changed
+                    if tmp.exists():
+                        os.remove(tmp)
+                    tmp.touch()
+                    getDBConnection().downloadFile(artifact._id, tmp)
+                    if getHash(tmp) != artifact.hash:
+                        raise Exception(f"Cannot cache {artifact.name}: the "
+                                        f"hash of the fetched file does not "
+                                        f"match")
+
+                # Cached files are shared and should never change
+                os.chmod(tmp, 0o555 if executable else 0o444)
+                os.replace(tmp, entry)
+            finally:
+                if tmp.exists():
+                    os.remove(tmp)
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        """Returns (last use, allocated size, path) for each cached file."""
+        entries = []
+        for p in self.path.iterdir():
+            if '.' in p.name:
+                # Lock files and in-progress fetches
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_blocks * 512, p))
+        return entries
+
+    def size(self) -> int:
+        """Returns the allocated size in bytes of all of the cached files."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """Removes the least recently used files which are not in use until
+        the cache fits in max_bytes."""
+        if not self.max_bytes:
+            return
+        with open(self.path / '.evict', 'a') as evict_lock:
+            fcntl.flock(evict_lock, fcntl.LOCK_EX)
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, p in entries:
+                if total <= self.max_bytes:
+                    break
+                with open(self.path / f'{p.name}.lock', 'a') as use_lock:
+                    try:
+                        fcntl.flock(use_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        # This file is in use
+                        continue
+                    os.remove(p)
+                    total -= size
+
+_cache: Optional[ArtifactCache] = None
+
+def getArtifactCache() -> Optional[ArtifactCache]:
+    """Returns the node-local artifact cache or None if it is disabled.
+
+    The cache is enabled by setting the environment variable GEM5ART_CACHE to
+    the directory of the cache. The environment variable GEM5ART_CACHE_SIZE
+    sets the budget in bytes for the cache (default: no limit).
+    """
+    global _cache
+
+    path = os.environ.get("GEM5ART_CACHE", "")
+    if not path:
+        return None
+
+    if _cache is None or _cache.path != Path(path):
+        _cache = ArtifactCache(path,
+                               int(os.environ.get("GEM5ART_CACHE_SIZE", "0")))
+
+    return _cache
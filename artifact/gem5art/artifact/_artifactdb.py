@@ -36,15 +36,24 @@ Some common queries can be found in common_queries.py
 
 from abc import ABC, abstractmethod
 
+from contextlib import contextmanager
 import copy
+from datetime import timezone
+import hashlib
+import itertools
 import json
 import os
 from pathlib import Path
-import shutil
-from typing import Any, Dict, Iterable, Union, Type, List, Tuple
+import re
+import tempfile
+import threading
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, \
+    Optional, Union, Type, List, Tuple, cast
 from urllib.parse import urlparse
 from uuid import UUID
 
+from ._sparse import SparseReader, SparseWriter, sparseCopy
+
 try:
     import gridfs # type: ignore
     from pymongo import MongoClient # type: ignore
@@ -53,6 +62,14 @@ except ModuleNotFoundError:
     # If pymongo isn't installed, then disable support for it
     MONGO_SUPPORT = False
 
+# The maximum number of stats values in one document of dumps in MongoDB.
+# Documents are limited to 16 MB and each value takes about 16 bytes.
+_DUMP_CHUNK_VALUES = 256 * 1024
+
+def _schemaHash(names: List[str]) -> str:
+    """Returns the key of a list of stats names (see ArtifactDB.putStats)."""
+    return hashlib.md5('\n'.join(names).encode()).hexdigest()
+
 class ArtifactDB(ABC):
     """
     Abstract base class for all artifact DBs.
@@ -68,11 +85,76 @@ class ArtifactDB(ABC):
         """Insert the artifact into the database with the key"""
         pass
 
+    def putMany(self, artifacts: Iterable[Dict[str,Union[str,UUID]]]) -> None:
+        """Insert many artifacts into the database. Each artifact is keyed
+        by its _id. Implementations may override this to use a single
+        round trip to the database."""
+        for artifact in artifacts:
+            assert isinstance(artifact['_id'], UUID)
+            self.put(artifact['_id'], artifact)
+
     @abstractmethod
     def upload(self, key: UUID, path: Path) -> None:
         """Upload the file at path to the database with _id of key"""
         pass
 
+    @contextmanager
+    def openUploadStream(self, key: UUID, filename: str) -> Iterator[BinaryIO]:
+        """Returns a writable stream whose data is stored in the database as
+        the file with _id of key when the context exits. If the context
+        exits with an exception, nothing is stored.
+
+        By default the data is written to a temporary file which is passed
+        to upload(). Implementations may override this to avoid the copy.
+        """
+        with tempfile.NamedTemporaryFile(suffix=f'-{Path(filename).name}') \
+                as f:
+            yield f # type: ignore
+            f.flush()
+            self.upload(key, Path(f.name))
+
+    def storesFiles(self) -> bool:
+        """Returns true if the files which are uploaded can be downloaded
+        later."""
+        return True
+
+    def openFile(self, key: UUID) -> BinaryIO:
+        """Returns a seekable, read-only file object for the file with the _id
+        key. Only the parts of the file which are read are fetched from the
+        database. Note: Not all DB implementations will implement this
+        function"""
+        raise NotImplementedError()
+
+    def deleteFile(self, key: UUID) -> None:
+        """Delete the file with the _id key if there is one. Note: Not all DB
+        implementations will implement this function"""
+        raise NotImplementedError()
+
+    def listFiles(self) -> Iterable[Tuple[UUID, int, float]]:
+        """Returns an iterable of the _id, size in bytes, and upload time of
+        every stored file. Note: Not all DB implementations will implement
+        this function"""
+        raise NotImplementedError()
+
+    def delete(self, key: UUID) -> None:
+        """Delete the document with the _id key (but not its file). Note: Not
+        all DB implementations will implement this function"""
+        raise NotImplementedError()
+
+    def deleteMany(self, keys: Iterable[UUID]) -> None:
+        """Delete the documents with the _ids keys. Implementations may
+        override this to use a single round trip to the database."""
+        for key in keys:
+            self.delete(key)
+
+    def scan(self, fields: Optional[List[str]] = None
+             ) -> Iterable[Dict[str, Any]]:
+        """Returns an iterable of all of the documents in the database. If
+        fields is given, the documents may only have those fields (and
+        _id). Note: Not all DB implementations will implement this
+        function"""
+        raise NotImplementedError()
+
     @abstractmethod
     def __contains__(self, key: Union[UUID, str]) -> bool:
         """Key can be a UUID or a string. Returns true if item in DB"""
@@ -85,6 +167,13 @@ class ArtifactDB(ABC):
         """
         pass
 
+    def getByHashes(self, hashes: Iterable[str]) -> Dict[str, Dict[str,str]]:
+        """Returns a dictionary mapping each hash that is in the database to
+        a dictionary to construct an artifact. Hashes that are not in the
+        database are not included. Implementations may override this to use
+        a single round trip to the database."""
+        return {h: self.get(h) for h in set(hashes) if h in self}
+
     @abstractmethod
     def downloadFile(self, key: UUID, path: Path) -> None:
         """Download the file with the _id key to the path. Will overwrite the
@@ -115,6 +204,84 @@ class ArtifactDB(ABC):
         this function"""
         raise NotImplementedError()
 
+    def getAncestors(self, key: UUID, depth: int = 0) -> List[Dict[str, Any]]:
+        """Returns a list of all documents that the document with _id key
+        was (transitively) derived from through its inputs. The documents
+        are ordered by their distance from key. Depth specifies the maximum
+        number of input edges to follow (0 for no limit). Note: Not all DB
+        implementations will implement this function"""
+        raise NotImplementedError()
+
+    def getDescendants(self, key: UUID, depth: int = 0) -> List[Dict[str, Any]]:
+        """Returns a list of all documents that (transitively) have the
+        document with _id key as an input. The documents are ordered by their
+        distance from key. Depth specifies the maximum number of input edges
+        to follow (0 for no limit). Note: Not all DB implementations will
+        implement this function"""
+        raise NotImplementedError()
+
+    def putStats(self, key: UUID, name: str, names: List[str],
+                 dumps: List[List[Optional[float]]]) -> None:
+        """Store the stats of the run with _id key and the given name.
+        names is the list of the stats and dumps has a row of values (in the
+        same order as names) for each stats dump. The list of names is
+        stored once for all of the runs which have the same stats. Note: Not
+        all DB implementations will implement this function"""
+        raise NotImplementedError()
+
+    def getStats(self, key: UUID) -> Optional[Dict[str, Any]]:
+        """Returns the stats of the run with _id key as a dictionary with
+        the "names" and "dumps" given to putStats, or None if there are no
+        stats for the run. Note: Not all DB implementations will implement
+        this function"""
+        raise NotImplementedError()
+
+    def deleteStats(self, key: UUID) -> None:
+        """Delete the stats of the run with _id key. Note: Not all DB
+        implementations will implement this function"""
+        raise NotImplementedError()
+
+    def getStatsNames(self) -> List[str]:
+        """Returns the sorted names of all of the stats of all of the runs.
+        Note: Not all DB implementations will implement this function"""
+        raise NotImplementedError()
+
+    def searchStats(self, names: Iterable[str], name_like: str = '',
+                    keys: Optional[Iterable[UUID]] = None
+                    ) -> Iterable[Dict[str, Any]]:
+        """Returns an iterable with a dictionary for each run with stats
+        whose name matches the regex name_like and (if keys is given) whose
+        _id is in keys. Each dictionary has the "_id" and "name" of the run
+        and "stats", which maps each of the names that the run has to its
+        values in each dump. Note: Not all DB implementations will implement
+        this function"""
+        raise NotImplementedError()
+
+    def putLiveResults(self, key: UUID, name: str,
+                       delta: Dict[str, Any]) -> None:
+        """Store a delta of the results of the running run with _id key and
+        the given name. The deltas are ordered by their "seq". If the delta
+        has "names" (of stats), they are stored once like in putStats. Note:
+        Not all DB implementations will implement this function"""
+        raise NotImplementedError()
+
+    def getLiveResults(self, key: UUID) -> List[Dict[str, Any]]:
+        """Returns the deltas of the run with _id key in order. Note: Not all
+        DB implementations will implement this function"""
+        raise NotImplementedError()
+
+    def searchLiveResults(self, name_like: str = ''
+                          ) -> Iterable[Dict[str, Any]]:
+        """Returns an iterable with the "_id" and "name" of each run with
+        deltas whose name matches the regex name_like. Note: Not all DB
+        implementations will implement this function"""
+        raise NotImplementedError()
+
+    def deleteLiveResults(self, key: UUID) -> None:
+        """Delete the deltas of the run with _id key. Note: Not all DB
+        implementations will implement this function"""
+        raise NotImplementedError()
+
 
 
 class ArtifactMongoDB(ArtifactDB):
@@ -127,6 +294,20 @@ class ArtifactMongoDB(ArtifactDB):
     - files and chunks: These two collections store the large files required
       for some artifacts. Within the files collection, the _id is the
       UUID of the artifact.
+
+    The stats of runs (see putStats) are stored in three more collections:
+    - stats: The name and the schema of the stats of each run. The _id is
+      the UUID of the run.
+    - stats_dumps: The values of the stats. Each document has the rows of
+      a few consecutive dumps (bounded by _DUMP_CHUNK_VALUES values, so that
+      runs with many dumps never go over the size limit of a document), the
+      run_id, and the index of its first dump (seq).
+    - stats_schemas: The names of the stats, shared by all of the runs with
+      the same stats. The _id is a hash of the names.
+
+    The deltas of the results of running runs (see putLiveResults) are
+    stored in the live_results collection. The run_id field is the UUID of
+    the run.
     """
 
     def __init__(self, uri :str) -> None:
@@ -140,17 +321,79 @@ class ArtifactMongoDB(ArtifactDB):
         self.db = MongoClient(host=uri, connect=False).artifact_database
         self.artifacts = self.db.artifacts
         self.fs = gridfs.GridFSBucket(self.db, disable_md5=True)
+        self.stats = self.db.stats
+        self.stats_dumps = self.db.stats_dumps
+        self.stats_schemas = self.db.stats_schemas
+        self._stats_indexed = False
+        self.live_results = self.db.live_results
 
     def put(self, key: UUID, artifact: Dict[str,Union[str,UUID]]) -> None:
         """Insert the artifact into the database with the key"""
         assert artifact['_id'] == key
         self.artifacts.insert_one(artifact)
 
+    def putMany(self, artifacts: Iterable[Dict[str,Union[str,UUID]]]) -> None:
+        """Insert many artifacts into the database with one round trip"""
+        artifacts = list(artifacts)
+        if artifacts:
+            self.artifacts.insert_many(artifacts)
+
     def upload(self, key: UUID, path: Path) -> None:
-        """Upload the file at path to the database with _id of key"""
-        with open(path, 'rb') as f:
+        """Upload the file at path to the database with _id of key.
+        The holes in sparse files are not read from the disk."""
+        with SparseReader(path) as f:
             self.fs.upload_from_stream_with_id(key, str(path), f)
 
+    @contextmanager
+    def openUploadStream(self, key: UUID, filename: str) -> Iterator[BinaryIO]:
+        """Returns a GridFS stream for the file with _id of key. The chunks
+        are sent to the database as they are written."""
+        stream = self.fs.open_upload_stream_with_id(key, filename)
+        try:
+            yield cast(BinaryIO, stream)
+        except BaseException:
+            stream.abort()
+            raise
+        stream.close()
+
+    def openFile(self, key: UUID) -> BinaryIO:
+        """Returns a GridFS stream for the file with the _id key. Seeking
+        and reading only fetch the chunks which are needed."""
+        return self.fs.open_download_stream(key)
+
+    def deleteFile(self, key: UUID) -> None:
+        """Delete the file with the _id key and all of its chunks."""
+        try:
+            self.fs.delete(key)
+        except gridfs.errors.NoFile:
+            pass
+
+    def listFiles(self) -> Iterable[Tuple[UUID, int, float]]:
+        """Returns the _id, size, and upload time of every file in GridFS.
+        Only the files collection is read."""
+        for f in self.fs.find({}, no_cursor_timeout=True):
+            # pymongo returns naive datetimes in UTC
+            uploaded = f.upload_date.replace(tzinfo=timezone.utc)
+            yield f._id, f.length, uploaded.timestamp()
+
+    def delete(self, key: UUID) -> None:
+        """Delete the document with the _id key."""
+        self.artifacts.delete_one({'_id': key})
+
+    def deleteMany(self, keys: Iterable[UUID]) -> None:
+        """Delete the documents with the _ids keys with one round trip."""
+        keys = list(keys)
+        if keys:
+            self.artifacts.delete_many({'_id': {'$in': keys}})
+
+    def scan(self, fields: Optional[List[str]] = None
+             ) -> Iterable[Dict[str, Any]]:
+        """Returns an iterable of all of the documents. Only the fields
+        are sent from the database if they are given."""
+        for d in self.artifacts.find({}, projection=fields,
+                                     no_cursor_timeout=True):
+            yield d
+
     def __contains__(self, key: Union[UUID, str]) -> bool:
         """Key can be a UUID or a string. Returns true if item in DB"""
         if isinstance(key, UUID):
@@ -171,10 +414,19 @@ class ArtifactMongoDB(ArtifactDB):
             # This is a hash.
             return self.artifacts.find_one({'hash': key}, limit = 1)
 
+    def getByHashes(self, hashes: Iterable[str]) -> Dict[str, Dict[str,str]]:
+        """Returns a dictionary mapping each hash that is in the database to
+        a dictionary to construct an artifact. Uses one query."""
+        found: Dict[str, Dict[str,str]] = {}
+        for d in self.artifacts.find({'hash': {'$in': list(set(hashes))}}):
+            found.setdefault(d['hash'], d)
+        return found
+
     def downloadFile(self, key: UUID, path: Path) -> None:
         """Download the file with the _id key to the path. Will overwrite the
-        file if it currently exists."""
-        with open(path, 'wb') as f:
+        file if it currently exists. Blocks of zeros are not written so that
+        the file is sparse."""
+        with SparseWriter(path) as f:
             self.fs.download_to_stream(key, f)
 
     def searchByName(self, name: str, limit: int) -> Iterable[Dict[str, Any]]:
@@ -206,6 +458,172 @@ class ArtifactMongoDB(ArtifactDB):
         for d in data:
             yield d
 
+    def putStats(self, key: UUID, name: str, names: List[str],
+                 dumps: List[List[Optional[float]]]) -> None:
+        """Store the stats of the run with _id key. Replaces the stats if
+        they were already stored. The dumps are split into documents of at
+        most _DUMP_CHUNK_VALUES values (but at least one dump)."""
+        if not self._stats_indexed:
+            self.stats_dumps.create_index([('run_id', 1), ('seq', 1)])
+            self._stats_indexed = True
+        schema = _schemaHash(names)
+        self.stats_schemas.update_one({'_id': schema},
+                                      {'$setOnInsert': {'names': names}},
+                                      upsert = True)
+        self.stats_dumps.delete_many({'run_id': key})
+        rows = max(_DUMP_CHUNK_VALUES // max(len(names), 1), 1)
+        chunks = [{'run_id': key, 'seq': seq, 'rows': dumps[seq:seq + rows]}
+                  for seq in range(0, len(dumps), rows)]
+        if chunks:
+            self.stats_dumps.insert_many(chunks)
+        self.stats.replace_one({'_id': key},
+                               {'_id': key, 'name': name, 'schema': schema,
+                                'dumps': len(dumps)},
+                               upsert = True)
+
+    def getStats(self, key: UUID) -> Optional[Dict[str, Any]]:
+        """Returns the names and dumps of the stats of the run with _id
+        key."""
+        d = self.stats.find_one({'_id': key})
+        if d is None:
+            return None
+        schema = self.stats_schemas.find_one({'_id': d['schema']})
+        if schema is None:
+            # The names of the stats are missing, so the values are useless
+            return None
+        dumps: List[List[Optional[float]]] = []
+        for chunk in self.stats_dumps.find({'run_id': key},
+                                           sort=[('seq', 1)]):
+            dumps.extend(chunk['rows'])
+        return {'names': schema['names'], 'dumps': dumps}
+
+    def deleteStats(self, key: UUID) -> None:
+        """Delete the stats of the run with _id key. The names of the stats
+        are kept since other runs may share them."""
+        self.stats.delete_one({'_id': key})
+        self.stats_dumps.delete_many({'run_id': key})
+
+    def getStatsNames(self) -> List[str]:
+        """Returns the sorted names of all of the stats of all of the
+        runs."""
+        return sorted(self.stats_schemas.distinct('names'))
+
+    def putLiveResults(self, key: UUID, name: str,
+                       delta: Dict[str, Any]) -> None:
+        """Store a delta of the results of the running run with _id key."""
+        doc = dict(delta, run_id=key, name=name)
+        if 'names' in doc:
+            doc['schema'] = _schemaHash(doc['names'])
+            self.stats_schemas.update_one({'_id': doc['schema']},
+                                          {'$setOnInsert':
+                                              {'names': doc.pop('names')}},
+                                          upsert = True)
+        self.live_results.insert_one(doc)
+
+    def getLiveResults(self, key: UUID) -> List[Dict[str, Any]]:
+        """Returns the deltas of the run with _id key in order."""
+        deltas = list(self.live_results.find({'run_id': key},
+                                             sort=[('seq', 1)]))
+        schemas = {d['_id']: d['names'] for d in self.stats_schemas.find(
+            {'_id': {'$in': [d['schema'] for d in deltas if 'schema' in d]}})}
+        for d in deltas:
+            for field in ('_id', 'run_id', 'name'):
+                del d[field]
+            if 'schema' in d:
+                d['names'] = schemas[d.pop('schema')]
+        return deltas
+
+    def searchLiveResults(self, name_like: str = ''
+                          ) -> Iterable[Dict[str, Any]]:
+        """Returns the "_id" and "name" of each run with deltas."""
+        pipeline: List[Dict[str, Any]] = []
+        if name_like:
+            pipeline.append({'$match': {'name': {'$regex': name_like}}})
+        pipeline.append({'$group': {'_id': '$run_id',
+                                    'name': {'$first': '$name'}}})
+        for d in self.live_results.aggregate(pipeline):
+            yield d
+
+    def deleteLiveResults(self, key: UUID) -> None:
+        """Delete the deltas of the run with _id key."""
+        self.live_results.delete_many({'run_id': key})
+
+    def searchStats(self, names: Iterable[str], name_like: str = '',
+                    keys: Optional[Iterable[UUID]] = None
+                    ) -> Iterable[Dict[str, Any]]:
+        """Returns the values of the stats in names for each matching run.
+        Only the requested values are sent from the database, with one
+        query for each set of stats names (usually one)."""
+        names = list(names)
+        query: Dict[str, Any] = {}
+        if name_like:
+            query['name'] = {'$regex': name_like}
+        if keys is not None:
+            query['_id'] = {'$in': list(keys)}
+
+        for schema in self.stats_schemas.find({'names': {'$in': names}}):
+            index = {n: i for i, n in enumerate(schema['names'])}
+            wanted = [n for n in names if n in index]
+            runs = {d['_id']: d['name'] for d in self.stats.find(
+                dict(query, schema=schema['_id']), projection=['name'])}
+            if not runs:
+                continue
+            # Stats names contain dots, so use positional fields
+            project: Dict[str, Any] = {'run_id': 1}
+            for j, n in enumerate(wanted):
+                project[f's{j}'] = {'$map': {
+                    'input': '$rows', 'as': 'dump',
+                    'in': {'$arrayElemAt': ['$$dump', index[n]]}}}
+            pipeline: List[Dict[str, Any]] = [
+                {'$match': {'run_id': {'$in': list(runs)}}},
+                {'$sort': {'run_id': 1, 'seq': 1}},
+                {'$project': project},
+            ]
+            chunks = self.stats_dumps.aggregate(pipeline, allowDiskUse=True)
+            for run_id, group in itertools.groupby(
+                    chunks, key=lambda d: d['run_id']):
+                stats: Dict[str, List[Optional[float]]] = {
+                    n: [] for n in wanted}
+                for chunk in group:
+                    for j, n in enumerate(wanted):
+                        stats[n].extend(chunk[f's{j}'])
+                yield {'_id': run_id, 'name': runs[run_id], 'stats': stats}
+
+    def getAncestors(self, key: UUID, depth: int = 0) -> List[Dict[str, Any]]:
+        """Returns a list of all documents that the document with _id key
+        was (transitively) derived from. Uses one $graphLookup query."""
+        return self._graphLookup(key, '$inputs', 'inputs', '_id', depth)
+
+    def getDescendants(self, key: UUID, depth: int = 0) -> List[Dict[str, Any]]:
+        """Returns a list of all documents that (transitively) have the
+        document with _id key as an input. Uses one $graphLookup query."""
+        return self._graphLookup(key, '$_id', '_id', 'inputs', depth)
+
+    def _graphLookup(self, key: UUID, start: str, connect_from: str,
+                     connect_to: str, depth: int) -> List[Dict[str, Any]]:
+        lookup: Dict[str, Any] = {
+            'from': self.artifacts.name,
+            'startWith': start,
+            'connectFromField': connect_from,
+            'connectToField': connect_to,
+            'as': 'related',
+            'depthField': '_depth',
+        }
+        if depth > 0:
+            # maxDepth of 0 only follows the first edge
+            lookup['maxDepth'] = depth - 1
+        result = list(self.artifacts.aggregate([
+            {'$match': {'_id': key}},
+            {'$graphLookup': lookup},
+            {'$project': {'related': 1}},
+        ]))
+        if not result:
+            return []
+        related = sorted(result[0]['related'], key=lambda d: d['_depth'])
+        for d in related:
+            del d['_depth']
+        return related
+
 
 class ArtifactFileDB(ArtifactDB):
     """
@@ -218,6 +636,10 @@ class ArtifactFileDB(ArtifactDB):
     If the user specifies a valid path in the environment variable
     GEM5ART_STORAGE then this database will copy all artifacts to that
     directory named with their UUIDs.
+
+    The stats of runs (see putStats) are stored in a second JSON file next
+    to the first one (e.g., db.stats.json for db.json), which is only read
+    when the stats are used.
     """
 
     class ArtifactEncoder(json.JSONEncoder):
@@ -229,8 +651,12 @@ class ArtifactFileDB(ArtifactDB):
     _json_file: Path
     _uuid_artifact_map: Dict[str, Dict[str,str]]
     _hash_uuid_map: Dict[str, List[str]]
+    _input_uuid_map: Dict[str, List[str]]
     _storage_enabled: bool
     _storage_path: Path
+    _stats_file: Path
+    _stats: Optional[Dict[str, Dict[str, Any]]]
+    _stats_lock: threading.Lock
 
     def __init__(self, uri: str) -> None:
         """Initialize the file-driven database from a JSON file.
@@ -256,6 +682,17 @@ class ArtifactFileDB(ArtifactDB):
         self._uuid_artifact_map, self._hash_uuid_map = \
             self._load_from_file(self._json_file)
 
+        # Reverse edges of the inputs graph, i.e., for each uuid, the uuids
+        # of the artifacts which have it as an input.
+        self._input_uuid_map = {}
+        for uuid_str, an_artifact in self._uuid_artifact_map.items():
+            self._index_inputs(uuid_str, an_artifact)
+
+        self._stats_file = self._json_file.with_suffix('.stats.json')
+        self._stats = None
+        # The live results are sent from many threads
+        self._stats_lock = threading.Lock()
+
 
     def put(self, key: UUID, artifact: Dict[str,Union[str,UUID]]) -> None:
         """Insert the artifact into the database with the key."""
@@ -263,14 +700,107 @@ class ArtifactFileDB(ArtifactDB):
         assert isinstance(artifact['hash'], str)
         self.insert_artifact(key, artifact['hash'], artifact)
 
+    def putMany(self, artifacts: Iterable[Dict[str,Union[str,UUID]]]) -> None:
+        """Insert many artifacts into the database. The JSON file is only
+        written once."""
+        for artifact in artifacts:
+            assert isinstance(artifact['_id'], UUID)
+            assert isinstance(artifact['hash'], str)
+            self.insert_artifact(artifact['_id'], artifact['hash'], artifact,
+                                 save = False)
+        self._save_to_file(self._json_file)
+
     def upload(self, key: UUID, path: Path) -> None:
-        """Copy the artifact to the folder specified by GEM5ART_STORAGE."""
+        """Copy the artifact to the folder specified by GEM5ART_STORAGE.
+        Sparse files stay sparse."""
         if not self._storage_enabled:
             return
         src_path = path
         dst_path = self._storage_path / str(key)
         if not dst_path.exists():
-            shutil.copy2(src_path, dst_path)
+            sparseCopy(src_path, dst_path)
+
+    @contextmanager
+    def openUploadStream(self, key: UUID, filename: str) -> Iterator[BinaryIO]:
+        """Returns a stream which is written to the folder specified by
+        GEM5ART_STORAGE. The file only appears there once it is complete.
+        If there is no storage, the data is discarded."""
+        if not self._storage_enabled:
+            with open(os.devnull, 'wb') as f:
+                yield f
+            return
+        dst_path = self._storage_path / str(key)
+        tmp_path = self._storage_path / f'{key}.part'
+        try:
+            with open(tmp_path, 'wb') as f:
+                yield f
+            os.replace(tmp_path, dst_path)
+        finally:
+            if tmp_path.exists():
+                os.remove(tmp_path)
+
+    def storesFiles(self) -> bool:
+        """Returns true if GEM5ART_STORAGE is set."""
+        return self._storage_enabled
+
+    def openFile(self, key: UUID) -> BinaryIO:
+        """Opens the file with the _id key in the folder specified by
+        GEM5ART_STORAGE."""
+        if not self._storage_enabled:
+            raise Exception("There are no files without GEM5ART_STORAGE")
+        return open(self._storage_path / str(key), 'rb')
+
+    def deleteFile(self, key: UUID) -> None:
+        """Delete the file with the _id key from the storage if it is
+        there."""
+        if not self._storage_enabled:
+            return
+        try:
+            os.remove(self._storage_path / str(key))
+        except FileNotFoundError:
+            pass
+
+    def listFiles(self) -> Iterable[Tuple[UUID, int, float]]:
+        """Returns the _id, allocated size, and modification time of every
+        file in the storage."""
+        if not self._storage_enabled:
+            return
+        for p in self._storage_path.iterdir():
+            try:
+                key = UUID(p.name)
+                st = p.stat()
+            except (ValueError, FileNotFoundError):
+                # Partial uploads (see openUploadStream)
+                continue
+            yield key, st.st_blocks * 512, st.st_mtime
+
+    def delete(self, key: UUID) -> None:
+        """Delete the document with the _id key."""
+        self.deleteMany([key])
+
+    def deleteMany(self, keys: Iterable[UUID]) -> None:
+        """Delete the documents with the _ids keys. The JSON file is only
+        written once."""
+        deleted = False
+        for key in keys:
+            uuid_str = str(key)
+            the_artifact = self._uuid_artifact_map.pop(uuid_str, None)
+            if the_artifact is None:
+                continue
+            deleted = True
+            the_hash = str(the_artifact['hash'])
+            self._hash_uuid_map[the_hash].remove(uuid_str)
+            if not self._hash_uuid_map[the_hash]:
+                del self._hash_uuid_map[the_hash]
+            for input_uuid in the_artifact.get('inputs', []):
+                self._input_uuid_map.get(str(input_uuid), []).remove(uuid_str)
+        if deleted:
+            self._save_to_file(self._json_file)
+
+    def scan(self, fields: Optional[List[str]] = None
+             ) -> Iterable[Dict[str, Any]]:
+        """Returns an iterable of all of the documents."""
+        return list(self._uuid_artifact_map.values())
 
     def __contains__(self, key: Union[UUID, str]) -> bool:
         """Key can be a UUID or a string. Returns true if item in DB"""
@@ -290,14 +820,141 @@ class ArtifactFileDB(ArtifactDB):
             artifact = list(self.get_artifact_by_hash(key))
         return artifact[0]
 
+    def getByHashes(self, hashes: Iterable[str]) -> Dict[str, Dict[str,str]]:
+        """Returns a dictionary mapping each hash that is in the database to
+        a dictionary to construct an artifact."""
+        return {h: next(iter(self.get_artifact_by_hash(h)))
+                for h in set(hashes) if self.has_hash(h)}
+
     def downloadFile(self, key: UUID, path: Path) -> None:
-        """Copy the file from the storage to specified path."""
+        """Copy the file from the storage to specified path. Sparse files
+        stay sparse."""
         assert(path.exists())
         if not self._storage_enabled:
             return
         src_path = self._storage_path / str(key)
         dst_path = path
-        shutil.copy2(src_path, dst_path)
+        sparseCopy(src_path, dst_path)
+
+    def _loadStats(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the stats, reading them from the stats file the first
+        time."""
+        if self._stats is None:
+            self._stats = {'schemas': {}, 'runs': {}, 'live': {}}
+            if self._stats_file.exists():
+                with open(self._stats_file, 'r') as f:
+                    self._stats = json.load(f)
+        return self._stats
+
+    def putStats(self, key: UUID, name: str, names: List[str],
+                 dumps: List[List[Optional[float]]]) -> None:
+        """Store the stats of the run with _id key in the stats file.
+        Replaces the stats if they were already stored."""
+        schema = _schemaHash(names)
+        with self._stats_lock:
+            stats = self._loadStats()
+            stats['schemas'].setdefault(schema, names)
+            stats['runs'][str(key)] = {'name': name, 'schema': schema,
+                                       'dumps': dumps}
+            self._saveStats()
+
+    def getStats(self, key: UUID) -> Optional[Dict[str, Any]]:
+        """Returns the names and dumps of the stats of the run with _id
+        key."""
+        stats = self._loadStats()
+        run = stats['runs'].get(str(key))
+        if run is None:
+            return None
+        return {'names': stats['schemas'][run['schema']],
+                'dumps': run['dumps']}
+
+    def deleteStats(self, key: UUID) -> None:
+        """Delete the stats of the run with _id key. The names of the stats
+        are kept since other runs may share them."""
+        with self._stats_lock:
+            stats = self._loadStats()
+            if stats['runs'].pop(str(key), None) is not None:
+                self._saveStats()
+
+    def getStatsNames(self) -> List[str]:
+        """Returns the sorted names of all of the stats of all of the
+        runs."""
+        schemas = self._loadStats()['schemas'].values()
+        return sorted(set(n for names in schemas for n in names))
+
+    def _saveStats(self) -> None:
+        # Replace the file atomically so that readers in other processes
+        # never see a partially written file
+        tmp = self._stats_file.with_name(
+            f'.{self._stats_file.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self._stats, f, cls=ArtifactFileDB.ArtifactEncoder)
+            os.replace(tmp, self._stats_file)
+        finally:
+            if tmp.exists():
+                os.remove(tmp)
+
+    def putLiveResults(self, key: UUID, name: str,
+                       delta: Dict[str, Any]) -> None:
+        """Store a delta of the results of the running run with _id key in
+        the stats file."""
+        doc = dict(delta, name=name)
+        with self._stats_lock:
+            stats = self._loadStats()
+            if 'names' in doc:
+                doc['schema'] = _schemaHash(doc['names'])
+                stats['schemas'].setdefault(doc['schema'], doc.pop('names'))
+            stats.setdefault('live', {}).setdefault(str(key), []).append(doc)
+            self._saveStats()
+
+    def getLiveResults(self, key: UUID) -> List[Dict[str, Any]]:
+        """Returns the deltas of the run with _id key in order."""
+        stats = self._loadStats()
+        deltas = []
+        for doc in stats.get('live', {}).get(str(key), []):
+            d = dict(doc)
+            del d['name']
+            if 'schema' in d:
+                d['names'] = stats['schemas'][d.pop('schema')]
+            deltas.append(d)
+        return sorted(deltas, key=lambda d: d['seq'])
+
+    def searchLiveResults(self, name_like: str = ''
+                          ) -> Iterable[Dict[str, Any]]:
+        """Returns the "_id" and "name" of each run with deltas."""
+        for uuid_str, docs in self._loadStats().get('live', {}).items():
+            name = docs[0]['name']
+            if not name_like or re.search(name_like, name):
+                yield {'_id': UUID(uuid_str), 'name': name}
+
+    def deleteLiveResults(self, key: UUID) -> None:
+        """Delete the deltas of the run with _id key."""
+        with self._stats_lock:
+            stats = self._loadStats()
+            if stats.get('live', {}).pop(str(key), None) is not None:
+                self._saveStats()
+
+    def searchStats(self, names: Iterable[str], name_like: str = '',
+                    keys: Optional[Iterable[UUID]] = None
+                    ) -> Iterable[Dict[str, Any]]:
+        """Returns the values of the stats in names for each matching
+        run."""
+        names = list(names)
+        stats = self._loadStats()
+        wanted_keys = {str(k) for k in keys} if keys is not None else None
+        for uuid_str, run in stats['runs'].items():
+            if wanted_keys is not None and uuid_str not in wanted_keys:
+                continue
+            if name_like and not re.search(name_like, run['name']):
+                continue
+            index = {n: i for i, n in enumerate(stats['schemas'][run['schema']])}
+            wanted = [n for n in names if n in index]
+            if not wanted:
+                continue
+            yield {'_id': UUID(uuid_str), 'name': run['name'],
+                   'stats': {n: [dump[index[n]] for dump in run['dumps']]
+                             for n in wanted}}
 
     def _load_from_file(self, json_file: Path) -> Tuple[Dict[str, Dict[str,str]], Dict[str, List[str]]]:
         uuid_mapping: Dict[str, Dict[str,str]] = {}
@@ -338,12 +995,14 @@ class ArtifactFileDB(ArtifactDB):
             yield self._uuid_artifact_map[the_uuid]
 
     def insert_artifact(self, the_uuid: UUID, the_hash: str,
-                        the_artifact: Dict[str,Union[str,UUID]]) -> bool:
+                        the_artifact: Dict[str,Union[str,UUID]],
+                        save: bool = True) -> bool:
         """
             Put the artifact to the database.
 
             Return True if the artifact uuid does not exist in the database prior
             to calling this function; return False otherwise.
+            If save is False, the JSON file is not updated.
         """
         uuid_str = str(the_uuid)
         if uuid_str in self._uuid_artifact_map:
@@ -354,9 +1013,51 @@ class ArtifactFileDB(ArtifactDB):
         if not the_hash in self._hash_uuid_map:
             self._hash_uuid_map[the_hash] = []
         self._hash_uuid_map[the_hash].append(uuid_str)
-        self._save_to_file(self._json_file)
+        self._index_inputs(uuid_str, artifact_copy)
+        if save:
+            self._save_to_file(self._json_file)
         return True
 
+    def _index_inputs(self, uuid_str: str, the_artifact: Dict[str, Any]) -> None:
+        for input_uuid in the_artifact.get('inputs', []):
+            self._input_uuid_map.setdefault(str(input_uuid), []) \
+                                .append(uuid_str)
+
+    def _walk(self, uuid_str: str, neighbors: Callable[[str], Iterable[str]],
+              depth: int) -> List[Dict[str, Any]]:
+        """Breadth-first search from uuid_str following neighbors."""
+        found: List[Dict[str, Any]] = []
+        visited = {uuid_str}
+        frontier = [uuid_str]
+        level = 0
+        while frontier and (depth <= 0 or level < depth):
+            next_frontier = []
+            for current in frontier:
+                for neighbor in neighbors(current):
+                    if neighbor in visited or \
+                            neighbor not in self._uuid_artifact_map:
+                        continue
+                    visited.add(neighbor)
+                    next_frontier.append(neighbor)
+                    found.append(self._uuid_artifact_map[neighbor])
+            frontier = next_frontier
+            level += 1
+        return found
+
+    def getAncestors(self, key: UUID, depth: int = 0) -> List[Dict[str, Any]]:
+        """Returns a list of all artifacts that the artifact with _id key
+        was (transitively) derived from."""
+        def inputs(uuid_str: str) -> Iterable[str]:
+            an_artifact = self._uuid_artifact_map.get(uuid_str, {})
+            return [str(i) for i in an_artifact.get('inputs', [])]
+        return self._walk(str(key), inputs, depth)
+
+    def getDescendants(self, key: UUID, depth: int = 0) -> List[Dict[str, Any]]:
+        """Returns a list of all artifacts that (transitively) have the
+        artifact with _id key as an input. Uses the reverse edge index."""
+        return self._walk(str(key),
+                          lambda u: self._input_uuid_map.get(u, []), depth)
+
     def find_exact(self, attr: Dict[str, str], limit: int) \
                                              -> Iterable[Dict[str, Any]]:
         """
@@ -372,6 +1073,17 @@ class ArtifactFileDB(ArtifactDB):
             if attr.items() <= artifact.items():
                 yield artifact
 
+    def searchByLikeNameType(self, name: str, typ: str, limit: int) -> Iterable[Dict[str, Any]]:
+        """Returns an iterable of all artifacts in the database that match
+        some type and a regex name. A limit of 0 means no limit."""
+        count = 0
+        for artifact in self._uuid_artifact_map.values():
+            if limit and count >= limit:
+                return
+            if artifact['type'] == typ and re.search(name, artifact['name']):
+                count += 1
+                yield artifact
+
 _db = None
 
 if MONGO_SUPPORT:
@@ -0,0 +1,169 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Helpers for reading, writing, and copying sparse files.
+
+Disk images are often mostly holes. These helpers use SEEK_DATA/SEEK_HOLE
+to find the data regions of a file so that the holes are never read from
+(or written to) the disk. On systems or file systems without support for
+SEEK_DATA/SEEK_HOLE the whole file is treated as data.
+"""
+
+import errno
+import io
+import os
+from pathlib import Path
+import shutil
+from typing import Any, BinaryIO, Iterator, Tuple, Union
+
+BUF_SIZE = 1024 * 1024
+
+_zeros = bytes(BUF_SIZE)
+
+def dataSegments(f: BinaryIO) -> Iterator[Tuple[int, int]]:
+    """Yields (start, end) offsets of the data regions of the open file f in
+    order. Everything between the data regions are holes (i.e., zeros).
+
+    Note: This moves the file position of f.
+    """
+    fd = f.fileno()
+    size = os.fstat(fd).st_size
+    if not hasattr(os, 'SEEK_DATA'):
+        if size:
+            yield (0, size)
+        return
+
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # There is only a hole after offset
+                return
+            if e.errno in (errno.EINVAL, errno.EOPNOTSUPP):
+                # The file system doesn't support finding holes
+                yield (offset, size)
+                return
+            raise
+        end = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+        yield (start, end)
+        offset = end
+
+def updateZeros(hasher: Any, length: int) -> None:
+    """Updates the hasher with length zero bytes without any I/O."""
+    zeros = memoryview(_zeros)
+    while length > 0:
+        n = min(length, BUF_SIZE)
+        hasher.update(zeros[:n])
+        length -= n
+
+def sparseCopy(src: Union[str, Path], dst: Union[str, Path]) -> None:
+    """Copies src to dst (like shutil.copy2) without reading or writing the
+    holes in src. The holes are preserved in dst if the file system supports
+    sparse files."""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        for start, end in dataSegments(fsrc):
+            fsrc.seek(start)
+            fdst.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = fsrc.read(min(BUF_SIZE, remaining))
+                if not data:
+                    break
+                fdst.write(data)
+                remaining -= len(data)
+        # Extend the file over any trailing hole
+        fdst.truncate(size)
+    shutil.copystat(src, dst)
+
+class SparseReader(io.RawIOBase):
+    """A read-only file object which returns zeros for the holes in the
+    underlying file without reading them from the disk."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self._f = open(path, 'rb')
+        self._segments = list(dataSegments(self._f))
+        self._size = os.fstat(self._f.fileno()).st_size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int: # type: ignore
+        n = min(len(b), self._size - self._pos)
+        if n <= 0:
+            return 0
+        # Drop the segments we have already passed
+        while self._segments and self._segments[0][1] <= self._pos:
+            self._segments.pop(0)
+        if self._segments and self._segments[0][0] <= self._pos:
+            # Inside a data region
+            n = min(n, self._segments[0][1] - self._pos)
+            self._f.seek(self._pos)
+            n = self._f.readinto(memoryview(b)[:n])
+        else:
+            # Inside a hole
+            n = min(n, BUF_SIZE)
+            if self._segments:
+                n = min(n, self._segments[0][0] - self._pos)
+            memoryview(b)[:n] = memoryview(_zeros)[:n]
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+class SparseWriter(io.RawIOBase):
+    """A write-only file object which seeks over blocks of zeros instead of
+    writing them so that the resulting file is sparse."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self._f = open(path, 'wb')
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int: # type: ignore
+        data = memoryview(b).cast('B')
+        n = len(data)
+        for start in range(0, n, BUF_SIZE):
+            block = data[start:start + BUF_SIZE]
+            if block.tobytes() != _zeros[:len(block)]:
+                self._f.seek(self._pos + start)
+                self._f.write(block)
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        if not self._f.closed:
+            # Extend the file over any trailing hole
+            self._f.truncate(self._pos)
+            self._f.close()
+        super().close()
@@ -27,31 +27,46 @@
 """File contains the Artifact class and helper functions
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 import hashlib
 from inspect import cleandoc
+import io
 import json
 import os
 from pathlib import Path
 import subprocess
+import sys
 import time
-from typing import Any, Dict, Iterator, List, Union, Optional
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, \
+    Union, Optional, Tuple
 from uuid import UUID, uuid4
 import json
 
 from ._artifactdb import getDBConnection
+from ._sparse import BUF_SIZE, dataSegments, updateZeros
 
 
 def getHash(path: Path) -> str:
     """
     Returns an md5 hash for the file in self.path.
+
+    The holes in sparse files are hashed as zeros without reading them, so
+    the hash is the same as hashing every byte of the file.
     """
-    BUF_SIZE = 65536
     md5 = hashlib.md5()
     with open(path, 'rb') as f:
-        while True:
-            data = f.read(BUF_SIZE)
-            if not data: break
-            md5.update(data)
+        pos = 0
+        for start, end in dataSegments(f):
+            updateZeros(md5, start - pos)
+            f.seek(start)
+            pos = start
+            while pos < end:
+                data = f.read(min(BUF_SIZE, end - pos))
+                if not data: break
+                md5.update(data)
+                pos += len(data)
+        updateZeros(md5, os.fstat(f.fileno()).st_size - pos)
 
     return md5.hexdigest()
 
@@ -89,6 +104,34 @@ def getGit(path: Path) -> Dict[str,str]:
         'name': str(name.strip(), 'utf-8'),
     }
 
+def _checkDocumentation(documentation: str) -> None:
+    """Raises an exception if the documentation of an artifact is too
+    short."""
+    if len(cleandoc(documentation)) < 10: # 10 characters is arbitrary
+        raise Exception(cleandoc("""Must provide longer documentation!
+            This documentation is how your future data will remember what
+            this artifact is and how it was created."""))
+
+class _HashingTee(io.RawIOBase):
+    """A write-only file object which computes the md5 hash of the data
+    written to it and writes the data to each of the sinks."""
+
+    def __init__(self, sinks: List[BinaryIO]) -> None:
+        self._sinks = sinks
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int: # type: ignore
+        data = memoryview(b).cast('B')
+        self.md5.update(data)
+        for sink in self._sinks:
+            sink.write(data)
+        self.size += len(data)
+        return len(data)
+
 class Artifact:
     """
     A base artifact class.
@@ -167,31 +210,59 @@ class Artifact:
             to the database.
         """
 
+        _checkDocumentation(documentation)
+
+        ppath = Path(path)
+        if ppath.is_file():
+            hsh = getHash(ppath)
+            git: Dict[str, str] = {}
+        elif ppath.is_dir():
+            git = getGit(ppath)
+            hsh = git['hash']
+        else:
+            raise Exception("Path {} doesn't exist".format(ppath))
+
+        return cls._newArtifact(command, name, cwd, typ, ppath, documentation,
+                                hsh, git, inputs, architecture, size,
+                                is_zipped, md5sum, url,
+                                supported_gem5_versions, version, **kwargs)
+
+    @classmethod
+    def _newArtifact(cls,
+                     command: str,
+                     name: str,
+                     cwd: str,
+                     typ: str,
+                     path: Path,
+                     documentation: str,
+                     hsh: str,
+                     git: Dict[str, str],
+                     inputs: List['Artifact'] = [],
+                     architecture: str = "",
+                     size: Optional[int] = None,
+                     is_zipped: bool = False,
+                     md5sum: str = "",
+                     url: str = "",
+                     supported_gem5_versions: List[str] = [],
+                     version: str = "",
+                     **kwargs: str
+                     ) -> 'Artifact':
+        """Constructs a new artifact with a known hash and git information
+        without using the database."""
+
         # Dictionary with all of the kwargs for construction.
         data: Dict[str, Any] = {}
 
         data['name'] = name
         data['type'] = typ
         data['documentation'] = cleandoc(documentation)
-        if len(data['documentation']) < 10: # 10 characters is arbitrary
-            raise Exception(cleandoc("""Must provide longer documentation!
-                This documentation is how your future data will remember what
-                this artifact is and how it was created."""))
-
         data['command'] = cleandoc(command)
 
         data['time'] = time.time()
 
-        ppath = Path(path)
-        data['path'] = ppath
-        if ppath.is_file():
-            data['hash'] = getHash(ppath)
-            data['git'] = {}
-        elif ppath.is_dir():
-            data['git'] = getGit(ppath)
-            data['hash'] = data['git']['hash']
-        else:
-            raise Exception("Path {} doesn't exist".format(ppath))
+        data['path'] = path
+        data['hash'] = hsh
+        data['git'] = git
 
         pcwd = Path(cwd)
         data['cwd'] = pcwd
@@ -267,6 +338,124 @@ class Artifact:
 
         return self
 
+    @classmethod
+    def registerStream(cls,
+                       write: Callable[[BinaryIO], Optional[Dict[str, str]]],
+                       command: str,
+                       name: str,
+                       cwd: str,
+                       typ: str,
+                       path: Union[str, Path],
+                       documentation: str,
+                       inputs: List['Artifact'] = [],
+                       keep_local: bool = False,
+                       **kwargs: Any
+                       ) -> 'Artifact':
+        """Constructs a new artifact from a file which is generated by
+        write() and adds it to the database.
+
+        write() is called with a (non-seekable) stream. The data is hashed
+        and sent to the database as it is written, so the file is never
+        read back. write() may return extra fields of the artifact which
+        depend on the data (e.g., an index of the file). If keep_local is
+        true, or the database does not store files, the file is also
+        written to path. The artifact's path is always path.
+
+        If an artifact with the same hash is already in the database, the
+        uploaded copy is deleted and the existing artifact is returned.
+        The other arguments are the same as registerArtifact().
+        """
+        _checkDocumentation(documentation)
+
+        _db = getDBConnection()
+        ppath = Path(path)
+        key = uuid4()
+        keep_local = keep_local or not _db.storesFiles()
+
+        try:
+            with ExitStack() as stack:
+                sinks = [stack.enter_context(
+                             _db.openUploadStream(key, str(ppath)))]
+                if keep_local:
+                    sinks.append(stack.enter_context(open(ppath, 'wb')))
+                tee = _HashingTee(sinks)
+                extra = write(tee) # type: ignore
+        except BaseException:
+            if keep_local and ppath.exists():
+                os.remove(ppath)
+            raise
+
+        kwargs.update(extra or {})
+        kwargs.setdefault('size', tee.size)
+        self = cls._newArtifact(command, name, cwd, typ, ppath, documentation,
+                                tee.md5.hexdigest(), {}, inputs, **kwargs)
+        self._id = key
+
+        if self.hash in _db:
+            old_artifact = Artifact(_db.get(self.hash))
+            self._id = old_artifact._id
+            _db.deleteFile(key)
+
+            self._checkSimilar(old_artifact)
+
+        else:
+            _db.put(self._id, self._getSerializable())
+
+        return self
+
+    @classmethod
+    def registerArtifacts(cls,
+                          specs: Iterable[Dict[str, Any]],
+                          max_workers: Optional[int] = None
+                          ) -> List['Artifact']:
+        """Constructs many new artifacts and adds them to the database.
+
+        Each spec is a dictionary of the keyword arguments to
+        registerArtifact(). The artifacts are returned in the same order as
+        the specs.
+
+        The paths are hashed concurrently on a pool of max_workers threads,
+        the database is checked for all of the hashes with one lookup, and
+        the files of the new artifacts are uploaded concurrently.
+
+        The inputs of each spec must already be in the database. To register
+        artifacts that depend on each other, call this function once for
+        each level of the dependency graph.
+        """
+        specs = list(specs)
+
+        # Establish the connection before using it from many threads
+        _db = getDBConnection()
+
+        with ThreadPoolExecutor(max_workers) as pool:
+            artifacts = list(pool.map(lambda spec: cls.createArtifact(**spec),
+                                      specs))
+
+        existing = _db.getByHashes(a.hash for a in artifacts)
+
+        new: Dict[str, 'Artifact'] = {}
+        for art in artifacts:
+            if art.hash in existing:
+                old_artifact = Artifact(existing[art.hash])
+            elif art.hash in new:
+                # The same artifact is in the list more than once
+                old_artifact = new[art.hash]
+            else:
+                new[art.hash] = art
+                continue
+            art._id = old_artifact._id
+            art._checkSimilar(old_artifact)
+
+        # Upload the files if there are any.
+        to_upload = [a for a in new.values() if a.path.is_file()]
+        with ThreadPoolExecutor(max_workers) as pool:
+            list(pool.map(lambda a: _db.upload(a._id, a.path), to_upload))
+
+        # Putting the artifacts to the database
+        _db.putMany(a._getSerializable() for a in new.values())
+
+        return artifacts
+
     def __init__(self, other: Union[str, UUID, Dict[str, Any]]) -> None:
         """Constructs an artifact object from the database based on a UUID or
         dictionary from the database. Note that if the variable `other` is of
@@ -388,3 +577,140 @@ class Artifact:
 
     def __hash__(self) -> int:
         return self._id.int
+
+
+class ArtifactRecord:
+    """
+    A compact, read-only view of an artifact stored in the database.
+
+    Records are meant for bulk queries over many artifacts (e.g., inventory
+    reports). Unlike Artifact, a record does not load its inputs from the
+    database (inputs is a tuple of UUIDs), repeated strings are interned,
+    and the paths, extra fields, and supported gem5 versions are only
+    converted when they are accessed.
+
+    Use toArtifact() to get the full Artifact.
+    """
+
+    __slots__ = ('_id', 'name', 'type', 'documentation', 'command', '_path',
+                 'hash', 'time', 'git', '_cwd', 'inputs', 'architecture',
+                 'size', 'is_zipped', 'md5sum', 'url',
+                 '_supported_gem5_versions', 'version', '_extra')
+
+    _id: UUID
+    name: str
+    type: str
+    documentation: str
+    command: str
+    _path: str
+    hash: str
+    time: Optional[float]
+    git: Dict[str,str]
+    _cwd: str
+    inputs: Tuple[UUID, ...]
+    architecture: str
+    size: Optional[int]
+    is_zipped: bool
+    md5sum: str
+    url: str
+    _supported_gem5_versions: Union[str, List[str]]
+    version: str
+    _extra: Union[str, Dict[str, str]]
+
+    def __init__(self, other: Dict[str, Any]) -> None:
+        """Constructs a record from a dictionary from the database."""
+        intern = sys.intern
+        init = lambda name, value: object.__setattr__(self, name, value)
+
+        _id = other['_id']
+        init('_id', _id if isinstance(_id, UUID) else UUID(_id))
+        init('name', intern(other['name']))
+        init('type', intern(other['type']))
+        init('documentation', intern(other['documentation']))
+        init('command', other['command'])
+        init('_path', other['path'])
+        init('hash', other['hash'])
+        init('time', other.get('time'))
+        init('git', other['git'])
+        init('_cwd', intern(other['cwd']))
+        init('inputs', tuple(i if isinstance(i, UUID) else UUID(i)
+                             for i in other['inputs']))
+
+        # Optional fields
+        init('architecture', intern(other.get('architecture', '')))
+        size = other.get('size')
+        init('size', size if isinstance(size, int) else None)
+        init('is_zipped', bool(other.get('is_zipped', False)))
+        init('md5sum', other.get('md5sum', ''))
+        init('url', other.get('url', ''))
+        init('_supported_gem5_versions',
+             other.get('supported_gem5_versions', []))
+        init('version', intern(other.get('version', '')))
+        init('_extra', other.get('extra', {}))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("ArtifactRecord is read-only")
+
+    @property
+    def path(self) -> Path:
+        return Path(self._path)
+
+    @property
+    def cwd(self) -> Path:
+        return Path(self._cwd)
+
+    @property
+    def supported_gem5_versions(self) -> List[str]:
+        if isinstance(self._supported_gem5_versions, str):
+            return json.loads(self._supported_gem5_versions)
+        return list(self._supported_gem5_versions)
+
+    @property
+    def extra(self) -> Dict[str, str]:
+        if isinstance(self._extra, str):
+            return json.loads(self._extra)
+        return dict(self._extra)
+
+    def _asDict(self) -> Dict[str, Any]:
+        return {
+            '_id': self._id,
+            'name': self.name,
+            'type': self.type,
+            'documentation': self.documentation,
+            'command': self.command,
+            'path': self._path,
+            'hash': self.hash,
+            'time': self.time,
+            'git': self.git,
+            'cwd': self._cwd,
+            'inputs': list(self.inputs),
+            'architecture': self.architecture,
+            'size': self.size,
+            'is_zipped': self.is_zipped,
+            'md5sum': self.md5sum,
+            'url': self.url,
+            'supported_gem5_versions': self._supported_gem5_versions,
+            'version': self.version,
+            'extra': self._extra,
+        }
+
+    def toArtifact(self) -> Artifact:
+        """Returns the full Artifact for this record. Note: this loads the
+        inputs of the artifact from the database."""
+        return Artifact(self._asDict())
+
+    def __str__(self) -> str:
+        return "\n    ".join([self.name, f'id: {self._id}',
+                              f'type: {self.type}', f'path: {self._path}',
+                              self.documentation])
+
+    def __repr__(self) -> str:
+        return self._asDict().__repr__()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (Artifact, ArtifactRecord)):
+            return NotImplemented
+        return self.hash == other.hash and self._id == other._id
+
+    def __hash__(self) -> int:
+        return self._id.int
@@ -29,9 +29,10 @@ in the ArtifactDB.
 """
 
 from typing import Iterator
+from uuid import UUID
 
 from ._artifactdb import ArtifactDB
-from .artifact import Artifact
+from .artifact import Artifact, ArtifactRecord
 
 def _getByType(db: ArtifactDB, typ: str, limit: int = 0) -> Iterator[Artifact]:
     """Returns a generator of Artifacts with matching `type` from the db.
@@ -77,3 +78,46 @@ def getByName(db: ArtifactDB, name: str, limit: int = 0) -> Iterator[Artifact]:
 
     for d in data:
         yield Artifact(d)
+
+def getRecordsByType(db: ArtifactDB, typ: str, limit: int = 0) -> Iterator[ArtifactRecord]:
+    """Returns a generator of compact, read-only ArtifactRecords with
+    matching `type` from the db. Use this instead of the functions returning
+    Artifacts when loading many artifacts at once.
+
+    Limit specifies the maximum number of results to return.
+    """
+    for d in db.searchByType(typ, limit=limit):
+        yield ArtifactRecord(d)
+
+def getRecordsByName(db: ArtifactDB, name: str, limit: int = 0) -> Iterator[ArtifactRecord]:
+    """Returns a generator of compact, read-only ArtifactRecords matching
+    `name` from the db.
+
+    Limit specifies the maximum number of results to return.
+    """
+    for d in db.searchByName(name, limit=limit):
+        yield ArtifactRecord(d)
+
+def getAncestors(db: ArtifactDB, key: UUID, depth: int = 0) -> Iterator[Artifact]:
+    """Returns a generator of all artifacts that the artifact with the UUID
+    key was derived from (i.e., its inputs, their inputs, etc.), nearest
+    first.
+
+    Depth specifies the maximum number of levels of inputs to follow (0 for
+    no limit).
+    """
+    for d in db.getAncestors(key, depth):
+        yield Artifact(d)
+
+def getDescendants(db: ArtifactDB, key: UUID, depth: int = 0) -> Iterator[Artifact]:
+    """Returns a generator of all artifacts that were derived from the
+    artifact with the UUID key, nearest first. gem5 runs which used these
+    artifacts are not included (see gem5art.run.getRunsUsingArtifact).
+
+    Depth specifies the maximum number of levels of inputs to follow (0 for
+    no limit).
+    """
+    for d in db.getDescendants(key, depth):
+        if d['type'].startswith('gem5 run'):
+            continue
+        yield Artifact(d)
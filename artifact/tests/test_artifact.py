@@ -109,6 +109,39 @@ class TestArtifact(unittest.TestCase):
         self.assertTrue(self.artifact.cwd.exists())
         self.assertTrue(self.artifact.path.exists())
 
+class TestArtifactRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.artifact = artifact.Artifact({
+            '_id': uuid4(),
+            'name': 'test-name',
+            'type': 'test-type',
+            'documentation': "This is a long test documentation that has lots of words",
+            'command': ['ls', '-l'],
+            'path': '/',
+            'hash': hashlib.md5().hexdigest(),
+            'git': {},
+            'cwd': '/',
+            'inputs': [],
+            'extra': {'key': 'value'},
+        })
+        self.record = artifact.ArtifactRecord(
+            self.artifact._getSerializable())
+
+    def test_fields(self):
+        self.assertEqual(self.record._id, self.artifact._id)
+        self.assertEqual(self.record.path, self.artifact.path)
+        self.assertEqual(self.record.extra, self.artifact.extra)
+        self.assertEqual(self.record.inputs, ())
+
+    def test_read_only(self):
+        with self.assertRaises(AttributeError):
+            self.record.name = 'other-name'
+        self.assertFalse(hasattr(self.record, '__dict__'))
+
+    def test_to_artifact(self):
+        self.assertEqual(self.record.toArtifact(), self.artifact)
+
 class TestArtifactSimilarity(unittest.TestCase):
 
     def setUp(self):
@@ -220,5 +253,52 @@ class TestRegisterArtifact(unittest.TestCase):
         self.assertFalse(self.testArtifactB.hash in _db)
 
 
+class TestRegisterArtifacts(unittest.TestCase):
+
+    def setUp(self):
+
+        self.existing = artifact.Artifact.registerArtifact(
+            name = 'artifact-A',
+            typ = 'type-A',
+            documentation = 'This is a description of artifact A',
+            command = 'ls -l',
+            path = './',
+            cwd = './',
+            )
+
+        file_spec = {
+            'name': 'artifact-E',
+            'typ': 'type-E',
+            'documentation': 'This is a description of artifact E',
+            'command': 'vim test_artifact.py',
+            'path': './tests/test_artifact.py',
+            'cwd': './',
+        }
+
+        self.artifacts = artifact.Artifact.registerArtifacts([
+            {
+                'name': 'artifact-A',
+                'typ': 'type-A',
+                'documentation': 'This is a description of artifact A',
+                'command': 'ls -l',
+                'path': './',
+                'cwd': './',
+            },
+            file_spec,
+            file_spec,
+        ])
+
+    def test_order(self):
+        self.assertEqual([a.name for a in self.artifacts],
+                         ['artifact-A', 'artifact-E', 'artifact-E'])
+
+    def test_existing(self):
+        self.assertEqual(self.artifacts[0]._id, self.existing._id)
+
+    def test_duplicates(self):
+        self.assertEqual(self.artifacts[1]._id, self.artifacts[2]._id)
+        self.assertTrue(self.artifacts[1]._id in _db)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,105 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for ArtifactCache"""
+
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from gem5art.artifact import Artifact, ArtifactCache, getDBConnection
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.artifacts = []
+        for i in range(2):
+            with open(f"test-cache-{i}.txt", "w") as f:
+                f.write(f"This is test file {i}.")
+            self.artifacts.append(Artifact.createArtifact(
+                name = f'test-artifact-{i}',
+                typ = 'text',
+                path = f'test-cache-{i}.txt',
+                cwd = './',
+                command = f'echo "This is test file {i}." > test-cache-{i}.txt',
+                documentation = f"This artifact is made for testing."
+            ))
+
+    def tearDown(self):
+        for i in range(2):
+            os.remove(f'test-cache-{i}.txt')
+        shutil.rmtree('test-cache')
+
+    def test_open(self):
+        cache = ArtifactCache('test-cache')
+        with cache.open(self.artifacts[0]) as path:
+            self.assertEqual(path.name, self.artifacts[0].hash)
+            with open(path) as f:
+                self.assertEqual(f.read(), "This is test file 0.")
+        # The second time the file is already in the cache
+        with cache.open(self.artifacts[0]) as path2:
+            self.assertEqual(path, path2)
+
+    def test_eviction(self):
+        cache = ArtifactCache('test-cache', max_bytes = 1)
+        with cache.open(self.artifacts[0]) as path0:
+            with cache.open(self.artifacts[1]) as path1:
+                # Neither file can be evicted while it is in use
+                self.assertTrue(path0.exists())
+                self.assertTrue(path1.exists())
+        with cache.open(self.artifacts[1]) as path1:
+            self.assertFalse(path0.exists())
+            self.assertTrue(path1.exists())
+
+    def test_executable(self):
+        cache = ArtifactCache('test-cache')
+        with cache.open(self.artifacts[0]) as path:
+            self.assertFalse(os.access(path, os.X_OK))
+        with cache.open(self.artifacts[0], executable = True) as path:
+            self.assertTrue(os.access(path, os.X_OK))
+        os.chmod('test-cache-1.txt', 0o755)
+        with cache.open(self.artifacts[1]) as path:
+            self.assertTrue(os.access(path, os.X_OK))
+
+    def test_changed_file(self):
+        # The file is downloaded from the database instead
+        cache = ArtifactCache('test-cache')
+        with open("test-cache-0.txt", "w") as f:
+            f.write("This file has changed.")
+        def download(key, path):
+            path.write_text("This is test file 0.")
+        with mock.patch.object(type(getDBConnection()), 'downloadFile',
+                               side_effect = download):
+            with cache.open(self.artifacts[0]) as path:
+                self.assertEqual(path.read_text(), "This is test file 0.")
+
+    def test_bad_hash(self):
+        cache = ArtifactCache('test-cache')
+        with open("test-cache-0.txt", "w") as f:
+            f.write("This file has changed.")
+        with self.assertRaises(Exception):
+            with cache.open(self.artifacts[0]):
+                pass
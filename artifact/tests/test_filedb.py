@@ -27,13 +27,17 @@
 """Tests for ArtifactFileDB"""
 
 
+import hashlib
 import json
 import os
 from pathlib import Path
+import shutil
+import tempfile
 import unittest
-from uuid import UUID
+from unittest.mock import patch
+from uuid import UUID, uuid4
 
-from gem5art.artifact import Artifact
+from gem5art.artifact import Artifact, getAncestors, getDescendants
 from gem5art.artifact._artifactdb import getDBConnection
 
 class TestArtifactFileDB(unittest.TestCase):
@@ -68,5 +72,181 @@ class TestArtifactFileDB(unittest.TestCase):
         self.assertTrue(artifact['hash'] == self.artifact.hash)
         self.assertTrue(UUID(artifact['_id']) == self.artifact._id)
 
+class TestArtifactFileDBGraph(unittest.TestCase):
+    def setUp(self):
+        self.db = getDBConnection('file://test.json')
+
+        self.artifacts = []
+        for i in range(3):
+            with open(f"test-file-{i}.txt", "w") as f:
+                f.write(f"This is test file {i}.")
+            self.artifacts.append(Artifact.registerArtifact(
+                name = f'test-artifact-{i}',
+                typ = 'text',
+                path = f'test-file-{i}.txt',
+                cwd = './',
+                command = f'echo "This is test file {i}." > test-file-{i}.txt',
+                inputs = self.artifacts[-1:],
+                documentation = f"This artifact is made for testing."
+            ))
+
+    def tearDown(self):
+        for i in range(3):
+            os.remove(f'test-file-{i}.txt')
+        os.remove('test.json')
+
+    def test_ancestors(self):
+        ancestors = list(getAncestors(self.db, self.artifacts[2]._id))
+        self.assertEqual([a._id for a in ancestors],
+                         [self.artifacts[1]._id, self.artifacts[0]._id])
+
+    def test_descendants(self):
+        descendants = list(getDescendants(self.db, self.artifacts[0]._id))
+        self.assertEqual([a._id for a in descendants],
+                         [self.artifacts[1]._id, self.artifacts[2]._id])
+
+    def test_depth(self):
+        descendants = list(getDescendants(self.db, self.artifacts[0]._id, 1))
+        self.assertEqual([a._id for a in descendants], [self.artifacts[1]._id])
+
+    def test_reload(self):
+        # The reverse edge index must be rebuilt from the JSON file
+        db = getDBConnection('file://test.json')
+        self.assertEqual(len(db.getDescendants(self.artifacts[0]._id)), 2)
+
+class TestArtifactFileDBStream(unittest.TestCase):
+    def setUp(self):
+        self.storage = tempfile.mkdtemp()
+        os.environ['GEM5ART_STORAGE'] = self.storage
+        self.db = getDBConnection('file://test.json')
+
+    def tearDown(self):
+        del os.environ['GEM5ART_STORAGE']
+        shutil.rmtree(self.storage)
+        if os.path.exists('test.json'):
+            os.remove('test.json')
+
+    def register(self, data, keep_local = False):
+        def write(out):
+            out.write(data)
+        return Artifact.registerStream(
+            write,
+            name = 'test-stream',
+            typ = 'text',
+            path = 'test-stream.txt',
+            cwd = './',
+            command = 'echo "streamed" > test-stream.txt',
+            documentation = 'This artifact is streamed for testing.',
+            keep_local = keep_local,
+        )
+
+    def test_stream(self):
+        artifact = self.register(b'streamed\n')
+        self.assertFalse(Path('test-stream.txt').exists())
+        self.assertEqual(artifact.hash, hashlib.md5(b'streamed\n').hexdigest())
+        self.assertEqual(artifact.size, 9)
+        self.assertIn(artifact._id, self.db)
+        stored = Path(self.storage) / str(artifact._id)
+        self.assertEqual(stored.read_bytes(), b'streamed\n')
+
+    def test_keep_local(self):
+        try:
+            artifact = self.register(b'streamed\n', keep_local = True)
+            self.assertEqual(Path('test-stream.txt').read_bytes(),
+                             b'streamed\n')
+        finally:
+            os.remove('test-stream.txt')
+
+    def test_duplicate(self):
+        first = self.register(b'streamed\n')
+        second = self.register(b'streamed\n')
+        self.assertEqual(first._id, second._id)
+        self.assertEqual(os.listdir(self.storage), [str(first._id)])
+
+    def test_open(self):
+        artifact = self.register(b'streamed\n')
+        with self.db.openFile(artifact._id) as f:
+            f.seek(3)
+            self.assertEqual(f.read(), b'eamed\n')
+
+    def test_failure(self):
+        def fail(out):
+            out.write(b'partial')
+            raise ValueError()
+        with self.assertRaises(ValueError):
+            Artifact.registerStream(
+                fail,
+                name = 'test-stream',
+                typ = 'text',
+                path = 'test-stream.txt',
+                cwd = './',
+                command = 'echo "streamed" > test-stream.txt',
+                documentation = 'This artifact is streamed for testing.',
+            )
+        self.assertEqual(os.listdir(self.storage), [])
+        self.assertFalse(Path('test-stream.txt').exists())
+
+class TestArtifactFileDBStats(unittest.TestCase):
+    def setUp(self):
+        self.db = getDBConnection('file://test.json')
+        self.runs = [uuid4() for _ in range(3)]
+        names = ['sim_seconds', 'sim_insts']
+        self.db.putStats(self.runs[0], 'sweep-a', names, [[1.0, 10.0]])
+        self.db.putStats(self.runs[1], 'sweep-b', names,
+                         [[2.0, 20.0], [3.0, None]])
+        self.db.putStats(self.runs[2], 'other', ['sim_insts'], [[5.0]])
+
+    def tearDown(self):
+        os.remove('test.stats.json')
+
+    def test_get(self):
+        self.assertEqual(self.db.getStats(self.runs[1]),
+                         {'names': ['sim_seconds', 'sim_insts'],
+                          'dumps': [[2.0, 20.0], [3.0, None]]})
+        self.assertIsNone(self.db.getStats(uuid4()))
+
+    def test_schemas(self):
+        # The names are only stored once for the runs with the same stats
+        with open('test.stats.json') as f:
+            self.assertEqual(len(json.load(f)['schemas']), 2)
+
+    def test_atomic(self):
+        # A failed write leaves the previous file and no temporary file
+        with open('test.stats.json') as f:
+            before = f.read()
+        with patch('json.dump', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.db.putStats(uuid4(), 'failed', ['sim_insts'], [[1.0]])
+        with open('test.stats.json') as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual([f for f in os.listdir('.') if f.endswith('.tmp')],
+                         [])
+
+    def test_search(self):
+        found = list(self.db.searchStats(['sim_seconds'], name_like='sweep'))
+        self.assertEqual({d['name']: d['stats'] for d in found},
+                         {'sweep-a': {'sim_seconds': [1.0]},
+                          'sweep-b': {'sim_seconds': [2.0, 3.0]}})
+
+        # The stats are read back from the file
+        db = getDBConnection('file://test.json')
+        found = list(db.searchStats(['sim_insts'], keys=self.runs[1:]))
+        self.assertEqual([d['_id'] for d in found], self.runs[1:])
 
+    def test_live(self):
+        key = self.runs[0]
+        self.db.putLiveResults(key, 'sweep-a',
+                               {'seq': 1, 'names': ['sim_ticks'],
+                                'dumps': [[2.0]]})
+        self.db.putLiveResults(key, 'sweep-a',
+                               {'seq': 0, 'status': 'Running'})
+        self.assertEqual(self.db.getLiveResults(key),
+                         [{'seq': 0, 'status': 'Running'},
+                          {'seq': 1, 'names': ['sim_ticks'],
+                           'dumps': [[2.0]]}])
+        self.assertEqual(list(self.db.searchLiveResults('sweep')),
+                         [{'_id': key, 'name': 'sweep-a'}])
 
+        self.db.deleteLiveResults(key)
+        self.assertEqual(self.db.getLiveResults(key), [])
+        self.assertEqual(list(self.db.searchLiveResults()), [])
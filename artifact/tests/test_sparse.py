@@ -0,0 +1,83 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for the sparse file helpers"""
+
+import hashlib
+import os
+import unittest
+
+from gem5art.artifact.artifact import getHash
+from gem5art.artifact._sparse import SparseReader, SparseWriter, sparseCopy
+
+class TestSparse(unittest.TestCase):
+    def setUp(self):
+        # A file with a hole at the beginning, some data, a hole in the
+        # middle, and a hole at the end.
+        self.size = 8 * 1024 * 1024
+        with open('test-sparse.img', 'wb') as f:
+            f.seek(3 * 1024 * 1024)
+            f.write(b'gem5art' * 1000)
+            f.seek(6 * 1024 * 1024)
+            f.write(b'disk')
+            f.truncate(self.size)
+        with open('test-sparse.img', 'rb') as f:
+            self.content = f.read()
+
+    def tearDown(self):
+        for name in ['test-sparse.img', 'test-sparse-copy.img']:
+            if os.path.exists(name):
+                os.remove(name)
+
+    def test_hash(self):
+        self.assertEqual(getHash('test-sparse.img'),
+                         hashlib.md5(self.content).hexdigest())
+
+    def test_copy(self):
+        sparseCopy('test-sparse.img', 'test-sparse-copy.img')
+        with open('test-sparse-copy.img', 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_reader(self):
+        with SparseReader('test-sparse.img') as f:
+            data = b''
+            while True:
+                chunk = f.read(255 * 1024)
+                if not chunk:
+                    break
+                data += chunk
+        self.assertEqual(data, self.content)
+
+    def test_writer(self):
+        with SparseWriter('test-sparse-copy.img') as f:
+            for i in range(0, self.size, 255 * 1024):
+                f.write(self.content[i:i + 255 * 1024])
+        with open('test-sparse-copy.img', 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        st = os.stat('test-sparse-copy.img')
+        # Can only check the allocation if the file system supports holes
+        if st.st_blocks * 512 < st.st_size:
+            self.assertLess(st.st_blocks * 512, self.size // 2)
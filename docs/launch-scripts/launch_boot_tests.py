@@ -111,24 +111,24 @@ linux_repo = Artifact.registerArtifact(
 )
 
 linuxes = ['5.4.49', '4.19.83', '4.14.134', '4.9.186', '4.4.186']
-linux_binaries = {
-    version: Artifact.registerArtifact(
-                name = f'vmlinux-{version}',
-                typ = 'kernel',
-                path = f'linux-stable/vmlinux-{version}',
-                cwd = 'linux-stable/',
-                command = f'''cd linux-stable;
-                git checkout v{version};
-                cp ../linux-configs/config.{version} .config;
-                make -j8;
-                cp vmlinux vmlinux-{version};
-                ''',
-                inputs = [experiments_repo, linux_repo,],
-                documentation = f"Kernel binary for {version} with simple "
-                                 "config file",
-            )
+linux_binaries = dict(zip(linuxes, Artifact.registerArtifacts([
+    {
+        'name': f'vmlinux-{version}',
+        'typ': 'kernel',
+        'path': f'linux-stable/vmlinux-{version}',
+        'cwd': 'linux-stable/',
+        'command': f'''cd linux-stable;
+        git checkout v{version};
+        cp ../linux-configs/config.{version} .config;
+        make -j8;
+        cp vmlinux vmlinux-{version};
+        ''',
+        'inputs': [experiments_repo, linux_repo,],
+        'documentation': f"Kernel binary for {version} with simple "
+                          "config file",
+    }
     for version in linuxes
-}
+])))
 
 def worker(run):
     run.run()
@@ -164,7 +164,8 @@ if __name__ == "__main__":
             'disk-image/boot-exit/boot-exit-image/boot-exit',
             linux_binaries[linux], disk_image,
             cpu, mem, num_cpu, boot_type,
-            timeout = 24*60*60 #10 hours
+            timeout = 24*60*60, #24 hours
+            stall_timeout = 60*60 # kill deadlocked runs after an hour
             )
 
     jobs = []
@@ -0,0 +1,69 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This is the gem5art run package"""
+
+from .run import (
+    gem5Run,
+    RunBatchWriter,
+    getRuns,
+    getRunsByName,
+    getRunsByNameLike,
+    getRerunnableRunsByNameLike,
+    getRunsUsingArtifact,
+    getStatsByNameLike,
+    getLiveResultsByNameLike,
+)
+from ._admission import MemoryAdmission
+from ._archive import ArchivePolicy
+from ._diff import compareStats, diffStats
+from ._export import exportStats, loadStatsExport
+from ._gc import ResultsGC
+from ._logwatcher import DEFAULT_FAILURE_SIGNATURES
+from ._placement import CorePlacement
+from ._trace import readTrace
+
+__all__ = [
+    "gem5Run",
+    "RunBatchWriter",
+    "getRuns",
+    "getRunsByName",
+    "getRunsByNameLike",
+    "getRerunnableRunsByNameLike",
+    "getRunsUsingArtifact",
+    "getStatsByNameLike",
+    "getLiveResultsByNameLike",
+    "DEFAULT_FAILURE_SIGNATURES",
+    "CorePlacement",
+    "MemoryAdmission",
+    "ArchivePolicy",
+    "exportStats",
+    "loadStatsExport",
+    "compareStats",
+    "diffStats",
+    "ResultsGC",
+    "readTrace",
+    ]
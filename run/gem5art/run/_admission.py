@@ -0,0 +1,162 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the memory-aware admission of gem5 runs.
+
+A pool of gem5 runs which only limits the number of running jobs either
+runs out of memory (e.g., with many large full system runs) or leaves the
+host idle (e.g., with many small SE runs). The MemoryAdmission estimates the
+memory used by each run and only admits runs while the estimates of all of
+the running runs fit in the memory budget.
+"""
+
+import os
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, \
+    Sequence, Tuple
+
+from gem5art import artifact
+
+if TYPE_CHECKING:
+    from .run import gem5Run
+
+
+# The gem5 binary, run script, and parameters of a run
+Key = Tuple[str, str, Tuple[str, ...]]
+
+
+def _key(gem5_artifact: Any, run_script: Any, params: Iterable[Any]) -> Key:
+    """Returns the key of a run, which may be loaded from the database
+    (with UUIDs and paths as strings)."""
+    return (str(gem5_artifact), str(run_script),
+            tuple(str(p) for p in params))
+
+
+def getAvailableMemory() -> int:
+    """Returns the memory in bytes which is available for new processes
+    (MemAvailable in /proc/meminfo)."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+class MemoryAdmission:
+    """
+    Admits gem5 runs while the sum of their estimated memory fits in the
+    budget.
+
+    The estimate of a run is its memory_hint (in bytes) if it is set.
+    Otherwise, it is the largest peak RSS (see gem5Run.resource_usage) of
+    the previous runs with the same gem5 binary, run script, and parameters
+    (the other artifacts, e.g., the disk image, may differ) times margin,
+    or default_estimate if there are none.
+
+    budget is the memory in bytes for all of the runs. By default, it is
+    the available memory minus headroom (a fraction) when the
+    MemoryAdmission is created.
+
+    A run is always admitted if nothing else is running, so runs which are
+    larger than the budget still run (alone).
+    """
+
+    def __init__(
+        self,
+        budget: Optional[int] = None,
+        default_estimate: int = 2 * 1024 ** 3,
+        margin: float = 1.1,
+        headroom: float = 0.1,
+    ) -> None:
+        if budget is None:
+            budget = int(getAvailableMemory() * (1 - headroom))
+        self.budget = budget
+        self.default_estimate = default_estimate
+        self.margin = margin
+        self.reserved = 0
+        self.running = 0
+
+    def _history(self, runs: Sequence["gem5Run"]) -> Dict[Key, int]:
+        """Returns the largest peak RSS of the previous runs for each gem5
+        binary, run script, and parameters of the runs."""
+        db = artifact.getDBConnection()
+        binaries = {str(run.gem5_artifact._id): run.gem5_artifact._id
+                    for run in runs}
+        history: Dict[Key, int] = {}
+        for binary in binaries.values():
+            # The runs which used the gem5 binary
+            for d in db.getDescendants(binary, depth=1):
+                if d.get("type") not in ("gem5 run", "gem5 run fs"):
+                    continue
+                usage = d.get("resource_usage") or {}
+                if not usage.get("max_rss"):
+                    continue
+                key = _key(d["gem5_artifact"], d["run_script"], d["params"])
+                history[key] = max(history.get(key, 0),
+                                   int(usage["max_rss"]))
+        return history
+
+    def estimate(self, runs: Sequence["gem5Run"]) -> List[int]:
+        """Returns the estimated memory in bytes of each of the runs."""
+        unknown = [run for run in runs if not run.memory_hint]
+        history = self._history(unknown) if unknown else {}
+
+        estimates = []
+        for run in runs:
+            if run.memory_hint:
+                estimates.append(int(run.memory_hint))
+                continue
+            max_rss = history.get(_key(run.gem5_artifact._id,
+                                       run.run_script, run.params))
+            if max_rss:
+                estimates.append(int(max_rss * self.margin))
+            else:
+                estimates.append(self.default_estimate)
+        return estimates
+
+    def pick(self, estimates: Sequence[int]) -> Optional[int]:
+        """Returns the index of the first of the waiting runs (given by
+        their estimates) which can be admitted now, or None."""
+        if not estimates:
+            return None
+        if not self.running:
+            return 0
+        for i, estimate in enumerate(estimates):
+            if self.reserved + estimate <= self.budget:
+                return i
+        return None
+
+    def admit(self, estimate: int) -> None:
+        """Records that a run with the estimate was started."""
+        self.reserved += estimate
+        self.running += 1
+
+    def release(self, estimate: int) -> None:
+        """Records that a run with the estimate is done."""
+        self.reserved -= estimate
+        self.running -= 1
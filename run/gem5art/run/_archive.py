@@ -0,0 +1,613 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the archiving of the results of gem5 runs.
+
+The ZipStreamWriter writes a zip file to any writable stream. It never
+seeks, so the archive can be written to a pipe or directly into an upload
+stream. Members are compressed in parallel by a thread pool (zlib releases
+the GIL) into spooled temporary files and written in order.
+
+Each member gets a method (see chooseMethod): files which are already
+compressed (e.g., gzip'd checkpoints) or which do not compress are stored
+(ZIP_STORED) and streamed straight from the disk, and the others are
+compressed with deflate (ZIP_DEFLATED). Only deflate is used for
+compression so that the archives can be read by any zip tool.
+
+The ArchivePolicy chooses which files of the outdir are archived.
+
+An index of the members (see indexMembers) is stored with the archive so
+that one member can be read from the database with openMember without
+downloading the whole archive.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+from fnmatch import fnmatch
+import io
+import os
+from pathlib import Path
+import stat
+import struct
+import tempfile
+import time
+from typing import (
+    IO,
+    Any,
+    BinaryIO,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+import zipfile
+import zlib
+
+_CHUNK_SIZE = 1024 * 1024
+
+# Sizes and offsets of at least this need the zip64 extensions
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+# Files which are already compressed
+COMPRESSED_SUFFIXES = {
+    ".gz", ".tgz", ".bz2", ".xz", ".zst", ".lz4", ".zip", ".npz",
+    ".png", ".jpg", ".jpeg", ".pdf",
+}
+
+# The deflate levels of the codecs
+CODECS = {
+    "deflate": 6,
+    "fast": 1,
+    "store": 0,
+}
+
+# Files larger than this are sampled to check whether they compress
+_SAMPLE_SIZE = 256 * 1024
+
+
+class ZipMember(NamedTuple):
+    """A member of a zip file written by ZipStreamWriter."""
+
+    name: str
+    method: int
+    crc: int
+    compressed_size: int
+    size: int
+    # The offset of the local header and the offset of the data
+    header_offset: int
+    data_offset: int
+
+
+def _dosTime(mtime: float) -> Tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+    )
+
+
+def chooseMethod(path: Path, size: int, codec: str = "deflate") -> int:
+    """Returns the zip method (ZIP_STORED or ZIP_DEFLATED) for the file."""
+    if codec == "store" or size == 0:
+        return zipfile.ZIP_STORED
+    if path.suffix.lower() in COMPRESSED_SUFFIXES:
+        return zipfile.ZIP_STORED
+    if size > _SAMPLE_SIZE:
+        # Check whether the start of the file compresses
+        with open(path, "rb") as f:
+            sample = f.read(_SAMPLE_SIZE)
+        if len(zlib.compress(sample, 1)) > len(sample) * 0.95:
+            return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+class _Compressed(NamedTuple):
+    """A member which was compressed into a temporary file."""
+
+    data: IO[bytes]
+    crc: int
+    compressed_size: int
+    size: int
+
+
+def _deflate(path: Path, level: int) -> _Compressed:
+    """Compresses the file into a spooled temporary file."""
+    out = tempfile.SpooledTemporaryFile(max_size=8 * _CHUNK_SIZE)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc = 0
+    size = 0
+    compressed_size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            data = compressor.compress(chunk)
+            compressed_size += len(data)
+            out.write(data)
+    data = compressor.flush()
+    compressed_size += len(data)
+    out.write(data)
+    out.seek(0)
+    return _Compressed(out, crc, compressed_size, size) # type: ignore
+
+
+class ZipStreamWriter:
+    """
+    Writes a zip file to out without seeking.
+
+    The members are written in the order in which they are added. Files
+    which are compressed are compressed by a pool of workers threads while
+    the previous members are written.
+
+    codec is "deflate", "fast" (deflate at level 1), or "store" (no
+    compression). The method of each member is chosen by chooseMethod.
+    """
+
+    members: List[ZipMember]
+
+    def __init__(
+        self, out: BinaryIO, codec: str = "deflate", workers: int = 4
+    ) -> None:
+        self._out = out
+        self._offset = 0
+        self._level = CODECS[codec]
+        self._codec = codec
+        self._workers = max(workers, 1)
+        self._pool = ThreadPoolExecutor(max_workers=self._workers)
+        # Members which are waiting to be written
+        self._pending: Deque[Tuple[str, Path, os.stat_result, int,
+                                   Optional["Future[_Compressed]"]]] = deque()
+        self._central: List[bytes] = []
+        self.members = []
+
+    def _write(self, data: bytes) -> None:
+        self._out.write(data)
+        self._offset += len(data)
+
+    def add(self, path: Path, name: str) -> None:
+        """Adds the file or directory at path as name."""
+        st = os.stat(path)
+        if stat.S_ISDIR(st.st_mode):
+            if not name.endswith("/"):
+                name += "/"
+            self._pending.append((name, path, st, zipfile.ZIP_STORED, None))
+        else:
+            method = chooseMethod(path, st.st_size, self._codec)
+            future = None
+            if method == zipfile.ZIP_DEFLATED:
+                future = self._pool.submit(_deflate, path, self._level)
+            self._pending.append((name, path, st, method, future))
+        # Limit the number of members which are compressed ahead
+        while len(self._pending) > 2 * self._workers:
+            self._writePending()
+
+    def addBytes(self, name: str, data: bytes) -> None:
+        """Adds a file with the contents data as name."""
+        now = time.time()
+        st = os.stat_result((stat.S_IFREG | 0o644, 0, 0, 1, 0, 0, len(data),
+                             now, now, now))
+        compressed = zlib.compress(data, max(self._level, 1))[2:-4]
+        future: "Future[_Compressed]" = Future()
+        future.set_result(_Compressed(io.BytesIO(compressed),
+                                      zlib.crc32(data), len(compressed),
+                                      len(data)))
+        self._pending.append((name, Path(name), st, zipfile.ZIP_DEFLATED,
+                              future))
+
+    def _writePending(self) -> None:
+        name, path, st, method, future = self._pending.popleft()
+        if future is not None:
+            compressed = future.result()
+            with compressed.data:
+                self._writeMember(name, st, method, compressed.crc,
+                                  compressed.compressed_size,
+                                  compressed.size, compressed.data)
+        elif stat.S_ISDIR(st.st_mode):
+            self._writeMember(name, st, method, 0, 0, 0, None)
+        else:
+            with open(path, "rb") as f:
+                self._writeStored(name, st, f)
+
+    def _localHeader(
+        self,
+        name: bytes,
+        flags: int,
+        method: int,
+        st: os.stat_result,
+        crc: int,
+        compressed_size: int,
+        size: int,
+        zip64: bool,
+    ) -> bytes:
+        dostime, dosdate = _dosTime(st.st_mtime)
+        extra = b""
+        if zip64:
+            extra = struct.pack("<HHQQ", 1, 16, size, compressed_size)
+            compressed_size = size = 0xFFFFFFFF
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if zip64 else 20, flags, method,
+            dostime, dosdate, crc, compressed_size, size, len(name),
+            len(extra),
+        ) + name + extra
+
+    def _writeMember(
+        self,
+        name: str,
+        st: os.stat_result,
+        method: int,
+        crc: int,
+        compressed_size: int,
+        size: int,
+        data: Optional[IO[bytes]],
+    ) -> None:
+        """Writes a member whose size and CRC are known."""
+        encoded = name.encode()
+        flags = 0x800 # UTF-8 names
+        zip64 = max(size, compressed_size) >= _ZIP64_LIMIT
+        header_offset = self._offset
+        self._write(self._localHeader(encoded, flags, method, st, crc,
+                                      compressed_size, size, zip64))
+        data_offset = self._offset
+        if data is not None:
+            while True:
+                chunk = data.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._write(chunk)
+        self._addMember(encoded, flags, method, st, crc, compressed_size,
+                        size, header_offset, data_offset)
+
+    def _writeStored(self, name: str, st: os.stat_result, f: BinaryIO) -> None:
+        """Streams a stored member. The CRC is only known at the end, so it
+        is written in a data descriptor after the data."""
+        encoded = name.encode()
+        flags = 0x800 | 0x8 # UTF-8 names, data descriptor
+        zip64 = st.st_size >= _ZIP64_LIMIT
+        header_offset = self._offset
+        self._write(self._localHeader(encoded, flags, zipfile.ZIP_STORED, st,
+                                      0, 0, 0, zip64))
+        data_offset = self._offset
+        crc = 0
+        size = 0
+        while True:
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            self._write(chunk)
+        if zip64:
+            self._write(struct.pack("<IIQQ", 0x08074B50, crc, size, size))
+        else:
+            self._write(struct.pack("<IIII", 0x08074B50, crc, size, size))
+        self._addMember(encoded, flags, zipfile.ZIP_STORED, st, crc, size,
+                        size, header_offset, data_offset)
+
+    def _addMember(
+        self,
+        name: bytes,
+        flags: int,
+        method: int,
+        st: os.stat_result,
+        crc: int,
+        compressed_size: int,
+        size: int,
+        header_offset: int,
+        data_offset: int,
+    ) -> None:
+        """Records the central directory entry of a member."""
+        self.members.append(ZipMember(name.decode(), method, crc,
+                                      compressed_size, size, header_offset,
+                                      data_offset))
+
+        # The zip64 extra only has the fields which do not fit
+        fields = []
+        if size >= _ZIP64_LIMIT:
+            fields.append(size)
+            size = 0xFFFFFFFF
+        if compressed_size >= _ZIP64_LIMIT:
+            fields.append(compressed_size)
+            compressed_size = 0xFFFFFFFF
+        if header_offset >= _ZIP64_LIMIT:
+            fields.append(header_offset)
+            header_offset = 0xFFFFFFFF
+        extra = b""
+        if fields:
+            extra = struct.pack(f"<HH{len(fields)}Q", 1, 8 * len(fields),
+                                *fields)
+
+        dostime, dosdate = _dosTime(st.st_mtime)
+        attributes = (st.st_mode & 0xFFFF) << 16
+        if stat.S_ISDIR(st.st_mode):
+            attributes |= 0x10 # MS-DOS directory flag
+        version = 45 if fields else 20
+        self._central.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | version, version,
+            flags, method, dostime, dosdate, crc, compressed_size, size,
+            len(name), len(extra), 0, 0, 0, attributes, header_offset,
+        ) + name + extra)
+
+    def close(self) -> None:
+        """Writes the remaining members and the central directory."""
+        try:
+            while self._pending:
+                self._writePending()
+        finally:
+            self._pool.shutdown()
+
+        start = self._offset
+        for entry in self._central:
+            self._write(entry)
+        size = self._offset - start
+        count = len(self._central)
+
+        if (count >= 0xFFFF or start >= _ZIP64_LIMIT
+                or size >= _ZIP64_LIMIT):
+            end64 = self._offset
+            self._write(struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count,
+                size, start,
+            ))
+            self._write(struct.pack("<IIQI", 0x07064B50, 0, end64, 1))
+            count = min(count, 0xFFFF)
+            size = min(size, 0xFFFFFFFF)
+            start = min(start, 0xFFFFFFFF)
+        self._write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count,
+                                size, start, 0))
+
+    def __enter__(self) -> "ZipStreamWriter":
+        return self
+
+    def __exit__(self, typ: Any, *args: Any) -> None:
+        if typ is None:
+            self.close()
+            return
+        # Don't finish a broken archive. (shutdown(cancel_futures=True)
+        # needs Python 3.9.)
+        futures = [p[4] for p in self._pending if p[4] is not None]
+        for future in futures:
+            future.cancel()
+        self._pool.shutdown()
+        for future in futures:
+            if not future.cancelled() and future.exception() is None:
+                future.result().data.close()
+
+
+def writeArchive(
+    out: BinaryIO,
+    files: Iterable[Tuple[Path, str]],
+    codec: str = "deflate",
+    workers: int = 4,
+) -> List[ZipMember]:
+    """Writes the files, given as (path, name in the archive), as a zip file
+    to out and returns the members."""
+    with ZipStreamWriter(out, codec, workers) as writer:
+        for path, name in files:
+            writer.add(path, name)
+    return writer.members
+
+
+def indexMembers(members: Iterable[ZipMember]) -> Dict[str, List[int]]:
+    """Returns an index of the members which is stored with an archive so
+    that a member can be read (see openMember) without reading the central
+    directory. Each name maps to [method, crc, compressed size, size, data
+    offset]."""
+    return {
+        m.name: [m.method, m.crc, m.compressed_size, m.size, m.data_offset]
+        for m in members
+    }
+
+
+def findMember(f: BinaryIO, name: str) -> List[int]:
+    """Returns the index entry (see indexMembers) of a member of the zip file
+    in the seekable f. Only the central directory and the local header of
+    the member are read. Raises KeyError if there is no such member."""
+    with zipfile.ZipFile(f) as zf:
+        info = zf.getinfo(name)
+    f.seek(info.header_offset)
+    header = f.read(30)
+    if len(header) < 30 or header[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local header for {name}")
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    data_offset = info.header_offset + 30 + name_length + extra_length
+    return [info.compress_type, info.CRC, info.compress_size, info.file_size,
+            data_offset]
+
+
+class _MemberReader(io.RawIOBase):
+    """A read-only file object which decompresses one member of a zip file
+    from a seekable stream. Only the bytes of the member are read from the
+    stream, and the stream is closed with the reader."""
+
+    def __init__(self, f: BinaryIO, entry: Sequence[int]) -> None:
+        method, crc, compressed_size, _, data_offset = entry
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise NotImplementedError(f"Unsupported zip method {method}")
+        self._f = f
+        self._offset = data_offset
+        self._remaining = compressed_size
+        self._expected_crc = crc
+        self._crc = 0
+        self._decompressor = (
+            zlib.decompressobj(-zlib.MAX_WBITS)
+            if method == zipfile.ZIP_DEFLATED
+            else None
+        )
+        self._buffer = b""
+        self._buffer_pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _readRaw(self) -> bytes:
+        self._f.seek(self._offset)
+        data = self._f.read(min(_CHUNK_SIZE, self._remaining))
+        if not data:
+            raise zipfile.BadZipFile("The zip file is truncated")
+        self._offset += len(data)
+        self._remaining -= len(data)
+        return data
+
+    def _fill(self) -> bytes:
+        """Returns the next decompressed data or b"" at the end."""
+        if self._decompressor is None:
+            return self._readRaw() if self._remaining else b""
+        while True:
+            if self._decompressor.unconsumed_tail:
+                data = self._decompressor.unconsumed_tail
+            elif self._remaining:
+                data = self._readRaw()
+            elif self._decompressor.eof:
+                return b""
+            else:
+                raise zipfile.BadZipFile("The compressed data is truncated")
+            # Bound the memory used by data which compresses very well
+            out = self._decompressor.decompress(data, _CHUNK_SIZE)
+            if out:
+                return out
+
+    def readinto(self, b) -> int: # type: ignore
+        if self._buffer_pos == len(self._buffer):
+            self._buffer = self._fill()
+            self._buffer_pos = 0
+            if not self._buffer:
+                if self._crc != self._expected_crc:
+                    raise zipfile.BadZipFile("Bad CRC-32")
+                return 0
+            self._crc = zlib.crc32(self._buffer, self._crc)
+        n = min(len(b), len(self._buffer) - self._buffer_pos)
+        view = memoryview(self._buffer)
+        memoryview(b)[:n] = view[self._buffer_pos:self._buffer_pos + n]
+        self._buffer_pos += n
+        return n
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+def openMember(f: BinaryIO, entry: Sequence[int]) -> BinaryIO:
+    """Returns a file object which reads the (decompressed) member of the
+    zip file in the seekable f with the index entry (see indexMembers or
+    findMember). The CRC is checked at the end of the member. Closing the
+    file object closes f."""
+    return io.BufferedReader(_MemberReader(f, entry)) # type: ignore
+
+
+class ArchivePolicy:
+    """
+    Chooses what to do with each file of an outdir when it is archived.
+
+    The paths of the files relative to the outdir are matched against the
+    glob patterns (see fnmatch; "*" also matches "/"). A pattern which
+    matches a directory applies to all of the files in it.
+
+    - include: only files which match one of these are archived.
+    - exclude: files which match one of these are not archived.
+    - max_member_size: files larger than this (in bytes) are not archived.
+    - separate_size: files larger than this (in bytes) are stored as
+      separate artifacts instead of in the archive.
+
+    Sizes of 0 mean no limit.
+    """
+
+    def __init__(
+        self,
+        include: Sequence[str] = ("*",),
+        exclude: Sequence[str] = (),
+        max_member_size: int = 0,
+        separate_size: int = 0,
+    ) -> None:
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.max_member_size = max_member_size
+        self.separate_size = separate_size
+
+    def toDict(self) -> Dict[str, Any]:
+        return {
+            "include": self.include,
+            "exclude": self.exclude,
+            "max_member_size": self.max_member_size,
+            "separate_size": self.separate_size,
+        }
+
+    @staticmethod
+    def _matches(relative: str, patterns: Sequence[str]) -> bool:
+        parts = relative.split("/")
+        prefixes = ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+        return any(fnmatch(prefix, pattern)
+                   for pattern in patterns for prefix in prefixes)
+
+    def decide(self, relative: str, size: int) -> str:
+        """Returns what to do with the file: "archive", "artifact",
+        "excluded", or "too large"."""
+        if (not self._matches(relative, self.include)
+                or self._matches(relative, self.exclude)):
+            return "excluded"
+        if self.separate_size and size > self.separate_size:
+            return "artifact"
+        if self.max_member_size and size > self.max_member_size:
+            return "too large"
+        return "archive"
+
+    def plan(
+        self, outdir: Path, skip: Sequence[str] = ()
+    ) -> List[Tuple[Path, str, int, str]]:
+        """Returns (path, path relative to outdir, size, decision) for each
+        file and directory of the outdir, except the relative paths in
+        skip. Directories are archived if any of their files are."""
+        entries = []
+        for path in sorted(outdir.glob("**/*")):
+            relative = path.relative_to(outdir).as_posix()
+            if relative in skip:
+                continue
+            if path.is_dir():
+                entries.append((path, relative, 0, ""))
+                continue
+            size = path.stat().st_size
+            entries.append((path, relative, size, self.decide(relative, size)))
+
+        # Keep the directories of the archived files
+        needed: Set[str] = set()
+        for _, relative, _, decision in entries:
+            if decision == "archive":
+                parts = relative.split("/")
+                needed.update("/".join(parts[:i]) for i in range(1, len(parts)))
+        return [
+            (path, relative, size, decision or (
+                "archive" if relative in needed else "excluded"))
+            for path, relative, size, decision in entries
+        ]
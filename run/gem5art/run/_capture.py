@@ -0,0 +1,220 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the capture of the stdout and stderr of gem5.
+
+Each stream is read from a pipe, either by a thread or by an asyncio event
+loop, and written to a ring of gzip compressed segment files in the outdir
+(e.g., stdout.0.gz, stdout.1.gz). When there are too many segments, the
+oldest one is removed, so the output of a run never takes more than a
+bounded amount of space. The first and last bytes of each stream are kept
+in memory to be stored with the run.
+"""
+
+import asyncio
+from collections import deque
+import gzip
+import os
+from pathlib import Path
+import threading
+from typing import IO, Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# The number of bytes read from the pipe at once
+_READ_SIZE = 64 * 1024
+
+Failure = Tuple[str, str, str]
+
+
+class OutputCapture:
+    """
+    Captures a stream (e.g., the stdout pipe of gem5).
+
+    The stream is read either by a background thread (see captureStream) or
+    by an asyncio event loop (see captureAsync).
+
+    Each chunk of the stream is passed to check, which returns a failure
+    (see LogWatcher.feed) or None. A failure is kept until it is taken with
+    takeFailure().
+
+    segment_bytes is the (uncompressed) size of each segment file and at
+    most max_segments files are kept. The first and last summary_bytes of
+    the stream are kept in memory.
+    """
+
+    failure: Optional[Failure]
+
+    def __init__(
+        self,
+        name: str,
+        outdir: Path,
+        check: Callable[[str, bytes], Optional[Failure]],
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_segments: int = 4,
+        summary_bytes: int = 16 * 1024,
+    ) -> None:
+        self.name = name
+        self.failure = None
+        self._outdir = outdir
+        self._check = check
+        self._segment_bytes = segment_bytes
+        self._max_segments = max(max_segments, 1)
+        self._summary_bytes = summary_bytes
+
+        self._head = bytearray()
+        self._tail: Deque[bytes] = deque()
+        self._tail_size = 0
+        self._total = 0
+        self._dropped = 0
+        self._segments: Deque[Tuple[Path, int]] = deque()
+        self._index = 0
+        self._out: Optional[gzip.GzipFile] = None
+        self._written = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def captureStream(self, stream: IO[bytes]) -> None:
+        """Starts a background thread which captures the stream until its
+        end."""
+        def capture() -> None:
+            fd = stream.fileno()
+            try:
+                while True:
+                    data = os.read(fd, _READ_SIZE)
+                    if not data:
+                        break
+                    self.write(data)
+            finally:
+                self.close()
+                stream.close()
+
+        self._thread = threading.Thread(
+            target=capture, name=f"gem5 {self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def captureAsync(
+        self, stream: IO[bytes], loop: asyncio.AbstractEventLoop
+    ) -> "asyncio.Future[None]":
+        """Captures the stream in the event loop. Returns a future which is
+        done at the end of the stream."""
+        fd = stream.fileno()
+        os.set_blocking(fd, False)
+        done = loop.create_future()
+
+        def readable() -> None:
+            try:
+                data = os.read(fd, _READ_SIZE)
+                if data:
+                    self.write(data)
+                    return
+            except BlockingIOError:
+                return
+            except Exception as e:
+                done.set_exception(e)
+            else:
+                done.set_result(None)
+            loop.remove_reader(fd)
+            self.close()
+            stream.close()
+
+        loop.add_reader(fd, readable)
+        return done
+
+    def write(self, data: bytes) -> None:
+        """Captures the next bytes of the stream."""
+        self._summarize(data)
+        if self.failure is None:
+            self.failure = self._check(self.name, data)
+
+        while data:
+            if self._out is None:
+                path = self._outdir / f"{self.name}.{self._index}.gz"
+                self._out = gzip.open(path, "wb", compresslevel=1)
+                self._segments.append((path, 0))
+                self._index += 1
+                self._written = 0
+                self._dropOldSegments()
+            n = min(len(data), self._segment_bytes - self._written)
+            self._out.write(data[:n])
+            self._written += n
+            data = data[n:]
+            path, _ = self._segments[-1]
+            self._segments[-1] = (path, self._written)
+            if self._written >= self._segment_bytes:
+                self._out.close()
+                self._out = None
+
+    def close(self) -> None:
+        """Finishes the current segment file."""
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+    def _dropOldSegments(self) -> None:
+        while len(self._segments) > self._max_segments:
+            path, size = self._segments.popleft()
+            self._dropped += size
+            os.remove(path)
+
+    def _summarize(self, data: bytes) -> None:
+        self._total += len(data)
+        if len(self._head) < self._summary_bytes:
+            self._head += data[:self._summary_bytes - len(self._head)]
+        self._tail.append(data)
+        self._tail_size += len(data)
+        while self._tail_size - len(self._tail[0]) >= self._summary_bytes:
+            self._tail_size -= len(self._tail.popleft())
+
+    @property
+    def bytes(self) -> int:
+        """The number of bytes captured so far."""
+        return self._total
+
+    def takeFailure(self) -> Optional[Failure]:
+        """Returns the failure found in the stream, if any, and clears it."""
+        failure = self.failure
+        if failure is not None:
+            # The thread only sets failure when it is None
+            self.failure = None
+        return failure
+
+    def join(self) -> None:
+        """Waits until the background thread (if any) has captured the end
+        of the stream."""
+        if self._thread is not None:
+            self._thread.join()
+
+    def summary(self) -> Dict[str, Any]:
+        """Returns the summary of the captured stream to be stored with the
+        run. The head and tail are only complete at the end of the stream."""
+        tail = b"".join(self._tail)[-self._summary_bytes:]
+        files: List[str] = [path.name for path, _ in self._segments]
+        return {
+            "bytes": self._total,
+            "dropped_bytes": self._dropped,
+            "files": files,
+            "head": bytes(self._head).decode(errors="replace"),
+            "tail": tail.decode(errors="replace"),
+        }
@@ -0,0 +1,219 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the comparison of the stats of runs.
+
+Two runs, or two groups of runs (e.g., the same sweep with an old and a new
+gem5 binary) which are paired by their parameters, are compared on every
+stat at once: the values are aligned into one matrix per side (a row for
+each pair of runs and a column for each stat) and the relative deltas are
+computed with NumPy. The values which differ by more than the tolerances
+are reported, largest deltas first.
+
+NumPy is only needed to compare stats. It is not required by gem5art.
+"""
+
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, \
+    Union
+from uuid import UUID
+
+from gem5art.artifact._artifactdb import ArtifactDB
+
+from ._export import NUMPY_SUPPORT, _expandStats
+
+if NUMPY_SUPPORT:
+    import numpy as np # type: ignore
+
+
+def compareStats(
+    base: Any, new: Any, rtol: float = 0.01, atol: float = 0.0,
+    limit: int = 0
+) -> Tuple[Any, Any, Any]:
+    """Compares two arrays of stats with the same shape (rows × stats, NaN
+    for missing values) element-wise.
+
+    A value differs if |new - base| > atol + rtol * |base| (like
+    numpy.isclose) or if it is missing on only one side. Returns the row
+    indices, the column indices, and the relative deltas ((new - base) /
+    |base|, NaN if a value is missing) of the values which differ, ranked by
+    the magnitude of the delta. Missing values and values which were 0 in
+    base rank first. Only the first limit values are returned (0 means no
+    limit).
+    """
+    if not NUMPY_SUPPORT:
+        raise Exception("NumPy is required to compare stats")
+    base = np.asarray(base, dtype=np.float64)
+    new = np.asarray(new, dtype=np.float64)
+    if base.shape != new.shape or base.ndim != 2:
+        raise ValueError("The stats to compare must be 2D arrays with the "
+                         "same shape")
+
+    with np.errstate(invalid="ignore"):
+        diff = new - base
+        differs = np.abs(diff) > atol + rtol * np.abs(base)
+        differs |= np.isnan(base) != np.isnan(new)
+    rows, cols = np.nonzero(differs)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rel = diff[rows, cols] / np.abs(base[rows, cols])
+    magnitude = np.where(np.isnan(rel), np.inf, np.abs(rel))
+    if limit and limit < len(rel):
+        # Only sort the largest deltas
+        top = np.argpartition(-magnitude, limit - 1)[:limit]
+        order = top[np.argsort(-magnitude[top], kind="stable")]
+    else:
+        order = np.argsort(-magnitude, kind="stable")
+    return rows[order], cols[order], rel[order]
+
+
+def _runs(
+    db: ArtifactDB, runs: Union[str, UUID], fs_only: bool
+) -> List[Dict[str, Any]]:
+    """Returns the documents of the run with the _id runs or of the runs
+    whose name matches the regex runs."""
+    if isinstance(runs, UUID):
+        return [db.get(runs)]
+    types = ["gem5 run fs"] if fs_only else ["gem5 run", "gem5 run fs"]
+    docs: List[Dict[str, Any]] = []
+    for typ in types:
+        docs.extend(db.searchByLikeNameType(runs, typ, limit=0))
+    return docs
+
+
+def _byParams(
+    docs: Iterable[Dict[str, Any]], match: Optional[Sequence[int]]
+) -> Dict[Tuple[str, ...], UUID]:
+    """Returns the _id of the run for each distinct parameters (only the
+    ones at the indices in match, if it is given). Of the runs with the
+    same parameters, the one which ended last is used."""
+    runs: Dict[Tuple[str, ...], Tuple[float, UUID]] = {}
+    for d in docs:
+        params = [str(p) for p in d.get("params", [])]
+        if match is not None:
+            params = [params[i] for i in match if i < len(params)]
+        key = tuple(params)
+        end = float(d.get("end_time") or 0.0)
+        if key not in runs or end >= runs[key][0]:
+            runs[key] = (end, UUID(str(d["_id"])))
+    return {key: run for key, (_, run) in runs.items()}
+
+
+def _matrix(
+    runs: List[Dict[str, List[Optional[float]]]], names: List[str], dump: int
+) -> Any:
+    """Returns the values of the stats in the dump of each run (as returned
+    by searchStats) as a runs × names array, with NaN for missing values."""
+    values = np.full((len(runs), len(names)), np.nan)
+    index = {name: j for j, name in enumerate(names)}
+    # Runs of the same configuration have the same stats in the same order
+    columns: Dict[Tuple[str, ...], Any] = {}
+    for i, stats in enumerate(runs):
+        if not stats:
+            continue
+        layout = tuple(stats)
+        if layout not in columns:
+            columns[layout] = np.array([index[name] for name in layout],
+                                       dtype=np.intp)
+        # Every stat of a run has a value in each of its dumps
+        dumps = len(next(iter(stats.values()), []))
+        if not -dumps <= dump < dumps:
+            continue
+        values[i, columns[layout]] = np.array(
+            list(map(itemgetter(dump), stats.values())), dtype=np.float64
+        )
+    return values
+
+
+def diffStats(
+    db: ArtifactDB,
+    base: Union[str, UUID],
+    new: Union[str, UUID],
+    stats: Optional[Iterable[str]] = None,
+    dump: int = -1,
+    rtol: float = 0.01,
+    atol: float = 0.0,
+    match: Optional[Sequence[int]] = None,
+    limit: int = 0,
+    fs_only: bool = False,
+) -> List[Dict[str, Any]]:
+    """Compares the stored stats of two runs or of two groups of runs and
+    returns the stats which differ by more than the tolerances (see
+    compareStats), largest relative deltas first.
+
+    base and new are either the _ids of two runs or regexes of the names
+    of two groups of runs (see getRunsByNameLike). The runs in the groups
+    are paired by their parameters or, if match is given, only by the
+    parameters at those indices (e.g., to leave out the path of the gem5
+    binary). Runs without a pair or without stored stats are left out.
+
+    stats are the names of the stats or glob patterns (e.g.,
+    "system.cpu*.ipc"), or all of the stats if None. The values in the dump
+    with the index dump (the last one by default) are compared. At most
+    limit differences are returned (0 means no limit).
+
+    Each difference is a dictionary with the "stat", the "params" used to
+    pair the runs, the "base_run" and "new_run" _ids, their "base" and
+    "new" values (None if missing) and the relative "delta".
+    """
+    if not NUMPY_SUPPORT:
+        raise Exception("NumPy is required to compare stats")
+
+    pairs: List[Tuple[Tuple[str, ...], UUID, UUID]]
+    if isinstance(base, UUID) and isinstance(new, UUID):
+        pairs = [((), base, new)]
+    else:
+        base_runs = _byParams(_runs(db, base, fs_only), match)
+        new_runs = _byParams(_runs(db, new, fs_only), match)
+        pairs = [(key, run, new_runs[key]) for key, run in base_runs.items()
+                 if key in new_runs]
+
+    names = (_expandStats(db, stats) if stats is not None
+             else db.getStatsNames())
+    keys = [run for _, b, n in pairs for run in (b, n)]
+    found = {f["_id"]: f["stats"]
+             for f in db.searchStats(names, keys=keys)} if keys else {}
+    pairs = [p for p in pairs if p[1] in found and p[2] in found]
+
+    base_values = _matrix([found[b] for _, b, _ in pairs], names, dump)
+    new_values = _matrix([found[n] for _, _, n in pairs], names, dump)
+    rows, cols, deltas = compareStats(base_values, new_values, rtol, atol,
+                                      limit)
+
+    def value(x: float) -> Optional[float]:
+        return None if np.isnan(x) else float(x)
+
+    return [
+        {
+            "stat": names[j],
+            "params": list(pairs[i][0]),
+            "base_run": pairs[i][1],
+            "new_run": pairs[i][2],
+            "base": value(base_values[i, j]),
+            "new": value(new_values[i, j]),
+            "delta": float(delta),
+        }
+        for i, j, delta in zip(rows.tolist(), cols.tolist(), deltas.tolist())
+    ]
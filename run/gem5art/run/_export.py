@@ -0,0 +1,225 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the export of the stats of many runs into columns.
+
+The stats which are stored in the database when runs finish (see
+gem5Run.saveStats) are exported into one NumPy array per column, with a row
+for each run. The columns are saved as a .npz file or as a directory of .npy
+files, which can be memory mapped. Exports are incremental: only the runs
+which are not in the export yet are read from the database.
+
+NumPy is only needed to export stats. It is not required by gem5art.
+"""
+
+import fnmatch
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+from uuid import UUID
+
+from gem5art.artifact._artifactdb import ArtifactDB
+
+try:
+    import numpy as np # type: ignore
+    NUMPY_SUPPORT = True
+except ModuleNotFoundError:
+    # If numpy isn't installed, then disable the export
+    NUMPY_SUPPORT = False
+
+# The columns which are not stats
+RUN_ID = "run_id"
+NAME = "name"
+_STATS = "_stats"
+_DUMP = "_dump"
+
+
+def _expandStats(db: ArtifactDB, patterns: Iterable[str]) -> List[str]:
+    """Returns the stats names matching the names or glob patterns, in the
+    order of the patterns."""
+    names: Dict[str, None] = {}
+    all_names: Optional[List[str]] = None
+    for pattern in patterns:
+        if not any(c in pattern for c in "*?["):
+            names[pattern] = None
+            continue
+        if all_names is None:
+            all_names = db.getStatsNames()
+        for name in fnmatch.filter(all_names, pattern):
+            names[name] = None
+    return list(names)
+
+
+def _numParams(columns: Dict[str, Any]) -> int:
+    """Returns the number of param<i> columns."""
+    return sum(1 for c in columns
+               if c.startswith("param") and c.endswith("_categories"))
+
+
+def _pick(values: Optional[Sequence[Optional[float]]], dump: int
+          ) -> Optional[float]:
+    """Returns the value in the dump or None if there is no such dump."""
+    if not values or not -len(values) <= dump < len(values):
+        return None
+    return values[dump]
+
+
+def loadStatsExport(path: Union[str, Path], mmap: bool = True
+                    ) -> Dict[str, Any]:
+    """Returns the columns of an export (see exportStats).
+
+    If the export is a directory of .npy files and mmap is true, the arrays
+    are memory mapped instead of read.
+    """
+    if not NUMPY_SUPPORT:
+        raise Exception("NumPy is required to load exported stats")
+    path = Path(path)
+    if path.suffix == ".npz":
+        with np.load(path) as f:
+            return {name: f[name] for name in f.files}
+    return {
+        p.name[: -len(".npy")]: np.load(p, mmap_mode="r" if mmap else None)
+        for p in path.glob("*.npy")
+    }
+
+
+def _saveStatsExport(path: Path, columns: Dict[str, Any]) -> None:
+    """Writes the columns as a .npz file or as a directory of .npy files.
+    Each file is replaced only once it is complete."""
+    if path.suffix == ".npz":
+        tmp = path.with_name(f"{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **columns)
+        os.replace(tmp, path)
+        return
+    os.makedirs(path, exist_ok=True)
+    for p in path.glob("*.npy"):
+        if p.name[: -len(".npy")] not in columns:
+            # A column of an older export
+            os.remove(p)
+    for name, column in columns.items():
+        tmp = path / f"{name}.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, column)
+        os.replace(tmp, path / f"{name}.npy")
+
+
+def exportStats(
+    db: ArtifactDB,
+    path: Union[str, Path],
+    name: str,
+    stats: Iterable[str],
+    dump: int = -1,
+    fs_only: bool = False,
+) -> Dict[str, Any]:
+    """Exports the stats of the runs which have the field "name" matching
+    the name parameter (a regex, see getRunsByNameLike) to path and returns
+    the columns.
+
+    stats are the names of the stats or glob patterns (e.g.,
+    "system.cpu*.ipc"). The value of each stat in the dump with the index
+    dump (the last one by default) is exported. Missing values are NaN.
+
+    The columns are:
+    - run_id: the UUID of each run as a string
+    - name: the name of each run
+    - param<i>: the index of the i-th parameter of each run in
+      param<i>_categories (or -1 if the run has fewer parameters), e.g.,
+      for pandas.Categorical.from_codes()
+    - one float64 column for each stat
+
+    If path ends with .npz, the columns are stored in a .npz file.
+    Otherwise, path is a directory with one .npy file for each column.
+
+    If path already has an export of the same stats and dump, only the runs
+    which are not in it are read from the database and appended. If fs_only
+    is True, then only full system runs are exported.
+    """
+    if not NUMPY_SUPPORT:
+        raise Exception("NumPy is required to export stats")
+    path = Path(path)
+    names = _expandStats(db, stats)
+
+    old: Dict[str, Any] = {}
+    if path.exists():
+        old = loadStatsExport(path, mmap=False)
+        if (
+            list(old.get(_STATS, [])) != names
+            or int(old.get(_DUMP, dump)) != dump
+        ):
+            # The stats changed, so export every run again
+            old = {}
+    known = set(old[RUN_ID]) if old else set()
+
+    types = ["gem5 run fs"] if fs_only else ["gem5 run", "gem5 run fs"]
+    params: Dict[UUID, List[str]] = {}
+    for typ in types:
+        for d in db.searchByLikeNameType(name, typ, limit=0):
+            if str(d["_id"]) not in known:
+                params[UUID(str(d["_id"]))] = [str(p) for p in
+                                               d.get("params", [])]
+
+    # Runs which have not stored their stats yet are left for later exports
+    found = list(db.searchStats(names, keys=list(params))) if params else []
+    found.sort(key=lambda f: str(f["_id"]))
+
+    columns: Dict[str, Any] = {
+        _STATS: np.array(names, dtype=str),
+        _DUMP: np.array(dump),
+        RUN_ID: np.array([str(f["_id"]) for f in found], dtype=str),
+        NAME: np.array([f["name"] for f in found], dtype=str),
+    }
+
+    run_params = [params[f["_id"]] for f in found]
+    num_params = max([len(p) for p in run_params] +
+                     [_numParams(old)])
+    for i in range(num_params):
+        # New categories are appended so that the old codes stay valid
+        categories = list(old.get(f"param{i}_categories", []))
+        index = {c: code for code, c in enumerate(categories)}
+        codes = [index.setdefault(p[i], len(index)) if i < len(p) else -1
+                 for p in run_params]
+        categories = list(index)
+        columns[f"param{i}"] = np.array(codes, dtype=np.int32)
+        columns[f"param{i}_categories"] = np.array(categories, dtype=str)
+
+    for stat in names:
+        columns[stat] = np.array(
+            [_pick(f["stats"].get(stat), dump) for f in found],
+            dtype=np.float64,
+        )
+
+    if old:
+        for column in [RUN_ID, NAME] + names:
+            columns[column] = np.concatenate([old[column], columns[column]])
+        for i in range(num_params):
+            column = f"param{i}"
+            previous = old.get(column,
+                               np.full(len(old[RUN_ID]), -1, dtype=np.int32))
+            columns[column] = np.concatenate([previous, columns[column]])
+
+    _saveStatsExport(path, columns)
+    return columns
@@ -0,0 +1,325 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the garbage collection of the results of gem5 runs.
+
+Nothing is ever removed from the database by gem5art itself: every rerun
+adds another run with its results, and failed runs stay forever. ResultsGC
+removes the runs, results, files, and stats which are no longer needed:
+
+1. Retention: for each run hash, the latest successful run is kept, as are
+   pinned runs. Other successful runs (i.e., superseded by a rerun) are
+   kept for keep_superseded seconds and failed runs for keep_failed
+   seconds. If the files of the results of these runs are larger than
+   max_bytes, the oldest runs which are only kept by these rules are
+   dropped until they fit.
+2. Mark: everything which can be reached from the kept runs and from all
+   of the artifacts which are not results of runs (through inputs, results,
+   and result_artifacts) is kept. Only runs and their results are ever
+   garbage.
+3. Sweep: the garbage runs are deleted one at a time, each after its
+   results (files first, then documents), so a sweep which is interrupted
+   can always be finished by the next one. Then the stored files without
+   any document (e.g., left by a crashed upload) are deleted.
+
+Everything which is younger than the grace period is kept, so the runs and
+uploads which are being written are never collected. The sweep works in
+batches, which can be limited and paused between, so it never holds up the
+runs which are writing to the database.
+"""
+
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, \
+    Tuple
+from uuid import UUID
+
+from gem5art.artifact._artifactdb import ArtifactDB
+
+RUN_TYPES = ("gem5 run", "gem5 run fs")
+
+DAY = 24 * 60 * 60.0
+
+# The fields of the documents which are needed to find the garbage
+_FIELDS = ["type", "hash", "status", "time", "end_time", "inputs", "results",
+           "result_artifacts", "pinned"]
+
+
+class GCPlan(NamedTuple):
+    """The garbage found by ResultsGC.plan."""
+
+    # The garbage runs and, for each one, the results which are deleted
+    # with it (their documents and files)
+    runs: Dict[str, List[str]]
+    # The files without a document
+    files: List[str]
+    # The partial results of lost runs (see LiveSync)
+    live: List[str]
+    # The size of all of the files which are deleted
+    bytes: int
+
+
+def _refs(doc: Dict[str, Any], results_only: bool = False) -> List[str]:
+    """Returns the _ids of the documents which doc refers to."""
+    refs = [str(key) for key in doc.get("result_artifacts", [])]
+    if doc.get("results"):
+        refs.append(str(doc["results"]))
+    if not results_only:
+        refs += [str(key) for key in doc.get("inputs", [])]
+    return refs
+
+
+def _time(doc: Dict[str, Any]) -> float:
+    """Returns when the run ended or the artifact was created."""
+    return float(doc.get("end_time") or doc.get("time") or 0.0)
+
+
+class ResultsGC:
+    """
+    Garbage collects the results of runs in the database.
+
+    keep_failed and keep_superseded are the number of seconds after which
+    failed runs and successful runs which are not the latest of their hash
+    are collected. max_bytes (0 for no limit) is the budget for the files
+    of the results of the runs which are only kept by these rules. pinned is
+    a list of _ids of runs which are never collected (runs with a true
+    "pinned" field are never collected either). Nothing younger than grace
+    seconds is collected.
+
+    The sweep deletes batch_size runs at a time and sleeps pause seconds
+    between batches.
+    """
+
+    def __init__(
+        self,
+        db: ArtifactDB,
+        keep_failed: float = 7 * DAY,
+        keep_superseded: float = 0.0,
+        max_bytes: int = 0,
+        grace: float = DAY,
+        pinned: Iterable[UUID] = (),
+        batch_size: int = 100,
+        pause: float = 0.0,
+    ) -> None:
+        self.db = db
+        self.keep_failed = keep_failed
+        self.keep_superseded = keep_superseded
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.pinned = {str(key) for key in pinned}
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def _retain(
+        self, runs: List[Dict[str, Any]], now: float
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Returns the runs which are always kept and the runs which are
+        kept by the retention rules (oldest first)."""
+        by_hash: Dict[str, List[Dict[str, Any]]] = {}
+        for run in runs:
+            by_hash.setdefault(str(run.get("hash")), []).append(run)
+
+        kept = []
+        retained = []
+        for group in by_hash.values():
+            finished = [r for r in group if r.get("status") == "Finished"]
+            latest = max(finished, key=_time) if finished else None
+            for run in group:
+                if (
+                    run is latest
+                    or run.get("pinned")
+                    or str(run["_id"]) in self.pinned
+                ):
+                    kept.append(run)
+                    continue
+                if run.get("status") == "Finished":
+                    keep = self.keep_superseded
+                else:
+                    keep = self.keep_failed
+                if now - _time(run) < keep:
+                    retained.append(run)
+        retained.sort(key=_time)
+        return kept, retained
+
+    def _applyQuota(
+        self,
+        kept: List[Dict[str, Any]],
+        retained: List[Dict[str, Any]],
+        sizes: Dict[str, int],
+    ) -> List[Dict[str, Any]]:
+        """Returns the retained runs which fit in max_bytes along with the
+        kept runs. The oldest runs are dropped first."""
+        users: Dict[str, int] = {}
+        for run in kept + retained:
+            for key in set(_refs(run, results_only=True)):
+                users[key] = users.get(key, 0) + 1
+        total = sum(sizes.get(key, 0) for key in users)
+
+        retained = list(retained)
+        while total > self.max_bytes and retained:
+            run = retained.pop(0)
+            for key in set(_refs(run, results_only=True)):
+                users[key] -= 1
+                if not users[key]:
+                    total -= sizes.get(key, 0)
+        return retained
+
+    def plan(self, now: Optional[float] = None) -> GCPlan:
+        """Finds the garbage without deleting anything."""
+        now = time.time() if now is None else now
+        docs = {str(d["_id"]): d for d in self.db.scan(_FIELDS)}
+        files = {str(key): (size, mtime)
+                 for key, size, mtime in self.db.listFiles()}
+        sizes = {key: size for key, (size, _) in files.items()}
+
+        runs = [d for d in docs.values() if d.get("type") in RUN_TYPES]
+        owner: Dict[str, str] = {}
+        for run in runs:
+            for key in _refs(run, results_only=True):
+                owner.setdefault(key, str(run["_id"]))
+
+        kept, retained = self._retain(runs, now)
+        if self.max_bytes:
+            retained = self._applyQuota(kept, retained, sizes)
+        kept_runs = {str(run["_id"]) for run in kept + retained}
+
+        # Mark everything which is reachable
+        stack = [
+            key for key, d in docs.items()
+            if key in kept_runs
+            or (d.get("type") not in RUN_TYPES and key not in owner)
+            or now - _time(d) < self.grace
+        ]
+        marked: Set[str] = set()
+        while stack:
+            key = stack.pop()
+            if key in marked:
+                continue
+            marked.add(key)
+            if key in docs:
+                stack.extend(_refs(docs[key]))
+
+        garbage: Dict[str, List[str]] = {
+            str(run["_id"]): [] for run in runs
+            if str(run["_id"]) not in marked
+        }
+        for key in docs:
+            if key not in marked and key not in garbage:
+                # The results of a garbage run
+                garbage.setdefault(owner[key], []).append(key)
+
+        orphans = [key for key, (_, mtime) in files.items()
+                   if key not in docs and key not in marked
+                   and now - mtime >= self.grace]
+
+        deleted = {key for results in garbage.values() for key in results}
+        total = sum(sizes.get(key, 0) for key in deleted | set(orphans))
+
+        return GCPlan(garbage, orphans, self._lostRuns(docs, now), total)
+
+    def _lostRuns(self, docs: Dict[str, Any], now: float) -> List[str]:
+        """Returns the runs with partial results which never finished and
+        were last updated more than keep_failed seconds ago."""
+        lost = []
+        try:
+            for d in self.db.searchLiveResults():
+                key = str(d["_id"])
+                if key in docs:
+                    continue
+                deltas = self.db.getLiveResults(UUID(key))
+                last = max((delta.get("time", 0.0) for delta in deltas),
+                           default=0.0)
+                if now - last >= max(self.keep_failed, self.grace):
+                    lost.append(key)
+        except NotImplementedError:
+            # This database does not store partial results
+            pass
+        return lost
+
+    def collect(
+        self,
+        max_runs: int = 0,
+        dry_run: bool = False,
+        now: Optional[float] = None,
+    ) -> Dict[str, int]:
+        """Finds the garbage and deletes it. At most max_runs runs (0 for no
+        limit) are deleted, so that the work can be split into many calls.
+
+        Returns the number of runs, results, files, and lost runs which
+        were (or, if dry_run is true, would be) deleted, their "bytes", and
+        the number of garbage runs which are "remaining".
+        """
+        plan = self.plan(now)
+        runs = list(plan.runs.items())
+        if max_runs:
+            runs = runs[:max_runs]
+
+        files = {str(key): size for key, size, _ in self.db.listFiles()} \
+            if not dry_run else {}
+        report = {
+            "runs": len(runs),
+            "results": sum(len(results) for _, results in runs),
+            "files": len(plan.files),
+            "lost": len(plan.live),
+            "bytes": plan.bytes,
+            "remaining": len(plan.runs) - len(runs),
+        }
+        if dry_run:
+            return report
+
+        freed = 0
+        for start in range(0, len(runs), self.batch_size):
+            if start:
+                time.sleep(self.pause)
+            for key, results in runs[start:start + self.batch_size]:
+                # The results first, so that no run refers to missing results
+                for result in results:
+                    if result in files:
+                        self.db.deleteFile(UUID(result))
+                        freed += files.pop(result)
+                self.db.deleteMany([UUID(result) for result in results])
+                self.db.delete(UUID(key))
+                self._deleteRunData(UUID(key))
+
+        for key in plan.files:
+            self.db.deleteFile(UUID(key))
+            freed += files.pop(key, 0)
+        for key in plan.live:
+            self.db.deleteLiveResults(UUID(key))
+
+        report["bytes"] = freed
+        return report
+
+    def _deleteRunData(self, key: UUID) -> None:
+        """Deletes the stats and partial results of a run, if there are
+        any."""
+        try:
+            self.db.deleteStats(key)
+        except NotImplementedError:
+            pass
+        try:
+            self.db.deleteLiveResults(key)
+        except NotImplementedError:
+            pass
@@ -0,0 +1,163 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the syncing of the results of a running gem5 run to
+the database.
+
+Normally, the results of a run only reach the database when gem5 exits. If
+sync_interval is set, a LiveSync sends the new stats dumps, the progress,
+and the tails of the captured output to the database every sync_interval
+seconds as deltas (see ArtifactDB.putLiveResults). If the node crashes, the
+run can still be reported with its partial results (see
+getLiveResultsByNameLike). The deltas are removed when the run finishes and
+its complete results are stored.
+
+The deltas are sent by a small pool of threads which is shared by all of the
+runs, so a slow database never blocks the supervision of the runs (or the
+event loop of run_async).
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from gem5art import artifact
+
+from ._capture import OutputCapture
+from ._stats import StatsTailer, compactStats
+
+if TYPE_CHECKING:
+    from .run import gem5Run
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _getExecutor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(4, thread_name_prefix="gem5art-sync")
+    return _executor
+
+
+class LiveSync:
+    """
+    Sends the new results of a running gem5 run to the database every
+    interval seconds.
+
+    At most one delta of a run is being sent at a time. If a delta cannot
+    be sent, its stats dumps are sent with the next one.
+    """
+
+    def __init__(
+        self, run: "gem5Run", captures: List[OutputCapture], interval: float
+    ) -> None:
+        self.run = run
+        self.captures = captures
+        self.interval = interval
+        self.next_sync = run.start_time + interval
+        self.error: Optional[BaseException] = None
+
+        self._tailer = StatsTailer(run.outdir / "stats.txt")
+        self._seq = 0
+        # The dumps which were read but could not be sent yet
+        self._unsent: List[Dict[str, float]] = []
+        self._tails: Dict[str, str] = {}
+        self._pending: Optional["Future[None]"] = None
+
+    def tick(self, now: float) -> None:
+        """Starts sending a delta if one is due."""
+        if now < self.next_sync:
+            return
+        self.next_sync = now + self.interval
+        if self._pending is not None and not self._pending.done():
+            # The database is slow. Skip this one.
+            return
+
+        run = self.run
+        delta: Dict[str, Any] = {
+            "time": now,
+            "status": run.status,
+            "progress": dict(run.progress),
+        }
+        if self._seq == 0:
+            delta["run"] = {
+                "command": " ".join(run.command),
+                "outdir": str(run.outdir),
+                "hash": run.hash,
+                "start_time": run.start_time,
+            }
+        # Only the tails which changed since the last delta
+        output = {}
+        for capture in self.captures:
+            tail = capture.summary()["tail"]
+            if tail != self._tails.get(capture.name):
+                output[capture.name] = tail
+        if output:
+            delta["output"] = output
+
+        self._pending = _getExecutor().submit(self._send, delta, output)
+
+    def _send(self, delta: Dict[str, Any], output: Dict[str, str]) -> None:
+        """Reads the new stats dumps and sends the delta. This runs in the
+        pool of threads."""
+        dumps = self._unsent + self._tailer.read()
+        if dumps:
+            delta["names"], delta["dumps"] = compactStats(dumps)
+        delta["seq"] = self._seq
+        try:
+            artifact.getDBConnection().putLiveResults(
+                self.run._id, self.run.name, delta
+            )
+        except BaseException as e:
+            # Try again with the next delta
+            self._unsent = dumps
+            self.error = e
+            return
+        self._seq += 1
+        self._unsent = []
+        self._tails.update(output)
+        self.error = None
+
+    def close(self) -> None:
+        """Waits until the delta which is being sent, if any, is sent."""
+        if self._pending is not None:
+            self._pending.result()
+
+
+def mergeLiveResults(deltas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merges the deltas of a run (see ArtifactDB.getLiveResults) into its
+    latest state. The stats dumps are returned as a list of dictionaries."""
+    merged: Dict[str, Any] = {"dumps": [], "output": {}}
+    for delta in sorted(deltas, key=lambda d: d["seq"]):
+        for key in ("run", "time", "status", "progress"):
+            if key in delta:
+                merged[key] = delta[key]
+        merged["output"].update(delta.get("output", {}))
+        names = delta.get("names", [])
+        for row in delta.get("dumps", []):
+            merged["dumps"].append({name: value for name, value
+                                    in zip(names, row) if value is not None})
+    return merged
@@ -0,0 +1,149 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file defines a watcher for the output files of a running gem5.
+
+The watcher follows a set of files (e.g., the terminal output, simout, and
+simerr) like `tail -f`. Each time it is checked, it only reads and scans the
+bytes which were added since the last check and matches all of the failure
+signatures with a single regular expression.
+"""
+
+import os
+from pathlib import Path
+import re
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+# Signatures of failures which gem5 does not (always) exit on. The keys are
+# used as the kill reason and the values are regular expressions matched
+# against each line of the output.
+DEFAULT_FAILURE_SIGNATURES: Dict[str, str] = {
+    "kernel panic": r"Kernel panic",
+    "kernel oops": r"Oops: [0-9a-f]{4} \[#",
+    "gem5 fatal": r"^fatal: ",
+    "gem5 panic": r"^panic: ",
+    "deadlock": r"Possible Deadlock detected",
+}
+
+# The output files of gem5 (relative to the outdir) which are watched
+WATCHED_FILES = [
+    "system.pc.com_1.device",
+    "system.terminal",
+    "simout",
+    "simerr",
+]
+
+# The maximum number of bytes of an unfinished line that is kept between
+# checks. Longer lines are scanned in pieces.
+_MAX_PARTIAL_LINE = 64 * 1024
+
+# The number of bytes read at once
+_READ_SIZE = 1024 * 1024
+
+
+class LogWatcher:
+    """
+    Incrementally scans files and streams for failure signatures.
+
+    signatures maps a name (e.g., "kernel panic") to a regular expression.
+    """
+
+    def __init__(self, signatures: Dict[str, str],
+                 paths: Iterable[Path] = ()) -> None:
+        self._names = list(signatures.keys())
+        self._regex = re.compile(
+            "|".join(f"(?P<g{i}>{pattern})"
+                     for i, pattern in enumerate(signatures.values()))
+            .encode(),
+            re.MULTILINE,
+        )
+        self._paths = list(paths)
+        self._files: Dict[Path, BinaryIO] = {}
+        # Unfinished last line of each file or stream
+        self._partial: Dict[str, bytes] = {}
+
+    def check(self) -> Optional[Tuple[str, str, str]]:
+        """Scans the new output of all of the files.
+
+        Returns (signature name, file name, matching line) for the first
+        match or None if no signature matched.
+        """
+        for path in self._paths:
+            f = self._files.get(path)
+            if f is None:
+                try:
+                    f = open(path, "rb")
+                except FileNotFoundError:
+                    continue
+                self._files[path] = f
+            if os.fstat(f.fileno()).st_size < f.tell():
+                # The file was truncated, start over
+                f.seek(0)
+                self._partial.pop(path.name, None)
+            while True:
+                data = f.read(_READ_SIZE)
+                if not data:
+                    break
+                match = self.feed(path.name, data)
+                if match:
+                    return match
+        return None
+
+    def feed(self, source: str, data: bytes) -> Optional[Tuple[str, str, str]]:
+        """Scans data, the next bytes of the stream source (e.g., the
+        captured stdout of gem5).
+
+        Returns (signature name, source, matching line) for the first match
+        or None if no signature matched.
+        """
+        data = self._partial.pop(source, b"") + data
+        end = data.rfind(b"\n") + 1
+        if len(data) - end < _MAX_PARTIAL_LINE:
+            # Only scan complete lines and keep the rest for the next time
+            self._partial[source] = data[end:]
+            data = data[:end]
+
+        match = self._regex.search(data)
+        if not match:
+            return None
+
+        assert match.lastgroup is not None
+        name = self._names[int(match.lastgroup[1:])]
+        start = data.rfind(b"\n", 0, match.start()) + 1
+        stop = data.find(b"\n", match.end())
+        line = data[start:stop if stop >= 0 else len(data)]
+        return name, source, line.decode(errors="replace")
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self) -> "LogWatcher":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
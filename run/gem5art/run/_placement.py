@@ -0,0 +1,170 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the placement of gem5 processes on the CPUs of a node.
+
+Without a placement, the scheduler migrates gem5 processes between sockets
+and runs them on the SMT siblings of busy cores, which hurts throughput and
+makes the host time of runs noisy. The CorePlacement gives each run a
+physical core of its own (and only uses one of the core's logical CPUs) and,
+if numactl is available, binds the memory of the run to the core's NUMA
+node.
+
+Many processes (e.g., the workers of a pool or many Celery workers) can
+place runs on the same node at the same time. Each physical core has a lock
+file in lock_dir which is held (see flock(2)) while a run uses the core.
+The locks are released automatically if a process dies.
+"""
+
+from contextlib import contextmanager
+import fcntl
+import os
+from pathlib import Path
+import shutil
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Union
+
+_SYS_CPU = Path("/sys/devices/system/cpu")
+
+
+class PhysicalCore(NamedTuple):
+    package: int
+    core: int
+    # The logical CPUs (SMT siblings) of the core
+    cpus: List[int]
+    numa_node: Optional[int]
+
+
+def _readInt(path: Path) -> Optional[int]:
+    try:
+        return int(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def getPhysicalCores() -> List[PhysicalCore]:
+    """Returns the physical cores which this process may run on.
+
+    On systems without sched_getaffinity or /sys, every CPU is treated as a
+    physical core.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        allowed = sorted(os.sched_getaffinity(0))
+    else:
+        allowed = list(range(os.cpu_count() or 1))
+
+    cores: Dict[Any, PhysicalCore] = {}
+    for cpu in allowed:
+        topology = _SYS_CPU / f"cpu{cpu}" / "topology"
+        package = _readInt(topology / "physical_package_id")
+        core = _readInt(topology / "core_id")
+        if package is None or core is None:
+            package, core = 0, cpu
+        key = (package, core)
+        if key not in cores:
+            nodes = [p.name for p in (_SYS_CPU / f"cpu{cpu}").glob("node*")]
+            node = int(nodes[0][4:]) if nodes else None
+            cores[key] = PhysicalCore(package, core, [], node)
+        cores[key].cpus.append(cpu)
+    return list(cores.values())
+
+
+class CorePlacement:
+    """
+    A placement policy which runs each gem5 process on a physical core of
+    its own. See the module documentation for details.
+
+    If membind is True and numactl is installed, the memory of each run is
+    bound to the NUMA node of its core.
+    """
+
+    def __init__(
+        self,
+        lock_dir: Union[str, Path, None] = None,
+        membind: bool = True,
+    ) -> None:
+        if lock_dir is None:
+            lock_dir = f"/tmp/gem5art-placement-{os.getuid()}"
+        self.lock_dir = Path(lock_dir)
+        self.membind = membind
+
+    def _order(self, cores: List[PhysicalCore]) -> List[PhysicalCore]:
+        """Interleave the cores of the NUMA nodes so that the runs are
+        spread over all of the nodes."""
+        rank: Dict[Optional[int], int] = {}
+        order = []
+        for core in cores:
+            n = rank.get(core.numa_node, 0)
+            rank[core.numa_node] = n + 1
+            order.append((n, core.numa_node or 0, core))
+        return [core for _, _, core in sorted(order, key=lambda o: o[:2])]
+
+    @contextmanager
+    def acquire(self) -> Iterator[Optional[Dict[str, Any]]]:
+        """Reserves a free physical core until the context exits.
+
+        Returns the placement (see gem5Run.placement) or None if all of the
+        cores are in use.
+        """
+        os.makedirs(self.lock_dir, exist_ok=True)
+        cores = getPhysicalCores()
+        # Binding the memory only matters with more than one node
+        numa = len({core.numa_node for core in cores}) > 1
+        for core in self._order(cores):
+            name = f"core-{core.package}-{core.core}.lock"
+            with open(self.lock_dir / name, "a") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                yield {
+                    "cpus": core.cpus[:1],
+                    "package": core.package,
+                    "core": core.core,
+                    "numa_node": core.numa_node,
+                    "membind": numa and self._canBind(core),
+                }
+                return
+        yield None
+
+    def _canBind(self, core: PhysicalCore) -> bool:
+        return (
+            self.membind
+            and core.numa_node is not None
+            and shutil.which("numactl") is not None
+        )
+
+
+def placeCommand(placement: Dict[str, Any], command: List[str]) -> List[str]:
+    """Returns the command to run with the memory binding of placement."""
+    if not placement.get("membind"):
+        return command
+    return ["numactl", f"--membind={placement['numa_node']}", "--"] + command
+
+
+def applyPlacement(placement: Dict[str, Any], pid: int) -> None:
+    """Pins the process to the CPUs of placement."""
+    if placement and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(pid, placement["cpus"])
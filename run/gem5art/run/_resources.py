@@ -0,0 +1,131 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the helpers to account for the host resources (CPU
+time, memory, I/O) used by a gem5 process.
+
+There are two sources of information:
+- The rusage of the process, which the kernel reports when the process is
+  reaped with wait4. This has the totals (CPU time, peak RSS, block I/O).
+- A sampler which periodically reads /proc/<pid>/stat and
+  /proc/<pid>/statm. This gives a downsampled time series of the RSS and
+  CPU time while the process runs.
+"""
+
+import os
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def reap(proc: subprocess.Popen) -> Optional[Dict[str, float]]:
+    """Reaps the process if it has exited and returns its resource usage.
+
+    Returns None if the process is still running. Unlike Popen.poll(), this
+    uses wait4 so that the resource usage of the process is not lost. The
+    return code of the process is stored in proc.returncode.
+
+    Note: Popen.poll(), wait(), and kill() may reap the process, so they
+    should not be used before this.
+    """
+    if proc.returncode is not None:
+        # Already reaped by Popen, so the resource usage is lost
+        return {}
+    pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+    if pid == 0:
+        return None
+
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = rusage.ru_maxrss
+    if sys.platform != "darwin":
+        max_rss *= 1024
+
+    return {
+        "user_time": rusage.ru_utime,
+        "system_time": rusage.ru_stime,
+        "max_rss": max_rss,
+        # In 512-byte blocks
+        "block_input": rusage.ru_inblock,
+        "block_output": rusage.ru_oublock,
+    }
+
+
+class ProcSampler:
+    """
+    Samples the RSS and CPU time of a running process from /proc.
+
+    The samples are [seconds since start, RSS in bytes, CPU seconds]. To keep
+    the series small, it is downsampled: when there are max_samples samples,
+    every other sample is dropped and from then on only every other call to
+    sample() is recorded.
+    """
+
+    samples: List[List[float]]
+
+    def __init__(self, pid: int, start_time: float,
+                 max_samples: int = 256) -> None:
+        self._pid = pid
+        self._start_time = start_time
+        self._max_samples = max_samples
+        self._stride = 1
+        self._calls = 0
+        self.samples = []
+
+    def _read(self) -> Optional[List[float]]:
+        try:
+            with open(f"/proc/{self._pid}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{self._pid}/statm") as f:
+                statm = f.read()
+        except OSError:
+            # The process exited or there is no /proc
+            return None
+        # The command name (2nd field) may contain spaces, so split after it
+        fields = stat[stat.rfind(")") + 2:].split()
+        # utime and stime are the 14th and 15th fields
+        cpu = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+        rss = int(statm.split()[1]) * _PAGE_SIZE
+        return [rss, cpu]
+
+    def sample(self, now: float) -> None:
+        self._calls += 1
+        if self._calls % self._stride:
+            return
+        values = self._read()
+        if values is None:
+            return
+        self.samples.append([round(now - self._start_time, 3)] + values)
+        if len(self.samples) >= self._max_samples:
+            self.samples = self.samples[::2]
+            self._stride *= 2
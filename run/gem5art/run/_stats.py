@@ -0,0 +1,236 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the helpers to read the stats that gem5 writes to
+stats.txt while it is running.
+
+gem5 appends a dump to stats.txt each time the stats are dumped (e.g., with
+m5.stats.dump() or m5.stats.periodicStatDump() in the run script). Each dump
+is a block of "name value # description" lines between a begin and an end
+marker. The StatsTailer only reads the bytes which were appended since the
+last time it was called, so it is cheap to call periodically.
+
+readStats reads all of the dumps of a finished run into a compact form
+which is stored in the database (see ArtifactDB.putStats).
+"""
+
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+_BEGIN = b"---------- Begin Simulation Statistics"
+_END = b"---------- End Simulation Statistics"
+
+_CHUNK_SIZE = 1024 * 1024
+
+# Newer versions of gem5 use camelCase for the global stats
+STAT_ALIASES = {
+    "simTicks": "sim_ticks",
+    "finalTick": "final_tick",
+    "simInsts": "sim_insts",
+    "simSeconds": "sim_seconds",
+    "hostInstRate": "host_inst_rate",
+    "hostSeconds": "host_seconds",
+}
+
+PROGRESS_STATS = (
+    "sim_ticks",
+    "final_tick",
+    "sim_insts",
+    "host_inst_rate",
+    "host_seconds",
+)
+
+
+class StatsTailer:
+    """
+    Incrementally reads the complete stats dumps appended to a stats file.
+
+    If names is given, only those stats (after applying STAT_ALIASES) are
+    kept, which is much cheaper than keeping every stat of every dump.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], names: Optional[Iterable[str]] = None
+    ) -> None:
+        self._path = Path(path)
+        self._names = set(names) if names is not None else None
+        self._offset = 0
+        self._inode = 0
+        self._partial = b""
+        self._current: Optional[Dict[str, float]] = None
+
+    def _reset(self) -> None:
+        self._offset = 0
+        self._partial = b""
+        self._current = None
+
+    def read(self) -> List[Dict[str, float]]:
+        """Returns the dumps which were completed since the last call."""
+        try:
+            st = os.stat(self._path)
+        except FileNotFoundError:
+            return []
+        size = st.st_size
+        if st.st_ino != self._inode or size < self._offset:
+            # The file was replaced (e.g., the run was restarted)
+            self._reset()
+            self._inode = st.st_ino
+        if size == self._offset:
+            return []
+
+        dumps: List[Dict[str, float]] = []
+        with open(self._path, "rb") as f:
+            f.seek(self._offset)
+            # Read in chunks so that a large file is never all in memory
+            while self._offset < size:
+                data = f.read(min(_CHUNK_SIZE, size - self._offset))
+                if not data:
+                    break
+                self._offset += len(data)
+                lines = (self._partial + data).split(b"\n")
+                # The last line may not be complete yet
+                self._partial = lines.pop()
+                self._parse(lines, dumps)
+        return dumps
+
+    def _parse(self, lines: List[bytes], dumps: List[Dict[str, float]]) -> None:
+        """Parses complete lines and appends the completed dumps to dumps."""
+        for line in lines:
+            if line.startswith(b"----------"):
+                if line.startswith(_BEGIN):
+                    self._current = {}
+                elif line.startswith(_END) and self._current is not None:
+                    dumps.append(self._current)
+                    self._current = None
+                continue
+            if self._current is None:
+                continue
+            parts = line.split(None, 2)
+            if len(parts) < 2:
+                continue
+            name = parts[0].decode(errors="replace")
+            name = STAT_ALIASES.get(name, name)
+            if self._names is not None and name not in self._names:
+                continue
+            try:
+                self._current[name] = float(parts[1])
+            except ValueError:
+                # Not a number (e.g., "(Unspecified)")
+                continue
+
+
+def compactStats(
+    dumps: Iterable[Dict[str, float]]
+) -> Tuple[List[str], List[List[Optional[float]]]]:
+    """Converts stats dumps into a compact form.
+
+    Returns the names of all of the stats, in the order in which they first
+    appear, and a row for each dump with the values of the stats in the
+    same order (None if a stat is not in the dump).
+    """
+    index: Dict[str, int] = {}
+    rows: List[List[Optional[float]]] = []
+    for dump in dumps:
+        row: List[Optional[float]] = [None] * len(index)
+        for name, value in dump.items():
+            i = index.setdefault(name, len(index))
+            if i == len(row):
+                row.append(value)
+            else:
+                row[i] = value
+        rows.append(row)
+    # Stats which first appear in a later dump are missing from earlier rows
+    for row in rows:
+        row.extend([None] * (len(index) - len(row)))
+    return list(index), rows
+
+
+def readStats(
+    path: Union[str, Path]
+) -> Tuple[List[str], List[List[Optional[float]]]]:
+    """Reads every dump in a stats file into a compact form (see
+    compactStats). Vectors and distributions are flattened into one stat
+    per entry, e.g., "system.cpu.op_class::IntAlu" or
+    "system.mem.latency::0-99".
+    """
+    return compactStats(StatsTailer(path).read())
+
+
+class ProgressTracker:
+    """
+    Turns the stats dumps of a running simulation into its progress.
+
+    target maps a stat (e.g., sim_insts or final_tick) to its value at the
+    end of the simulation. If it is given, the ETA is estimated from the
+    rate at which the stat grew since the first dump.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        target: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self._tailer = StatsTailer(path, PROGRESS_STATS)
+        self._target = target or {}
+        # The first dump and the time it was seen
+        self._first: Optional[Dict[str, float]] = None
+        self._first_time = 0.0
+        self.progress: Dict[str, Any] = {}
+
+    def update(self, now: float) -> bool:
+        """Reads the new stats dumps, if any, and updates progress.
+
+        Returns True if there was a new dump.
+        """
+        dumps = self._tailer.read()
+        if not dumps:
+            return False
+        latest = dumps[-1]
+        if self._first is None:
+            self._first = dumps[0]
+            self._first_time = now
+
+        progress: Dict[str, Any] = dict(latest)
+        progress["dumps"] = self.progress.get("dumps", 0) + len(dumps)
+        progress["last_dump_time"] = now
+
+        eta: Optional[float] = None
+        elapsed = now - self._first_time
+        for name, end in self._target.items():
+            if name not in latest or name not in self._first:
+                continue
+            progress[f"{name}_fraction"] = latest[name] / end if end else None
+            grown = latest[name] - self._first[name]
+            if elapsed <= 0 or grown <= 0:
+                continue
+            rate = grown / elapsed
+            progress[f"{name}_rate"] = rate
+            remaining = max(end - latest[name], 0.0) / rate
+            eta = remaining if eta is None else max(eta, remaining)
+        progress["eta"] = eta
+        self.progress = progress
+        return True
@@ -0,0 +1,274 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the supervision of a running gem5 process.
+
+The Supervisor holds the state of the timers and health checks of one gem5
+process. It is driven either by a blocking loop (see gem5Run._supervise),
+which waits with an ExitWaiter, or by an asyncio event loop (see
+gem5Run._superviseAsync), which can supervise many processes at once.
+"""
+
+import os
+import selectors
+import signal
+import subprocess
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from ._capture import OutputCapture
+from ._live import LiveSync
+from ._logwatcher import WATCHED_FILES, LogWatcher
+from ._resources import ProcSampler, reap
+from ._stats import ProgressTracker
+
+if TYPE_CHECKING:
+    from .run import gem5Run
+
+
+def openPidfd(pid: int) -> int:
+    """Returns a pidfd (Linux 5.3+) for the process, which becomes readable
+    when the process exits, or -1 if pidfds are not supported."""
+    try:
+        return os.pidfd_open(pid) # type: ignore
+    except (AttributeError, OSError):
+        return -1
+
+
+class ExitWaiter:
+    """
+    Waits for a child process to exit, or until a timeout expires, without
+    polling. This uses a pidfd (see openPidfd). On other systems it falls
+    back to checking with waitid() with a backoff.
+
+    This never reaps the process, so that its resource usage can be read
+    when it is reaped (see _resources.reap).
+    """
+
+    def __init__(self, proc: subprocess.Popen) -> None:
+        self._proc = proc
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._pidfd = openPidfd(proc.pid)
+        if self._pidfd < 0:
+            return
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._pidfd, selectors.EVENT_READ)
+
+    def wait(self, timeout: float) -> None:
+        """Returns when the process has exited or after timeout seconds."""
+        timeout = max(timeout, 0.0)
+        if self._selector is not None:
+            self._selector.select(timeout)
+            return
+        end = time.time() + timeout
+        delay = 0.0005
+        while True:
+            # WNOWAIT leaves the process waitable
+            if os.waitid(os.P_PID, self._proc.pid,
+                         os.WEXITED | os.WNOHANG | os.WNOWAIT):
+                return
+            remaining = end - time.time()
+            if remaining <= 0:
+                return
+            delay = min(delay * 2, remaining, 0.05)
+            time.sleep(delay)
+
+    def __enter__(self) -> "ExitWaiter":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self._selector is not None:
+            self._selector.close()
+            os.close(self._pidfd)
+
+
+class Supervisor:
+    """
+    The timers and health checks of a running gem5 process.
+
+    There are two timers: the timeout, which kills the process, and the
+    health check, which runs every check_interval seconds to scan the new
+    output of gem5 for the failure_signatures, check for user-defined
+    failures, update the simulation progress from the new stats dumps,
+    check for stalls, sample the memory and CPU usage of the process, and
+    dump the json info. If sync_interval is set, the new results are also
+    sent to the database every sync_interval seconds (see LiveSync).
+    """
+
+    def __init__(self, run: "gem5Run", proc: subprocess.Popen) -> None:
+        self.run = run
+        self.proc = proc
+        self.killed = False
+        self.captures: List[OutputCapture] = []
+
+        self._deadline = run.start_time + run.timeout
+        self._next_check = time.time()
+        self._watcher = LogWatcher(
+            run.failure_signatures,
+            [run.outdir / name for name in WATCHED_FILES],
+        )
+        self._tracker = ProgressTracker(run.outdir / "stats.txt",
+                                        run.progress_target)
+        self._sampler = ProcSampler(proc.pid, run.start_time)
+        run.resource_samples = self._sampler.samples
+
+        self._progress_paths = [run.outdir / name
+                                for name in WATCHED_FILES + ["stats.txt"]]
+        self._progress_points: Dict[str, float] = {}
+        self._last_progress_time = run.start_time
+
+        self._sync: Optional[LiveSync] = None
+        if run.sync_interval:
+            self._sync = LiveSync(run, self.captures, run.sync_interval)
+
+    def addCapture(self, name: str) -> OutputCapture:
+        """Returns a new capture of an output stream of gem5 which is also
+        scanned for the failure_signatures."""
+        capture = OutputCapture(name, self.run.outdir, self._watcher.feed,
+                                self.run.output_segment_bytes,
+                                self.run.output_max_segments)
+        self.captures.append(capture)
+        return capture
+
+    def kill(self, reason: str) -> None:
+        """Kills the process. Only the first reason is recorded."""
+        if self.killed:
+            return
+        self.killed = True
+        # Not proc.kill(), which may reap the process (see reap)
+        os.kill(self.proc.pid, signal.SIGKILL)
+        self.run.kill_reason = reason
+        # Don't kill it again on timeout
+        self._deadline = float("inf")
+
+    def reap(self) -> bool:
+        """Returns True if the process has exited and stores its resource
+        usage."""
+        usage = reap(self.proc)
+        if usage is None:
+            return False
+        self.run.resource_usage = usage
+        return True
+
+    def tick(self, now: float) -> float:
+        """Runs the timers which are due and returns the number of seconds
+        until the next one."""
+        self.run.current_time = now
+
+        if now >= self._deadline:
+            self.kill("timeout")
+
+        if now >= self._next_check:
+            self._check(now)
+            self._next_check = now + self.run.check_interval
+
+        next_timer = min(self._deadline, self._next_check)
+        if self._sync is not None:
+            self._sync.tick(now)
+            next_timer = min(next_timer, self._sync.next_sync)
+
+        return max(next_timer - time.time(), 0.0)
+
+    def _check(self, now: float) -> None:
+        run = self.run
+
+        failure = self._watcher.check()
+        for capture in self.captures:
+            failure = failure or capture.takeFailure()
+        if failure and not self.killed:
+            name, source, line = failure
+            self.kill(name)
+            run.kill_details = f"{source}: {line}"
+
+        # Assigning a function/lambda to an object variable does not make
+        # the function/lambda become a bound one. Therefore, the
+        # user-defined function must pass `self` in. Here, mypy classifies
+        # run.check_failure() as a bound function, so we tell mypy to
+        # ignore it.
+        if run.check_failure(run): # type: ignore
+            self.kill("User defined kill")
+
+        if self._tracker.update(now):
+            run._updateProgress(self._tracker.progress)
+
+        self._checkStall(now)
+
+        self._sampler.sample(now)
+        run.resource_samples = self._sampler.samples
+
+        run._updateInfo()
+
+    def _checkStall(self, now: float) -> None:
+        """Records the last progress and kills the process if it made no
+        progress for stall_timeout seconds."""
+        run = self.run
+        points = self._progressPoints()
+        grown = [name for name, point in points.items()
+                 if point > self._progress_points.get(name, 0)]
+        self._progress_points = points
+        if grown:
+            self._last_progress_time = now
+            run.last_progress = {
+                "time": now - run.start_time,
+                "sources": grown,
+                "sim_ticks": points.get("sim_ticks"),
+            }
+        elif (
+            run.stall_timeout
+            and not self.killed
+            and now - self._last_progress_time >= run.stall_timeout
+        ):
+            self.kill("stall")
+            run.kill_details = (
+                f"no progress for {now - self._last_progress_time:.0f} seconds"
+            )
+
+    def _progressPoints(self) -> Dict[str, float]:
+        """Returns the current values which only grow while the simulation
+        makes progress: the sizes of the output files, the number of bytes
+        of the captured output, and the simulated ticks."""
+        points: Dict[str, float] = {}
+        for path in self._progress_paths:
+            try:
+                points[path.name] = os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+        for capture in self.captures:
+            points[capture.name] = capture.bytes
+        progress = self.run.progress
+        ticks = progress.get("final_tick", progress.get("sim_ticks"))
+        if ticks is not None:
+            points["sim_ticks"] = ticks
+        return points
+
+    def finish(self) -> None:
+        """Stores the summaries of the captured output. The captures must be
+        complete."""
+        self._watcher.close()
+        self.run.output = {capture.name: capture.summary()
+                           for capture in self.captures}
+        if self._sync is not None:
+            self._sync.close()
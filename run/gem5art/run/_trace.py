@@ -0,0 +1,369 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""This file contains the compression of gem5's debug traces.
+
+With --debug-flags, gem5 writes a text trace which can reach hundreds of
+GB. Instead of a file, gem5 is given a named pipe (FIFO) in the outdir as
+its --debug-file. A thread reads the pipe while gem5 is running and writes
+the trace into a chunked gzip file (e.g., trace.gz): each chunk of about
+chunk_bytes is a separate gzip member, compressed by a pool of threads. The
+file is still a valid gzip file (e.g., for zcat), and its index (e.g.,
+trace.gz.idx) has the offsets and the first and last tick of each chunk, so
+readTrace only decompresses the chunks in a window of ticks.
+
+Only the lines in a window of ticks can be kept. The ticks in a trace never
+decrease, so the window is applied to whole buffers and the lines are only
+parsed at the two edges of the window.
+"""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import fcntl
+import json
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple, Union
+import zlib
+
+# The number of bytes read from the pipe at once
+_READ_SIZE = 1024 * 1024
+
+# The size of the pipe buffer. A larger buffer lets gem5 keep running while
+# a chunk is handed to the compressors.
+_PIPE_SIZE = 1024 * 1024
+
+# Lines of the trace start with the tick, e.g., "  5000: system.cpu: ..."
+_TICK = re.compile(rb"^[ \t]*(\d+):", re.M)
+
+
+def _lastTick(lines: bytes) -> Optional[int]:
+    """Returns the tick of the last line with a tick."""
+    end = len(lines)
+    while end > 0:
+        start = lines.rfind(b"\n", 0, end - 1) + 1
+        m = _TICK.match(lines, start)
+        if m:
+            return int(m.group(1))
+        end = start
+    return None
+
+
+def _firstTick(lines: bytes) -> Optional[int]:
+    """Returns the tick of the first line with a tick."""
+    m = _TICK.search(lines)
+    return int(m.group(1)) if m else None
+
+
+def _findTick(lines: bytes, tick: int) -> int:
+    """Returns the offset of the first line with a tick at or after tick."""
+    for m in _TICK.finditer(lines):
+        if int(m.group(1)) >= tick:
+            return m.start()
+    return len(lines)
+
+
+class TickWindow:
+    """
+    Keeps the lines of a trace with ticks in [start, end). An end of 0
+    means no end. Lines without a tick stay with the line before them.
+    """
+
+    def __init__(self, start: int = 0, end: int = 0) -> None:
+        self.start = start
+        self.end = end
+        self._started = not start
+        self.done = False
+
+    def filter(self, lines: bytes) -> bytes:
+        """Returns the part of the next complete lines in the window."""
+        if self.done:
+            return b""
+        if not self._started:
+            last = _lastTick(lines)
+            if last is None or last < self.start:
+                return b""
+            lines = lines[_findTick(lines, self.start):]
+            self._started = True
+        if self.end:
+            last = _lastTick(lines)
+            if last is not None and last >= self.end:
+                lines = lines[:_findTick(lines, self.end)]
+                self.done = True
+        return lines
+
+
+def _compress(data: bytes, level: int) -> bytes:
+    """Compresses data into a gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ChunkedGzipWriter:
+    """
+    Writes lines into a gzip file as chunks of about chunk_bytes, each of
+    which is a separate gzip member, and writes the index of the chunks
+    when it is closed.
+
+    The chunks are compressed by a pool of workers threads while the
+    previous chunks are written.
+    """
+
+    # [offset, compressed size, uncompressed offset, size, first tick,
+    # last tick] of each chunk
+    chunks: List[List[Optional[int]]]
+
+    def __init__(
+        self,
+        path: Path,
+        chunk_bytes: int = 16 * 1024 * 1024,
+        level: int = 1,
+        workers: int = 2,
+    ) -> None:
+        self.path = path
+        self._out = open(path, "wb")
+        self._chunk_bytes = chunk_bytes
+        self._level = level
+        self._workers = max(workers, 1)
+        self._pool = ThreadPoolExecutor(max_workers=self._workers)
+        self._pending: Deque[Tuple["Future[bytes]", int, Optional[int],
+                                   Optional[int]]] = deque()
+        self._buffer = bytearray()
+        self._offset = 0
+        self._size = 0
+        self.chunks = []
+
+    def write(self, lines: bytes) -> None:
+        """Adds complete lines to the file."""
+        self._buffer += lines
+        while len(self._buffer) >= self._chunk_bytes:
+            cut = self._buffer.rfind(b"\n", 0, self._chunk_bytes) + 1
+            if not cut:
+                # A line which is longer than a chunk
+                cut = self._buffer.find(b"\n", self._chunk_bytes) + 1
+            if not cut:
+                cut = len(self._buffer)
+            self._addChunk(bytes(self._buffer[:cut]))
+            del self._buffer[:cut]
+
+    def _addChunk(self, chunk: bytes) -> None:
+        future = self._pool.submit(_compress, chunk, self._level)
+        self._pending.append((future, len(chunk), _firstTick(chunk),
+                              _lastTick(chunk)))
+        # Limit the number of chunks which are compressed ahead
+        while len(self._pending) > 2 * self._workers:
+            self._writePending()
+
+    def _writePending(self) -> None:
+        future, size, first, last = self._pending.popleft()
+        data = future.result()
+        self._out.write(data)
+        self.chunks.append([self._offset, len(data), self._size, size,
+                            first, last])
+        self._offset += len(data)
+        self._size += size
+
+    @property
+    def bytes(self) -> int:
+        """The number of (uncompressed) bytes written so far."""
+        return self._size + sum(p[1] for p in self._pending) + \
+            len(self._buffer)
+
+    @property
+    def compressed_bytes(self) -> int:
+        """The size of the file so far."""
+        return self._offset
+
+    def close(self) -> None:
+        """Writes the rest of the lines and the index."""
+        if self._out.closed:
+            return
+        if self._buffer:
+            self._addChunk(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._writePending()
+        self._pool.shutdown()
+        self._out.close()
+
+        index = self.path.with_name(f"{self.path.name}.idx")
+        with open(index, "w") as f:
+            json.dump({"chunks": self.chunks}, f)
+
+
+class TraceCapture:
+    """
+    Captures gem5's debug trace from a FIFO in outdir (see fifo, which is
+    passed to gem5 as --debug-file) into a chunked gzip file named
+    <name>.gz (see ChunkedGzipWriter). Only the lines with ticks in [start,
+    end) are kept (see TickWindow).
+
+    Use it as a context: the FIFO is created and read by a background
+    thread when it is entered. On exit, which must be after gem5 exited,
+    the rest of the trace is read and the FIFO is removed.
+    """
+
+    def __init__(
+        self,
+        outdir: Path,
+        name: str = "trace",
+        start: int = 0,
+        end: int = 0,
+        chunk_bytes: int = 16 * 1024 * 1024,
+        workers: int = 2,
+    ) -> None:
+        self.fifo = outdir / f"{name}.fifo"
+        self.path = outdir / f"{name}.gz"
+        self._window = TickWindow(start, end)
+        self._writer = ChunkedGzipWriter(self.path, chunk_bytes,
+                                         workers=workers)
+        self._chunk_bytes = chunk_bytes
+        self._read = 0
+        self._partial = b""
+        self._fd = -1
+        self._keep_open = -1
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[BaseException] = None
+
+    def __enter__(self) -> "TraceCapture":
+        if self.fifo.exists() or self.fifo.is_symlink():
+            os.remove(self.fifo)
+        os.mkfifo(self.fifo)
+        # Neither open blocks, since the FIFO has a reader when it is opened
+        # for writing. The extra writer keeps the pipe from reaching its end
+        # before gem5 opens it.
+        self._fd = os.open(self.fifo, os.O_RDONLY | os.O_NONBLOCK)
+        self._keep_open = os.open(self.fifo, os.O_WRONLY | os.O_NONBLOCK)
+        os.set_blocking(self._fd, True)
+        if hasattr(fcntl, "F_SETPIPE_SZ"):
+            try:
+                fcntl.fcntl(self._fd, fcntl.F_SETPIPE_SZ, _PIPE_SIZE)
+            except OSError:
+                # Over the limit for unprivileged users
+                pass
+
+        self._thread = threading.Thread(target=self._capture,
+                                        name="gem5 trace", daemon=True)
+        self._thread.start()
+        return self
+
+    def _capture(self) -> None:
+        try:
+            while True:
+                data = os.read(self._fd, _READ_SIZE)
+                if not data:
+                    break
+                self._feed(data)
+            if self._partial:
+                self._feed(b"\n")
+        except BaseException as e:
+            self.error = e
+            # Keep reading so that gem5 never blocks on a full pipe
+            while os.read(self._fd, _READ_SIZE):
+                pass
+
+    def _feed(self, data: bytes) -> None:
+        self._read += len(data)
+        data = self._partial + data
+        cut = data.rfind(b"\n") + 1
+        if not cut and len(data) < self._chunk_bytes:
+            self._partial = data
+            return
+        if not cut:
+            cut = len(data)
+        self._partial = data[cut:]
+        lines = self._window.filter(data[:cut])
+        if lines:
+            self._writer.write(lines)
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Reads the rest of the trace, writes the index, and removes the
+        FIFO."""
+        try:
+            if self._keep_open >= 0:
+                os.close(self._keep_open)
+                self._keep_open = -1
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+            self._writer.close()
+        finally:
+            if self.fifo.exists():
+                # Never leave a FIFO where the results are archived
+                os.remove(self.fifo)
+
+    def summary(self) -> Dict[str, Any]:
+        """Returns the summary of the captured trace to be stored with the
+        run."""
+        chunks = self._writer.chunks
+        firsts = [c[4] for c in chunks if c[4] is not None]
+        lasts = [c[5] for c in chunks if c[5] is not None]
+        return {
+            "file": self.path.name,
+            "bytes": self._read,
+            "kept_bytes": self._writer.bytes,
+            "compressed_bytes": self._writer.compressed_bytes,
+            "chunks": len(chunks),
+            "first_tick": firsts[0] if firsts else None,
+            "last_tick": lasts[-1] if lasts else None,
+            "error": repr(self.error) if self.error else "",
+        }
+
+
+def readTrace(
+    path: Union[str, Path], start: int = 0, end: int = 0
+) -> Iterator[bytes]:
+    """Yields the lines of a trace written by TraceCapture (e.g.,
+    outdir/trace.gz) with ticks in [start, end) (an end of 0 means no end).
+
+    Only the chunks which overlap the window are read and decompressed.
+    """
+    path = Path(path)
+    with open(path.with_name(f"{path.name}.idx")) as f:
+        chunks = json.load(f)["chunks"]
+
+    window = TickWindow(start, end)
+    with open(path, "rb") as f:
+        for offset, size, _, _, first, last in chunks:
+            if start and last is not None and last < start:
+                continue
+            if end and first is not None and first >= end:
+                break
+            f.seek(offset)
+            lines = window.filter(
+                zlib.decompress(f.read(size), 16 + zlib.MAX_WBITS)
+            )
+            yield from lines.splitlines(keepends=True)
+            if window.done:
+                break
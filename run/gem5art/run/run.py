@@ -0,0 +1,1356 @@
+# Copyright (c) 2019, 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+This file defines a gem5Run object which contains all information needed to
+run a single gem5 test.
+
+This class works closely with the artifact module to ensure that the gem5
+experiment is reproducible and the output is saved to the database.
+"""
+
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import ExitStack
+import hashlib
+import json
+import os
+from pathlib import Path
+import signal
+import subprocess
+import time
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID, uuid4
+
+from gem5art import artifact
+from gem5art.artifact import Artifact
+from gem5art.artifact._artifactdb import ArtifactDB
+
+from ._archive import (
+    ArchivePolicy,
+    ZipStreamWriter,
+    findMember,
+    indexMembers,
+    openMember,
+)
+from ._live import mergeLiveResults
+from ._logwatcher import DEFAULT_FAILURE_SIGNATURES, LogWatcher
+from ._placement import CorePlacement, applyPlacement, placeCommand
+from ._stats import readStats
+from ._supervisor import ExitWaiter, Supervisor, openPidfd
+from ._trace import TraceCapture
+
+# Fields of the info which change all of the time. Changes to these fields
+# alone do not cause info.json to be written (see gem5Run._updateInfo).
+_VOLATILE_INFO_FIELDS = {"current_time", "resource_samples", "last_progress"}
+
+
+class gem5Run:
+    """
+    This class holds all of the info required to run gem5.
+    """
+
+    _id: UUID
+    hash: str
+    type: str
+    name: str
+    gem5_binary_path: Path
+    run_script: Path
+    gem5_artifact: Artifact
+    gem5_git_artifact: Artifact
+    run_script_git_artifact: Artifact
+    params: Tuple[str, ...]
+    timeout: int
+    check_failure: Callable[["gem5Run"], bool]
+    failure_signatures: Dict[str, str] = DEFAULT_FAILURE_SIGNATURES
+    progress_target: Dict[str, float] = {}
+    # Seconds without any progress before the run is killed (0 disables it)
+    stall_timeout: float = 0.0
+
+    gem5_name: str
+    script_name: str
+    linux_name: str
+    disk_name: str
+    string: str
+
+    outdir: Path
+
+    linux_binary_path: Path
+    disk_image_path: Path
+    linux_binary_artifact: Artifact
+    disk_image_artifact: Artifact
+
+    command: List[str]
+
+    running: bool
+    enqueue_time: float
+    start_time: float
+    current_time: float
+    end_time: float
+    return_code: int
+    kill_reason: str
+    kill_details: str
+    status: str
+    pid: int
+    task_id: Any
+
+    # The summaries of the captured stdout and stderr (see _supervise)
+    output: Dict[str, Dict[str, Any]] = {}
+
+    # The latest simulation progress from stats.txt (see _supervise)
+    progress: Dict[str, Any] = {}
+    # When and where the simulation last made progress (see _supervise)
+    last_progress: Dict[str, Any] = {}
+
+    # The expected peak memory of gem5 in bytes, if known (see
+    # MemoryAdmission)
+    memory_hint: int = 0
+
+    # The CPU and NUMA node that gem5 ran on (see CorePlacement)
+    placement: Dict[str, Any] = {}
+
+    # Host resources used by gem5 (see _supervise)
+    resource_usage: Dict[str, float] = {}
+    resource_samples: List[List[float]] = []
+
+    results: Optional[Artifact]
+    # Results which are stored as separate artifacts (see saveResults)
+    result_artifacts: List[UUID] = []
+    artifacts: List[Artifact]
+
+    rerunnable: bool
+
+    # Seconds between checking the health of a running gem5 process
+    check_interval: float = 5.0
+    # While running, info.json is only written when something changed, at
+    # most every info_min_interval seconds, and at least every info_heartbeat
+    # seconds (to update current_time).
+    info_min_interval: float = 10.0
+    info_heartbeat: float = 60.0
+    # If capture_output is set, gem5's stdout and stderr are captured in
+    # rings of at most output_max_segments gzip files of
+    # output_segment_bytes each instead of being written to simout and simerr
+    capture_output: bool = False
+    output_segment_bytes: int = 64 * 1024 * 1024
+    output_max_segments: int = 4
+    # results.zip is compressed with archive_codec ("deflate", "fast", or
+    # "store") by archive_workers threads (see ZipStreamWriter)
+    archive_codec: str = "deflate"
+    archive_workers: int = 4
+    # The arguments of the ArchivePolicy which chooses the files that are
+    # archived, e.g., {"exclude": ["cpt.*"]}
+    archive_policy: Dict[str, Any] = {}
+    # Also write results.zip into the outdir (it is always uploaded)
+    keep_results_zip: bool = False
+    # Store the parsed stats.txt in the database (see saveStats)
+    save_stats: bool = True
+    # Send the new results to the database every sync_interval seconds
+    # while gem5 is running (see LiveSync). 0 disables it.
+    sync_interval: float = 0.0
+    # Never garbage collect this run or its results (see ResultsGC)
+    pinned: bool = False
+    # gem5's --debug-flags. If there are any, the debug trace is written to
+    # a FIFO and compressed into trace.gz while gem5 is running (see
+    # TraceCapture). Only the ticks in [trace_start, trace_end) are kept
+    # (a trace_end of 0 means no end). The summary is stored in trace.
+    trace_flags: List[str] = []
+    trace_start: int = 0
+    trace_end: int = 0
+    trace_chunk_bytes: int = 16 * 1024 * 1024
+    trace: Dict[str, Any] = {}
+    _trace: Optional[TraceCapture] = None
+    _info_written: Optional[Dict[str, Any]] = None
+    _info_time: float = 0.0
+
+    @classmethod
+    def _create(
+        cls,
+        name: str,
+        run_script: Path,
+        outdir: Path,
+        gem5_artifact: Artifact,
+        gem5_git_artifact: Artifact,
+        run_script_git_artifact: Artifact,
+        params: Tuple[str, ...],
+        timeout: int,
+        check_failure: Callable[["gem5Run"], bool],
+        failure_signatures: Optional[Dict[str, str]],
+        progress_target: Optional[Dict[str, float]],
+        stall_timeout: float,
+    ) -> "gem5Run":
+        """
+        Shared code between SE and FS when creating a run object.
+        """
+        run = cls()
+        run.name = name
+        run.gem5_binary_path = gem5_artifact.path
+        run.run_script = run_script
+        run.gem5_artifact = gem5_artifact
+        run.gem5_git_artifact = gem5_git_artifact
+        run.run_script_git_artifact = run_script_git_artifact
+        run.params = params
+        run.timeout = timeout
+
+        # Note: Mypy doesn't support monkey patching like this
+        run.check_failure = check_failure # type: ignore
+        if failure_signatures is None:
+            failure_signatures = DEFAULT_FAILURE_SIGNATURES
+        run.failure_signatures = dict(failure_signatures)
+        run.progress_target = dict(progress_target or {})
+        run.stall_timeout = stall_timeout
+
+        run._id = uuid4()
+
+        run.outdir = outdir.resolve()  # ensure this is absolute
+
+        # Assumes **/<gem5_name>/gem5.<anything>
+        run.gem5_name = run.gem5_binary_path.parent.name
+        # Assumes **/<script_name>.py
+        run.script_name = run.run_script.stem
+
+        # Info about the actual run
+        run.running = False
+        run.enqueue_time = time.time()
+        run.start_time = 0.0
+        run.end_time = 0.0
+        run.return_code = 0
+        run.kill_reason = ""
+        run.kill_details = ""
+        run.status = "Created"
+        run.pid = 0
+        run.task_id = None
+        run.output = {}
+        run.progress = {}
+        run.last_progress = {}
+        run.placement = {}
+        run.resource_usage = {}
+        run.resource_samples = []
+        run.archive_policy = {}
+        run.trace_flags = []
+        run.trace = {}
+
+        # Initially, there are no results
+        run.results = None
+        run.result_artifacts = []
+
+        run.rerunnable = False
+
+        return run
+
+    @classmethod
+    def createSERun(
+        cls,
+        name: str,
+        run_script: str,
+        outdir: str,
+        gem5_artifact: Artifact,
+        gem5_git_artifact: Artifact,
+        run_script_git_artifact: Artifact,
+        *params: str,
+        timeout: int = 60 * 15,
+        check_failure: Callable[["gem5Run"], bool] = lambda run: False,
+        failure_signatures: Optional[Dict[str, str]] = None,
+        progress_target: Optional[Dict[str, float]] = None,
+        stall_timeout: float = 0.0,
+    ) -> "gem5Run":
+        """
+        name is the name of the run. The name is not necessarily unique. The
+        name could be used to query the results of the run.
+
+        run_script is the path to the run script to pass to gem5.
+
+        The artifact parameters (gem5_artifact, gem5_git_artifact, and
+        run_script_git_artifact) are used to ensure this is reproducible run.
+
+        Further parameters can be passed via extra arguments. These
+        parameters will be passed in order to the gem5 run script.
+        timeout is the time in seconds to run the subprocess before killing it.
+
+        failure_signatures maps names to regular expressions. If a line of
+        gem5's output matches one of them, the simulation is killed with the
+        name as the kill reason. By default, DEFAULT_FAILURE_SIGNATURES
+        (kernel panics and oopses, gem5 fatal errors, deadlocks) are used.
+
+        progress_target maps a stat (e.g., sim_insts or final_tick) to its
+        expected value at the end of the simulation. It is used to estimate
+        the ETA of the run from the stats dumps in stats.txt.
+
+        stall_timeout is the time in seconds that the simulation may run
+        without making progress (no new output and no new stats dumps)
+        before it is killed with "stall" as the kill reason. It is disabled
+        by default (0).
+
+        Note: When instantiating this class for the first time, it will create
+        a file `info.json` in the outdir which contains a serialized version
+        of this class.
+        """
+
+        run = cls._create(
+            name,
+            Path(run_script),
+            Path(outdir),
+            gem5_artifact,
+            gem5_git_artifact,
+            run_script_git_artifact,
+            params,
+            timeout,
+            check_failure,
+            failure_signatures,
+            progress_target,
+            stall_timeout,
+        )
+
+        run.artifacts = [
+            gem5_artifact,
+            gem5_git_artifact,
+            run_script_git_artifact,
+        ]
+
+        run.string = f"{run.gem5_name} {run.script_name}"
+        run.string += " ".join(run.params)
+
+        run.command = [
+            str(run.gem5_binary_path),
+            "-re",
+            f"--outdir={run.outdir}",
+            str(run.run_script),
+        ]
+        run.command += list(params)
+
+        run.hash = run._getHash()
+        run.type = "gem5 run"
+
+        # Make the directory if it doesn't exist
+        os.makedirs(run.outdir, exist_ok=True)
+        run.dumpJson("info.json")
+
+        return run
+
+    @classmethod
+    def createFSRun(
+        cls,
+        name: str,
+        run_script: str,
+        outdir: str,
+        gem5_artifact: Artifact,
+        gem5_git_artifact: Artifact,
+        run_script_git_artifact: Artifact,
+        linux_binary_artifact: Artifact,
+        disk_image_artifact: Artifact,
+        *params: str,
+        timeout: int = 60 * 15,
+        check_failure: Callable[["gem5Run"], bool] = lambda run: False,
+        failure_signatures: Optional[Dict[str, str]] = None,
+        progress_target: Optional[Dict[str, float]] = None,
+        stall_timeout: float = 0.0,
+    ) -> "gem5Run":
+        """
+        name is the name of the run. The name is not necessarily unique. The
+        name could be used to query the results of the run.
+
+        run_script is the path to the run script to pass to gem5.
+
+        Further parameters can be passed via extra arguments. These
+        parameters will be passed in order to the gem5 run script.
+
+        check_failure is a user-defined function that will be executed
+        periodically (e.g., every 10 seconds) to check the health of the
+        simulation. When it returns True, the simulation will be killed
+
+        failure_signatures maps names to regular expressions. If a line of
+        gem5's output (the terminal, simout, or simerr) matches one of them,
+        the simulation is killed with the name as the kill reason. By
+        default, DEFAULT_FAILURE_SIGNATURES (kernel panics and oopses, gem5
+        fatal errors, deadlocks) are used.
+
+        progress_target maps a stat (e.g., sim_insts or final_tick) to its
+        expected value at the end of the simulation. It is used to estimate
+        the ETA of the run from the stats dumps in stats.txt.
+
+        stall_timeout is the time in seconds that the simulation may run
+        without making progress (no new output and no new stats dumps)
+        before it is killed with "stall" as the kill reason. It is disabled
+        by default (0).
+
+        Note: When instantiating this class for the first time, it will create
+        a file `info.json` in the outdir which contains a serialized version
+        of this class.
+        """
+        run = cls._create(
+            name,
+            Path(run_script),
+            Path(outdir),
+            gem5_artifact,
+            gem5_git_artifact,
+            run_script_git_artifact,
+            params,
+            timeout,
+            check_failure,
+            failure_signatures,
+            progress_target,
+            stall_timeout,
+        )
+        run.linux_binary_path = Path(linux_binary_artifact.path)
+        run.disk_image_path = Path(disk_image_artifact.path)
+        run.linux_binary_artifact = linux_binary_artifact
+        run.disk_image_artifact = disk_image_artifact
+
+        # Assumes **/<linux_name>
+        run.linux_name = run.linux_binary_path.name
+        # Assumes **/<disk_name>
+        run.disk_name = disk_image_artifact.name
+
+        run.artifacts = [
+            gem5_artifact,
+            gem5_git_artifact,
+            run_script_git_artifact,
+            linux_binary_artifact,
+            disk_image_artifact,
+        ]
+
+        run.string = f"{run.gem5_name} {run.script_name} "
+        run.string += f"{run.linux_name} {run.disk_name} "
+        run.string += " ".join(run.params)
+        run.command = [
+            str(run.gem5_binary_path),
+            "-re",
+            f"--outdir={run.outdir}",
+            str(run.run_script),
+            str(run.linux_binary_path),
+            str(run.disk_image_path),
+        ]
+        run.command += list(params)
+
+        run.hash = run._getHash()
+        run.type = "gem5 run fs"
+
+        # Make the directory if it doesn't exist
+        os.makedirs(run.outdir, exist_ok=True)
+        run.dumpJson("info.json")
+
+        return run
+
+    @classmethod
+    def loadJson(cls, filename: str) -> "gem5Run":
+        with open(filename) as f:
+            d = json.load(f)
+            # Convert string version of UUID to UUID object
+            for k, v in d.iteritems():
+                if k.endswith("_artifact"):
+                    d[k] = UUID(v)
+            d["_id"] = UUID(d["_id"])
+        try:
+            return cls.loadFromDict(d)
+        except KeyError:
+            print("Incompatible json file: {}!".format(filename))
+            raise
+
+    @classmethod
+    def loadFromDict(cls, d: Dict[str, Union[str, UUID]]) -> "gem5Run":
+        """Returns new gem5Run instance from the dictionary of values in d"""
+        run = cls()
+        run.artifacts = []
+        for k, v in d.items():
+            if k == "inputs":
+                # Derived from the artifacts. See _getSerializable
+                continue
+            if isinstance(v, UUID) and k != "_id":
+                a = Artifact(v)
+                setattr(run, k, a)
+                run.artifacts.append(a)
+            else:
+                setattr(run, k, v)
+        return run
+
+    def checkArtifacts(self, cwd: str, skip: Iterable[Artifact] = ()) -> bool:
+        """Checks to make sure all of the artifacts are up to date
+
+        This should happen just before running gem5. This function will return
+        False if the artifacts don't check and true if they are all the same.
+        For the git repos, this checks the git hash, for binary artifacts this
+        checks the md5 hash.
+
+        skip is a list of artifacts which are known to be up to date (e.g.,
+        copies in the artifact cache which were checked when they were added).
+        """
+        skip_ids = {v._id for v in skip}
+        for v in self.artifacts:
+            if v._id in skip_ids:
+                continue
+            if v.type == "git repo":
+                new = artifact.artifact.getGit(cwd / v.path)["hash"]
+                old = v.git["hash"]
+            else:
+                new = artifact.artifact.getHash(cwd / v.path)
+                old = v.hash
+
+            if new != old:
+                self.status = f"Failed artifact check for {cwd / v.path}"
+                return False
+
+        return True
+
+    def _useArtifactCache(
+        self, stack: ExitStack, cwd: str
+    ) -> Tuple[List[str], List[Artifact]]:
+        """Returns the command to run and the artifacts that were replaced
+        with their copies in the node-local artifact cache (see
+        gem5art.artifact.getArtifactCache). The copies are kept in the cache
+        until the stack is closed.
+
+        Only the files of artifacts which are passed on the command line (e.g.,
+        the gem5 binary, the kernel, and the disk image) are cached.
+        """
+        cache = artifact.getArtifactCache()
+        if cache is None:
+            return self.command, []
+
+        paths = {}
+        cached = []
+        for v in self.artifacts:
+            if v.type == "git repo" or str(v.path) not in self.command:
+                continue
+            # The gem5 binary must stay executable
+            executable = str(v.path) == self.command[0]
+            paths[str(v.path)] = str(stack.enter_context(
+                cache.open(v, cwd, executable)))
+            cached.append(v)
+
+        return [paths.get(arg, arg) for arg in self.command], cached
+
+    def __repr__(self) -> str:
+        return str(self._getSerializable())
+
+    def checkKernelPanic(self) -> bool:
+        """
+        Returns true if the gem5 instance specified in args has a kernel panic
+        Note: this gets around the problem that gem5 doesn't exit on panics.
+
+        This scans the whole terminal output. While running, the output is
+        scanned incrementally for all of the failure_signatures instead.
+        """
+        term_path = self.outdir / "system.pc.com_1.device"
+        signature = {"kernel panic": DEFAULT_FAILURE_SIGNATURES["kernel panic"]}
+        with LogWatcher(signature, [term_path]) as watcher:
+            return watcher.check() is not None
+
+    def _getSerializable(self) -> Dict[str, Union[str, UUID]]:
+        """Returns a dictionary that can be used to recreate this object
+
+        Note: All artifacts are converted to a UUID instead of an Artifact.
+        """
+        # Grab all of the member variables
+        d = vars(self).copy()
+
+        # Replace the list of artifacts with their UUIDs so that the run is
+        # part of the artifacts' provenance graph (see getRunsUsingArtifact)
+        d["inputs"] = [art._id for art in d["artifacts"]]
+        del d["artifacts"]
+
+        # Doesn't make sense to serialize the user-specified fail function
+        if 'check_failure' in d.keys():
+            del d["check_failure"]
+
+        # Private attributes only exist while running (e.g., open files)
+        for k in [k for k in d if k.startswith("_") and k != "_id"]:
+            del d[k]
+
+        # Replace the artifacts with their UUIDs
+        for k, v in d.items():
+            if isinstance(v, Artifact):
+                d[k] = v._id
+            if isinstance(v, Path):
+                d[k] = str(v)
+
+        return d
+
+    def _getHash(self) -> str:
+        """Return a single value that uniquely identifies this run
+
+        To uniquely identify this run, the gem5 binary, gem5 scripts, and
+        parameters should all match. Thus, let's make a single hash out of the
+        artifacts + the runscript + parameters
+        """
+        to_hash = [art._id.bytes for art in self.artifacts]
+        to_hash.append(str(self.run_script).encode())
+        to_hash.append(" ".join(self.params).encode())
+
+        return hashlib.md5(b"".join(to_hash)).hexdigest()
+
+    @classmethod
+    def _convertForJson(cls, d: Dict[str, Any]) -> Dict[str, str]:
+        """Converts UUID objects to strings for json compatibility"""
+        for k, v in d.items():
+            if isinstance(v, UUID):
+                d[k] = str(v)
+            elif isinstance(v, list):
+                d[k] = [str(i) if isinstance(i, UUID) else i for i in v]
+        return d
+
+    def dumpJson(self, filename: str) -> None:
+        """Dump all info into a json file
+
+        The file is replaced atomically so that readers never see a
+        partially written file.
+        """
+        d = self._convertForJson(self._getSerializable())
+        self._writeJson(filename, d)
+        if filename == "info.json":
+            self._info_written = {
+                k: v for k, v in d.items() if k not in _VOLATILE_INFO_FIELDS
+            }
+            self._info_time = time.time()
+
+    def _writeJson(self, filename: str, d: Dict[str, Any]) -> None:
+        path = self.outdir / filename
+        tmp = path.with_name(f".{filename}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(d, f)
+        os.replace(tmp, path)
+
+    def _updateInfo(self) -> None:
+        """Dump the info into info.json if it changed (ignoring the fields
+        in _VOLATILE_INFO_FIELDS) and it hasn't been written in the last
+        info_min_interval seconds, or if it hasn't been written in the last
+        info_heartbeat seconds.
+        """
+        now = time.time()
+        since_written = now - self._info_time
+        if since_written < self.info_min_interval:
+            return
+
+        d = self._convertForJson(self._getSerializable())
+        stable = {
+            k: v for k, v in d.items() if k not in _VOLATILE_INFO_FIELDS
+        }
+        if (
+            stable == self._info_written
+            and since_written < self.info_heartbeat
+        ):
+            return
+
+        self._writeJson("info.json", d)
+        self._info_written = stable
+        self._info_time = now
+
+    def dumpsJson(self) -> str:
+        """Like dumpJson except returns string"""
+        d = self._convertForJson(self._getSerializable())
+        return json.dumps(d)
+
+    def _run(
+        self,
+        task: Any = None,
+        cwd: str = ".",
+        placement: Optional[CorePlacement] = None,
+    ) -> None:
+        """Actually run the test.
+
+        Calls Popen with the command to fork a new process.
+        Then, this function waits for the process to finish. Every
+        check_interval seconds, it checks the health of the process. Changes
+        to the run are dumped to the json info (at most every
+        info_min_interval seconds) so other applications can poll those
+        files.
+
+        task is the celery task that is running this gem5 instance.
+
+        cwd is the directory to change to before running. This allows a server
+        process to run in a different directory than the running process. Note
+        that only the spawned process runs in the new directory.
+
+        placement is an optional policy (e.g., CorePlacement) which chooses
+        the CPU that gem5 runs on. The placement is stored in placement.
+        """
+        # Connect to the database
+        db = artifact.getDBConnection()
+
+        # Use the node-local copies of the artifacts if there is a cache.
+        # They stay in the cache at least until gem5 exits.
+        with ExitStack() as stack:
+            command = self._prepare(stack, cwd, task, placement)
+            if command is None:
+                return
+
+            proc = self._spawn(command, cwd)
+
+            # Register handler in case this process is killed while the gem5
+            # instance is running. Note: there's a bit of a race condition
+            # here, but hopefully it's not a big deal
+            def handler(signum, frame):
+                os.kill(proc.pid, signal.SIGKILL)
+                self.kill_reason = "sigterm"
+                self.dumpJson("info.json")
+                # Note: We'll fall out of the while loop after this.
+
+            # This makes it so if you term *this* process, it will actually
+            # kill the subprocess and then this process will die.
+            signal.signal(signal.SIGTERM, handler)
+
+            self._supervise(proc)
+
+        print("Done running {}".format(" ".join(self.command)))
+
+        self._finish(proc)
+
+        # Store current gem5 run in the database
+        db.put(self._id, self._getSerializable())
+
+        print("Done storing the results of {}".format(" ".join(self.command)))
+
+    def _prepare(
+        self,
+        stack: ExitStack,
+        cwd: str,
+        task: Any = None,
+        placement: Optional[CorePlacement] = None,
+    ) -> Optional[List[str]]:
+        """Checks the artifacts and returns the command to run, or None if
+        the artifact check failed.
+
+        The artifacts used from the node-local artifact cache and the core
+        reserved by the placement stay reserved until the stack is closed.
+        """
+        self.status = "Begin run"
+        self.dumpJson("info.json")
+
+        command, cached = self._useArtifactCache(stack, cwd)
+
+        if not self.checkArtifacts(cwd, cached):
+            self.dumpJson("info.json")
+            return None
+
+        self.status = "Spawning"
+
+        self.start_time = time.time()
+        self.task_id = task.request.id if task else None
+        self.dumpJson("info.json")
+
+        # When the output is captured, gem5 must not redirect it to the
+        # (unbounded) simout and simerr.
+        if self.capture_output:
+            command = [arg for arg in command if arg != "-re"]
+
+        if self.trace_flags:
+            command = self._traceCommand(command)
+            self._trace = stack.enter_context(TraceCapture(
+                self.outdir, start=self.trace_start, end=self.trace_end,
+                chunk_bytes=self.trace_chunk_bytes,
+            ))
+
+        self.placement = {}
+        if placement is not None:
+            placed = stack.enter_context(placement.acquire())
+            self.placement = placed or {}
+        return placeCommand(self.placement, command)
+
+    def _traceCommand(self, command: List[str]) -> List[str]:
+        """Returns the command with the gem5 options to write the debug
+        trace to the FIFO of the TraceCapture. gem5 itself also only traces
+        the ticks in the window."""
+        options = [
+            f"--debug-flags={','.join(self.trace_flags)}",
+            # Relative to the outdir
+            "--debug-file=trace.fifo",
+        ]
+        if self.trace_start:
+            options.append(f"--debug-start={self.trace_start}")
+        if self.trace_end:
+            options.append(f"--debug-end={self.trace_end}")
+        # The gem5 options come before the script
+        i = next(i for i, arg in enumerate(command)
+                 if arg.startswith("--outdir="))
+        return command[:i + 1] + options + command[i + 1:]
+
+    def _spawn(self, command: List[str], cwd: str) -> subprocess.Popen:
+        """Starts running the gem5 command."""
+        pipe = subprocess.PIPE if self.capture_output else None
+        proc = subprocess.Popen(command, cwd=cwd, stdout=pipe, stderr=pipe)
+        applyPlacement(self.placement, proc.pid)
+
+        self.status = "Running"
+        self.pid = proc.pid
+        self.running = True
+        self.dumpJson("info.json")
+
+        return proc
+
+    def _finish(self, proc: subprocess.Popen) -> None:
+        """Records the end of the run and saves the results. The run still
+        has to be stored in the database."""
+        self.running = False
+        self.end_time = time.time()
+        self.return_code = proc.returncode
+
+        if self.return_code == 0:
+            self.status = "Finished"
+        else:
+            self.status = "Failed"
+
+        if self._trace is not None:
+            self.trace = self._trace.summary()
+            self._trace = None
+
+        self.dumpJson("info.json")
+
+        self.saveResults()
+        if self.save_stats:
+            self.saveStats()
+        if self.sync_interval:
+            # The complete results replace the partial ones
+            try:
+                artifact.getDBConnection().deleteLiveResults(self._id)
+            except NotImplementedError:
+                pass
+
+    def _supervise(self, proc: subprocess.Popen) -> None:
+        """Waits until the gem5 process exits.
+
+        Instead of polling, this blocks until either the process exits or the
+        next timer is due (see Supervisor for the timers and health checks).
+
+        If they are pipes, the stdout and stderr of the process are captured
+        (see OutputCapture) and also scanned for the failure_signatures.
+        Their summaries are stored in output.
+
+        If stall_timeout is set, the process is also killed when it makes no
+        progress for stall_timeout seconds. The output files, the captured
+        output, and the simulated ticks in the stats dumps are checked for
+        progress. When and where the last progress was seen is stored in
+        last_progress.
+
+        The process is reaped with wait4 so that its total resource usage
+        (CPU time, peak RSS, block I/O) is stored in resource_usage.
+        """
+        supervisor = Supervisor(self, proc)
+        for name, stream in (("stdout", proc.stdout),
+                             ("stderr", proc.stderr)):
+            if stream is not None:
+                supervisor.addCapture(name).captureStream(stream)
+
+        with ExitWaiter(proc) as waiter:
+            while not supervisor.reap():
+                waiter.wait(supervisor.tick(time.time()))
+
+        for capture in supervisor.captures:
+            capture.join()
+        supervisor.finish()
+
+    async def _superviseAsync(self, proc: subprocess.Popen) -> None:
+        """Like _supervise, except that it waits in the running asyncio
+        event loop so that many processes can be supervised at once."""
+        loop = asyncio.get_running_loop()
+        supervisor = Supervisor(self, proc)
+        ends = [
+            supervisor.addCapture(name).captureAsync(stream, loop)
+            for name, stream in (("stdout", proc.stdout),
+                                 ("stderr", proc.stderr))
+            if stream is not None
+        ]
+
+        exited = asyncio.Event()
+        pidfd = openPidfd(proc.pid)
+        if pidfd >= 0:
+            loop.add_reader(pidfd, exited.set)
+        try:
+            while not supervisor.reap():
+                timeout = supervisor.tick(time.time())
+                if pidfd < 0:
+                    # Without a pidfd, check for the exit periodically
+                    timeout = min(timeout, 0.1)
+                try:
+                    await asyncio.wait_for(exited.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            supervisor.kill("cancelled")
+            # Reap it without blocking the event loop
+            await loop.run_in_executor(None, proc.wait)
+            raise
+        finally:
+            if pidfd >= 0:
+                loop.remove_reader(pidfd)
+                os.close(pidfd)
+
+        await asyncio.gather(*ends)
+        supervisor.finish()
+
+    async def run_async(
+        self,
+        cwd: str = ".",
+        writer: Optional["RunBatchWriter"] = None,
+        executor: Optional[Executor] = None,
+        placement: Optional[CorePlacement] = None,
+    ) -> None:
+        """Run this gem5 instance in the running asyncio event loop.
+
+        This is like run(), except that many runs can be supervised by a
+        single process (e.g., with asyncio.gather()). The blocking parts
+        (checking the artifacts and saving the results) run in executor
+        (default: the event loop's default executor).
+
+        If writer is given, the run is stored in the database with the
+        other runs of the writer in batches. Otherwise, it is stored as soon
+        as it is done.
+
+        placement is an optional policy (e.g., CorePlacement) which chooses
+        the CPU that gem5 runs on.
+        """
+        loop = asyncio.get_running_loop()
+        db = artifact.getDBConnection()
+
+        # Check if the run is already in the database
+        if await loop.run_in_executor(executor, db.__contains__, self.hash):
+            print(f"Error: Have already run {self.command}. Exiting!")
+            return
+
+        with ExitStack() as stack:
+            command = await loop.run_in_executor(
+                executor, self._prepare, stack, cwd, None, placement
+            )
+            if command is None:
+                return
+
+            proc = self._spawn(command, cwd)
+            await self._superviseAsync(proc)
+
+        await loop.run_in_executor(executor, self._finish, proc)
+
+        if writer is None:
+            await loop.run_in_executor(
+                executor, db.put, self._id, self._getSerializable()
+            )
+        else:
+            await writer.put(self._getSerializable())
+
+    def _updateProgress(self, progress: Dict[str, Any]) -> None:
+        """Stores the progress and checks whether, at the current rate, the
+        simulation will finish before it times out."""
+        progress = dict(progress)
+        if progress["eta"] is not None:
+            finish = progress["last_dump_time"] + progress["eta"]
+            progress["projected_time"] = finish - self.start_time
+            progress["over_timeout"] = (
+                finish > self.start_time + self.timeout
+            )
+        self.progress = progress
+
+    def run(
+        self,
+        task: Any = None,
+        cwd: str = ".",
+        placement: Optional[CorePlacement] = None,
+    ) -> None:
+        """Actually run the test.
+
+        Calls Popen with the command to fork a new process.
+        Then, this function waits for the process to finish. Every
+        check_interval seconds, it checks the health of the process. Changes
+        to the run are dumped to the json info (at most every
+        info_min_interval seconds) so other applications can poll those
+        files.
+
+        task is the celery task that is running this gem5 instance.
+
+        cwd is the directory to change to before running. This allows a server
+        process to run in a different directory than the running process. Note
+        that only the spawned process runs in the new directory.
+
+        placement is an optional policy (e.g., CorePlacement) which chooses
+        the CPU that gem5 runs on. The placement is stored in placement.
+        """
+        # Check if the run is already in the database
+        db = artifact.getDBConnection()
+        if self.hash in db:
+            print(f"Error: Have already run {self.command}. Exiting!")
+            return
+        self._run(task, cwd, placement)
+
+    def rerun(
+        self,
+        task: Any = None,
+        cwd: str = ".",
+        placement: Optional[CorePlacement] = None,
+    ) -> None:
+        """ Rerun the test.
+
+        Calls Popen with the command to fork a new process.
+        Then, this function waits for the process to finish. Every
+        check_interval seconds, it checks the health of the process. Changes
+        to the run are dumped to the json info (at most every
+        info_min_interval seconds) so other applications can poll those
+        files.
+
+        task is the celery task that is running this gem5 instance.
+
+        cwd is the directory to change to before running. This allows a server
+        process to run in a different directory than the running process. Note
+        that only the spawned process runs in the new directory.
+
+        placement is an optional policy (e.g., CorePlacement) which chooses
+        the CPU that gem5 runs on. The placement is stored in placement.
+        """
+        # The old runs with the same hash are kept. ResultsGC removes them
+        # (and their results) once they are superseded by this run.
+        self._run(task, cwd, placement)
+
+
+    def saveResults(self) -> None:
+        """Zip up the output directory and store the results in the
+        database.
+
+        The files are compressed in parallel, and files which are already
+        compressed or do not compress are stored without compression.
+
+        The archive_policy (see ArchivePolicy) chooses which files are
+        archived and which are stored as separate artifacts (listed in
+        result_artifacts). What was done with each file is recorded in
+        manifest.json in the archive.
+
+        The archive is streamed to the database while it is written. It is
+        only written to results.zip in the outdir if keep_results_zip is
+        true or the database does not store files.
+        """
+
+        policy = ArchivePolicy(**self.archive_policy)
+        plan = policy.plan(self.outdir, skip=["results.zip"])
+
+        # Large files are stored as separate artifacts
+        separate = [(path, relative) for path, relative, _, decision in plan
+                    if decision == "artifact"]
+        artifacts = Artifact.registerArtifacts([
+            dict(
+                command=" ".join(self.command),
+                name=f"{self.name}: {relative}",
+                typ="gem5 output",
+                path=path,
+                cwd="./",
+                documentation=f"{relative} in the results of {self.name}",
+            )
+            for path, relative in separate
+        ]) if separate else []
+        artifact_ids = {relative: art._id
+                        for (_, relative), art in zip(separate, artifacts)}
+        self.result_artifacts = list(artifact_ids.values())
+
+        manifest = {
+            "outdir": self.outdir.name,
+            "policy": policy.toDict(),
+            "files": [
+                {"path": relative, "size": size, "decision": decision,
+                 "artifact": str(artifact_ids.get(relative, ""))}
+                for path, relative, size, decision in plan
+                if not path.is_dir()
+            ],
+        }
+
+        def writeResults(out: BinaryIO) -> Dict[str, str]:
+            with ZipStreamWriter(out, self.archive_codec,
+                                 self.archive_workers) as writer:
+                for path, relative, _, decision in plan:
+                    if decision == "archive":
+                        writer.add(path, f"{self.outdir.name}/{relative}")
+                writer.addBytes("manifest.json",
+                                json.dumps(manifest, indent=1).encode())
+            # Stored with the artifact for openResult
+            index = indexMembers(writer.members)
+            return {"index": json.dumps(index, separators=(",", ":"))}
+
+        self.results = Artifact.registerStream(
+            writeResults,
+            command=f"zip results.zip -r {self.outdir}",
+            name=self.name,
+            typ="directory",
+            path=self.outdir / "results.zip",
+            cwd="./",
+            documentation="Compressed version of the results directory",
+            keep_local=self.keep_results_zip,
+        )
+
+    def openResult(self, name: str) -> BinaryIO:
+        """Returns a file object to read a file of the stored results,
+        e.g., "stats.txt" (relative to the outdir) or "manifest.json".
+
+        Only the bytes of that file are read from the database: the index
+        of results.zip which is stored with the results artifact gives
+        where they are. For older results without an index, the central
+        directory of results.zip is read first.
+        """
+        if self.results is None:
+            raise Exception(f"{self.name} has no results")
+        # Runs loaded from a file database only have the UUID
+        results: Any = self.results
+        if not isinstance(results, Artifact):
+            results = Artifact(results)
+
+        member = f"{Path(self.outdir).name}/{name}"
+        db = artifact.getDBConnection()
+        if db.storesFiles():
+            f = db.openFile(results._id)
+        else:
+            f = open(results.path, "rb")
+        try:
+            index = json.loads(results.extra.get("index", "{}"))
+            entry = index.get(member) or index.get(name)
+            if entry is None:
+                try:
+                    entry = findMember(f, member)
+                except KeyError:
+                    entry = findMember(f, name)
+            return openMember(f, entry)
+        except BaseException:
+            f.close()
+            raise
+
+    def saveStats(self) -> None:
+        """Parses every dump in stats.txt and stores the stats in the
+        database (see ArtifactDB.putStats), where they can be searched
+        without downloading the results (see getStatsByNameLike).
+
+        Errors are only printed, so that the run itself is always stored.
+        The stats are still in the results."""
+        path = self.outdir / "stats.txt"
+        if not path.exists():
+            return
+        try:
+            names, dumps = readStats(path)
+            if dumps:
+                artifact.getDBConnection().putStats(self._id, self.name,
+                                                    names, dumps)
+        except NotImplementedError:
+            # This database cannot store stats
+            pass
+        except Exception as e:
+            print(f"WARNING: could not store the stats of {self.name}: "
+                  f"{e!r}")
+
+    def __str__(self) -> str:
+        return self.string + " -> " + self.status
+
+
+class RunBatchWriter:
+    """
+    Stores the documents of finished runs (see gem5Run.run_async) in the
+    database in batches with ArtifactDB.putMany.
+
+    The documents are written when there are batch_size of them, when the
+    oldest one has waited for interval seconds, and on flush(). All of the
+    writes happen in one worker thread so that the event loop is never
+    blocked by the database.
+
+    If a write fails, its documents are kept and written again with the
+    next batch. A write which fails in flush() raises its error.
+    """
+
+    def __init__(self, batch_size: int = 32, interval: float = 10.0) -> None:
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending: List[Dict[str, Any]] = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The flush started by the timer
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def put(self, doc: Dict[str, Any]) -> None:
+        """Adds the document of a run to the next batch."""
+        self._pending.append(doc)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._timer is None and self._task is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.interval, self._flushLater)
+
+    def _flushLater(self) -> None:
+        self._timer = None
+        self._task = asyncio.get_running_loop().create_task(self.flush())
+        self._task.add_done_callback(self._flushed)
+
+    def _flushed(self, task: "asyncio.Task[None]") -> None:
+        if task is self._task:
+            self._task = None
+        if not task.cancelled() and task.exception() is not None:
+            print(f"WARNING: could not store {len(self._pending)} runs, "
+                  f"will try again: {task.exception()!r}")
+
+    async def flush(self) -> None:
+        """Writes all of the pending documents to the database."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = self._task
+        if task is not None and task is not asyncio.current_task():
+            # Its documents are written again below if it fails
+            await asyncio.wait([task])
+        docs, self._pending = self._pending, []
+        if not docs:
+            return
+        db = artifact.getDBConnection()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, db.putMany, docs
+            )
+        except BaseException:
+            self._pending = docs + self._pending
+            raise
+
+
+def getRuns(
+    db: ArtifactDB, fs_only: bool = False, limit: int = 0
+) -> Iterable[gem5Run]:
+    """Returns a generator of gem5Run objects.
+
+    If fs_only is True, then only full system runs will be returned.
+    Limit specifies the maximum number of runs to return.
+    """
+
+    if not fs_only:
+        runs = db.searchByType("gem5 run", limit=limit)
+        for run in runs:
+            yield gem5Run.loadFromDict(run)
+
+    fsruns = db.searchByType("gem5 run fs", limit=limit)
+    for run in fsruns:
+        yield gem5Run.loadFromDict(run)
+
+
+def getRunsByName(
+    db: ArtifactDB, name: str, fs_only: bool = False, limit: int = 0
+) -> Iterable[gem5Run]:
+    """Returns a generator of gem5Run objects, which have the field "name"
+    **exactly** the same as the name parameter. The name used in this query
+    is case sensitive.
+
+    If fs_only is True, then only full system runs will be returned.
+    Limit specifies the maximum number of runs to return.
+    """
+
+    if not fs_only:
+        seruns = db.searchByNameType(name, "gem5 run", limit=limit)
+        for run in seruns:
+            yield gem5Run.loadFromDict(run)
+
+    fsruns = db.searchByNameType(name, "gem5 run fs", limit=limit)
+
+    for run in fsruns:
+        yield gem5Run.loadFromDict(run)
+
+
+def getRunsByNameLike(
+    db: ArtifactDB, name: str, fs_only: bool = False, limit: int = 0
+) -> Iterable[gem5Run]:
+    """Return a generator of gem5Run objects, which have the field "name"
+    containing the name parameter as a substring. The name used in this
+    query is case sensitive.
+
+    If fs_only is True, then only full system runs will be returned.
+    Limit specifies the maximum number of runs to return.
+    """
+
+    if not fs_only:
+        seruns = db.searchByLikeNameType(name, "gem5 run", limit=limit)
+
+        for run in seruns:
+            yield gem5Run.loadFromDict(run)
+
+    fsruns = db.searchByLikeNameType(name, "gem5 run fs", limit=limit)
+
+    for run in fsruns:
+        yield gem5Run.loadFromDict(run)
+
+
+def getRerunnableRunsByNameLike(
+    db: ArtifactDB, name: str, fs_only: bool = False, limit: int = 0
+) -> Iterable[gem5Run]:
+
+    """ Returns a generator of gem5Run objects having `rerunnable == True`
+    and the object "name" containing the name parameter as a substring. The
+    parameter is case sensitive.
+
+    If fs_only is True, then only full system runs will be returned.
+    Limit specifies the maximum number of runs to return.
+    """
+
+    for run in getRunsByNameLike(db, name, fs_only, limit):
+        if run.rerunnable:
+            yield run
+
+
+def getRunsUsingArtifact(
+    db: ArtifactDB, key: UUID, depth: int = 0, fs_only: bool = False
+) -> Iterable[gem5Run]:
+    """Returns a generator of gem5Run objects which used the artifact with
+    the UUID key or any artifact derived from it (e.g., all runs using a
+    kernel built from some git repo).
+
+    Depth specifies the maximum number of levels of inputs to follow (0 for
+    no limit). If fs_only is True, then only full system runs will be
+    returned.
+    """
+
+    types = ["gem5 run fs"] if fs_only else ["gem5 run", "gem5 run fs"]
+    for d in db.getDescendants(key, depth):
+        if d["type"] in types:
+            yield gem5Run.loadFromDict(d)
+
+
+def getStatsByNameLike(
+    db: ArtifactDB, name: str, stats: Iterable[str]
+) -> Iterable[Dict[str, Any]]:
+    """Returns a generator of the stored stats of the runs which have the
+    field "name" matching the name parameter (a regex, see
+    getRunsByNameLike).
+
+    Only the stats in the stats parameter are returned (e.g.,
+    ["sim_seconds"]). Each item is a dictionary with the "_id" and "name"
+    of the run and "stats", which maps each stat to a list of its values in
+    each of the stats dumps.
+    """
+
+    yield from db.searchStats(stats, name_like=name)
+
+
+def getLiveResultsByNameLike(
+    db: ArtifactDB, name: str
+) -> Iterable[Dict[str, Any]]:
+    """Returns a generator of the partial results of the runs which have
+    the field "name" matching the name parameter (a regex, see
+    getRunsByNameLike) and which were sent while they were running (see
+    gem5Run.sync_interval). The partial results are removed when a run
+    finishes, so these are the runs which are still running or which were
+    lost (e.g., if their node crashed). The "time" of the last update tells
+    them apart.
+
+    Each item is a dictionary with the "_id" and "name" of the run, "run"
+    (the command, outdir, hash, and start time), the latest "time",
+    "status", "progress", and "output" tails, and the stats "dumps".
+    """
+
+    for d in db.searchLiveResults(name):
+        merged = mergeLiveResults(db.getLiveResults(d["_id"]))
+        merged["_id"] = d["_id"]
+        merged["name"] = d["name"]
+        yield merged
+
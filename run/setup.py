@@ -54,6 +54,9 @@ setup(
     keywords='simulation architecture gem5',
     packages=find_namespace_packages(),
     install_requires=['gem5art-artifact'],
+    extras_require={
+         'export': ['numpy'],
+    },
     python_requires='>=3.6',
     project_urls={
         'Bug Reports':'https://github.com/darchr/gem5art/issues',
@@ -62,5 +65,6 @@ setup(
     },
     scripts = [
         'bin/gem5art-getruns',
+        'bin/gem5art-gc',
     ],
 )
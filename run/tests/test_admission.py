@@ -0,0 +1,97 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for the memory-aware admission of runs"""
+
+import os
+from pathlib import Path
+from types import SimpleNamespace
+import unittest
+from uuid import uuid4
+
+from gem5art.artifact._artifactdb import getDBConnection
+from gem5art.run import MemoryAdmission
+
+class FakeRun:
+    def __init__(self, binary, params, memory_hint=0):
+        self.gem5_artifact = SimpleNamespace(_id=binary)
+        self.run_script = Path('configs/run.py')
+        self.params = params
+        self.memory_hint = memory_hint
+
+class TestMemoryAdmission(unittest.TestCase):
+
+    def setUp(self):
+        self.db = getDBConnection('file://test-admission.json')
+        self.binary = uuid4()
+        self.db.put(self.binary, {'_id': self.binary, 'hash': 'gem5',
+                                  'type': 'gem5 binary', 'inputs': []})
+        self.addRun(['big'], {'max_rss': 1000})
+        # Another disk image (i.e., another hash) uses more memory
+        self.addRun(['big'], {'max_rss': 1200})
+        self.addRun(['old'], {})
+
+    def tearDown(self):
+        os.remove('test-admission.json')
+
+    def addRun(self, params, usage):
+        key = uuid4()
+        self.db.put(key, {'_id': key, 'hash': str(key),
+                          'type': 'gem5 run fs', 'inputs': [self.binary],
+                          'gem5_artifact': str(self.binary),
+                          'run_script': 'configs/run.py', 'params': params,
+                          'resource_usage': usage})
+
+    def test_estimate(self):
+        admission = MemoryAdmission(budget=5000, default_estimate=300,
+                                    margin=1.5)
+        # The history comes from earlier runs, not from the runs themselves
+        runs = [FakeRun(self.binary, ['big']),
+                FakeRun(self.binary, ['big'], memory_hint=10),
+                FakeRun(self.binary, ['old']), FakeRun(self.binary, ['new']),
+                FakeRun(uuid4(), ['big'])]
+        self.assertEqual(admission.estimate(runs),
+                         [1800, 10, 300, 300, 300])
+
+    def test_pick(self):
+        admission = MemoryAdmission(budget=1000)
+        # Always admit one run
+        self.assertEqual(admission.pick([2000, 100]), 0)
+        admission.admit(800)
+        # Backfill with the first run which fits
+        self.assertEqual(admission.pick([2000, 300, 100]), 2)
+        admission.admit(100)
+        self.assertIsNone(admission.pick([2000, 300]))
+        admission.release(800)
+        self.assertEqual(admission.pick([2000, 300]), 1)
+        self.assertEqual(admission.running, 1)
+        self.assertEqual(admission.reserved, 100)
+
+    def test_budget(self):
+        self.assertGreater(MemoryAdmission().budget, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for archiving the results of runs"""
+
+import gzip
+import io
+import os
+from pathlib import Path
+import shutil
+import unittest
+from unittest import mock
+import zipfile
+
+from gem5art.run import ArchivePolicy, _archive
+from gem5art.run._archive import (ZipStreamWriter, chooseMethod, findMember,
+                                  indexMembers, openMember, writeArchive)
+
+class Unseekable(io.RawIOBase):
+    """A stream which can only be written to (e.g., a pipe or upload)"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        raise io.UnsupportedOperation()
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.outdir = Path('test-archive/out')
+        (self.outdir / 'cpt.1000').mkdir(parents=True)
+        (self.outdir / 'stats.txt').write_bytes(b'sim_ticks 1000\n' * 10000)
+        (self.outdir / 'empty').write_bytes(b'')
+        self.random = os.urandom(1024 * 1024)
+        (self.outdir / 'random.bin').write_bytes(self.random)
+        with gzip.open(self.outdir / 'cpt.1000' / 'mem.pmem.gz', 'wb') as f:
+            f.write(b'\0' * 100000)
+        self.files = [(path, str(path.relative_to(self.outdir.parent)))
+                      for path in sorted(self.outdir.glob('**/*'))]
+
+    def tearDown(self):
+        shutil.rmtree('test-archive')
+
+    def check(self, data, files):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(),
+                             ['out/cpt.1000/', 'out/cpt.1000/mem.pmem.gz',
+                              'out/empty', 'out/random.bin', 'out/stats.txt'])
+            self.assertEqual(zf.read('out/random.bin'), self.random)
+            self.assertEqual(zf.read('out/stats.txt'),
+                             b'sim_ticks 1000\n' * 10000)
+            methods = {i.filename: i.compress_type for i in zf.infolist()}
+        self.assertEqual(methods['out/stats.txt'], zipfile.ZIP_DEFLATED)
+        self.assertEqual(methods['out/random.bin'], zipfile.ZIP_STORED)
+        self.assertEqual(methods['out/cpt.1000/mem.pmem.gz'],
+                         zipfile.ZIP_STORED)
+
+    def test_archive(self):
+        out = Unseekable()
+        members = writeArchive(out, self.files, workers=2)
+        self.check(bytes(out.data), self.files)
+        # The offsets of the data of the members are recorded
+        member = [m for m in members if m.name == 'out/random.bin'][0]
+        start = member.data_offset
+        self.assertEqual(out.data[start:start + member.size], self.random)
+
+    def test_zip64(self):
+        out = Unseekable()
+        with mock.patch.object(_archive, '_ZIP64_LIMIT', 1000):
+            writeArchive(out, self.files, codec='fast')
+        self.check(bytes(out.data), self.files)
+
+    def test_methods(self):
+        stats = self.outdir / 'stats.txt'
+        self.assertEqual(chooseMethod(stats, stats.stat().st_size),
+                         zipfile.ZIP_DEFLATED)
+        self.assertEqual(chooseMethod(stats, stats.stat().st_size, 'store'),
+                         zipfile.ZIP_STORED)
+
+    def test_policy(self):
+        policy = ArchivePolicy(exclude=['cpt.*'], max_member_size=100000,
+                               separate_size=500000)
+        self.assertEqual(policy.decide('cpt.1000/mem.pmem.gz', 10),
+                         'excluded')
+        self.assertEqual(policy.decide('stats.txt', 200000), 'too large')
+        self.assertEqual(policy.decide('disk.img', 600000), 'artifact')
+        self.assertEqual(policy.decide('config.ini', 10), 'archive')
+
+        plan = {relative: decision for _, relative, _, decision
+                in policy.plan(self.outdir, skip=['empty'])}
+        self.assertEqual(plan, {'cpt.1000': 'excluded',
+                                'cpt.1000/mem.pmem.gz': 'excluded',
+                                'random.bin': 'artifact',
+                                'stats.txt': 'too large'})
+
+        policy = ArchivePolicy(include=['*.gz'])
+        plan = {relative: decision for _, relative, _, decision
+                in policy.plan(self.outdir)}
+        self.assertEqual(plan['cpt.1000'], 'archive')
+        self.assertEqual(plan['stats.txt'], 'excluded')
+
+    def test_add_bytes(self):
+        out = Unseekable()
+        with ZipStreamWriter(out) as writer:
+            writer.addBytes('manifest.json', b'{"files": []}')
+        with zipfile.ZipFile(io.BytesIO(bytes(out.data))) as zf:
+            self.assertEqual(zf.read('manifest.json'), b'{"files": []}')
+
+    def test_error(self):
+        # A failure while archiving stops the compression
+        out = Unseekable()
+        with self.assertRaises(RuntimeError):
+            with ZipStreamWriter(out) as writer:
+                writer.add(self.outdir / 'stats.txt', 'out/stats.txt')
+                raise RuntimeError()
+        self.assertEqual(bytes(out.data), b'')
+
+    def test_open_member(self):
+        out = Unseekable()
+        index = indexMembers(writeArchive(out, self.files))
+        data = bytes(out.data)
+        stats = b'sim_ticks 1000\n' * 10000
+
+        # Small chunks to read the member in many pieces
+        with mock.patch.object(_archive, '_CHUNK_SIZE', 1000):
+            for name, expected in [('out/stats.txt', stats),
+                                   ('out/random.bin', self.random),
+                                   ('out/empty', b'')]:
+                with openMember(io.BytesIO(data), index[name]) as f:
+                    self.assertEqual(f.read(), expected)
+
+        # Without the index
+        entry = findMember(io.BytesIO(data), 'out/stats.txt')
+        self.assertEqual(entry, index['out/stats.txt'])
+        with self.assertRaises(KeyError):
+            findMember(io.BytesIO(data), 'out/missing')
+
+        # The CRC is checked
+        entry = list(index['out/stats.txt'])
+        entry[1] ^= 1
+        with openMember(io.BytesIO(data), entry) as f:
+            with self.assertRaises(zipfile.BadZipFile):
+                f.read()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for capturing the output of gem5"""
+
+import gzip
+from pathlib import Path
+import shutil
+import subprocess
+import unittest
+
+from gem5art.run import DEFAULT_FAILURE_SIGNATURES
+from gem5art.run._capture import OutputCapture
+from gem5art.run._logwatcher import LogWatcher
+
+class TestOutputCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.outdir = Path('test-capture')
+        self.outdir.mkdir()
+        self.watcher = LogWatcher(DEFAULT_FAILURE_SIGNATURES)
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def capture(self, script, **kwargs):
+        proc = subprocess.Popen(['python3', '-c', script],
+                                stdout=subprocess.PIPE)
+        capture = OutputCapture('stdout', self.outdir, self.watcher.feed,
+                                **kwargs)
+        capture.captureStream(proc.stdout)
+        proc.wait()
+        capture.join()
+        return capture
+
+    def test_small(self):
+        capture = self.capture('print("hello")')
+        self.assertIsNone(capture.takeFailure())
+        summary = capture.summary()
+        self.assertEqual(summary['bytes'], 6)
+        self.assertEqual(summary['head'], 'hello\n')
+        self.assertEqual(summary['tail'], 'hello\n')
+        self.assertEqual(summary['files'], ['stdout.0.gz'])
+        with gzip.open(self.outdir / 'stdout.0.gz') as f:
+            self.assertEqual(f.read(), b'hello\n')
+
+    def test_ring(self):
+        capture = self.capture(
+            'for i in range(1000): print(f"{i:09d}")',
+            segment_bytes=1000, max_segments=3, summary_bytes=20)
+        summary = capture.summary()
+        self.assertEqual(summary['bytes'], 10000)
+        self.assertEqual(summary['dropped_bytes'], 7000)
+        self.assertEqual(summary['files'],
+                         ['stdout.7.gz', 'stdout.8.gz', 'stdout.9.gz'])
+        self.assertEqual(sorted(p.name for p in self.outdir.iterdir()),
+                         summary['files'])
+        self.assertEqual(summary['head'], '000000000\n000000001\n')
+        self.assertEqual(summary['tail'], '000000998\n000000999\n')
+        with gzip.open(self.outdir / 'stdout.9.gz') as f:
+            self.assertEqual(f.read(1000)[-10:], b'000000999\n')
+
+    def test_failure(self):
+        capture = self.capture('print("fatal: out of memory")')
+        self.assertEqual(capture.takeFailure(),
+                         ('gem5 fatal', 'stdout', 'fatal: out of memory'))
+        self.assertIsNone(capture.takeFailure())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for comparing the stats of runs"""
+
+import os
+import unittest
+from uuid import uuid4
+
+from gem5art.artifact._artifactdb import getDBConnection
+from gem5art.run import compareStats, diffStats
+from gem5art.run._export import NUMPY_SUPPORT
+
+@unittest.skipUnless(NUMPY_SUPPORT, "NumPy is not installed")
+class TestDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.db = getDBConnection('file://test-diff.json')
+
+    def tearDown(self):
+        for p in ['test-diff.json', 'test-diff.stats.json']:
+            if os.path.exists(p):
+                os.remove(p)
+
+    def addRun(self, name, params, values, end_time=0.0):
+        key = uuid4()
+        self.db.put(key, {'_id': key, 'hash': str(key), 'type': 'gem5 run',
+                          'name': name, 'params': params,
+                          'end_time': end_time})
+        names = list(values)
+        self.db.putStats(key, name, names, [[values[n] for n in names]])
+        return key
+
+    def test_compare(self):
+        base = [[1.0, 0.0, 2.0, float('nan')], [10.0, 5.0, 1.0, 1.0]]
+        new = [[1.001, 1.0, float('nan'), float('nan')],
+               [12.0, 5.0, 0.5, 1.0]]
+        rows, cols, deltas = compareStats(base, new, rtol=0.01)
+        self.assertEqual(list(zip(rows.tolist(), cols.tolist())),
+                         [(0, 1), (0, 2), (1, 2), (1, 0)])
+        self.assertEqual(deltas.tolist()[2:], [-0.5, 0.2])
+
+        with self.assertRaises(ValueError):
+            compareStats([[1.0]], [[1.0, 2.0]])
+
+    def test_runs(self):
+        base = self.addRun('old', ['x86'], {'a': 1.0, 'b': 2.0})
+        new = self.addRun('new', ['x86'], {'a': 1.5, 'b': 2.0, 'c': 1.0})
+        diffs = diffStats(self.db, base, new)
+        self.assertEqual([d['stat'] for d in diffs], ['c', 'a'])
+        self.assertEqual(diffs[1], {'stat': 'a', 'params': [],
+                                    'base_run': base, 'new_run': new,
+                                    'base': 1.0, 'new': 1.5, 'delta': 0.5})
+        self.assertEqual(diffs[0]['base'], None)
+
+    def test_groups(self):
+        for isa, ipc in [('x86', 1.0), ('arm', 2.0), ('riscv', 3.0)]:
+            self.addRun(f'old-{isa}', ['old/gem5.opt', isa], {'ipc': ipc})
+        # Only the latest rerun is compared
+        self.addRun('new-x86', ['new/gem5.opt', 'x86'], {'ipc': 9.0}, 1.0)
+        self.addRun('new-x86', ['new/gem5.opt', 'x86'], {'ipc': 1.0}, 2.0)
+        self.addRun('new-arm', ['new/gem5.opt', 'arm'], {'ipc': 3.0})
+        self.addRun('new-arm', ['new/gem5.opt', 'arm'], {'ipc': 2.1})
+
+        diffs = diffStats(self.db, '^old-', '^new-', stats=['i*'],
+                          match=[1], rtol=0.02)
+        self.assertEqual([(d['params'], d['base'], d['new']) for d in diffs],
+                         [(['arm'], 2.0, 2.1)])
+
+        # Nothing matches without leaving out the binary
+        self.assertEqual(diffStats(self.db, '^old-', '^new-'), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for exporting the stats of many runs"""
+
+import os
+from pathlib import Path
+import shutil
+import unittest
+from uuid import uuid4
+
+from gem5art.artifact._artifactdb import getDBConnection
+from gem5art.run import exportStats, loadStatsExport
+from gem5art.run._export import NUMPY_SUPPORT
+
+@unittest.skipUnless(NUMPY_SUPPORT, "NumPy is not installed")
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.db = getDBConnection('file://test-export.json')
+        self.runs = []
+
+    def tearDown(self):
+        for p in ['test-export.json', 'test-export.stats.json',
+                  'test-export.npz']:
+            if os.path.exists(p):
+                os.remove(p)
+        shutil.rmtree('test-export', ignore_errors=True)
+
+    def addRun(self, name, params, dumps):
+        key = uuid4()
+        self.db.put(key, {'_id': key, 'hash': str(key), 'type': 'gem5 run',
+                          'name': name, 'params': params})
+        names = ['sim_seconds', 'system.cpu0.ipc', 'system.cpu1.ipc']
+        self.db.putStats(key, name, names, dumps)
+        self.runs.append(str(key))
+
+    def test_export(self):
+        self.addRun('sweep-1', ['x86', '1'], [[0.0, 0.0, 0.0], [1.0, 2.0, 3.0]])
+        self.addRun('sweep-2', ['arm'], [[5.0, None, 6.0]])
+        self.addRun('other', ['x86', '1'], [[9.0, 9.0, 9.0]])
+
+        columns = exportStats(self.db, 'test-export.npz', 'sweep',
+                              ['sim_seconds', 'system.cpu*.ipc'])
+        order = sorted(self.runs[:2])
+        self.assertEqual(list(columns['run_id']), order)
+        rows = [self.runs.index(r) for r in order]
+        expected = [[1.0, 2.0, 3.0], [5.0, float('nan'), 6.0]]
+        for stat, i in [('sim_seconds', 0), ('system.cpu0.ipc', 1),
+                        ('system.cpu1.ipc', 2)]:
+            values = [expected[r][i] for r in rows]
+            self.assertEqual(str(columns[stat].tolist()), str(values))
+
+        categories = list(columns['param0_categories'])
+        self.assertEqual(sorted(categories), ['arm', 'x86'])
+        self.assertEqual(
+            [categories[c] for c in columns['param0']],
+            [['x86', 'arm'][r] for r in rows])
+        self.assertEqual(sorted(columns['param1']), [-1, 0])
+
+        loaded = loadStatsExport('test-export.npz')
+        self.assertEqual(list(loaded['run_id']), order)
+
+    def test_incremental(self):
+        self.addRun('sweep-1', ['x86'], [[1.0, 1.0, 1.0]])
+        exportStats(self.db, 'test-export', 'sweep', ['sim_seconds'])
+
+        self.addRun('sweep-2', ['arm', '2'], [[2.0, 2.0, 2.0]])
+        # Only the new run is read
+        self.db._stats['runs'][self.runs[0]]['dumps'] = [[7.0, 7.0, 7.0]]
+        columns = exportStats(self.db, 'test-export', 'sweep',
+                              ['sim_seconds'])
+        self.assertEqual(list(columns['run_id']), self.runs)
+        self.assertEqual(list(columns['sim_seconds']), [1.0, 2.0])
+        self.assertEqual(list(columns['param0_categories']), ['x86', 'arm'])
+        self.assertEqual(list(columns['param0']), [0, 1])
+        self.assertEqual(list(columns['param1']), [-1, 0])
+
+        loaded = loadStatsExport('test-export')
+        self.assertEqual(list(loaded['sim_seconds']), [1.0, 2.0])
+
+        # Changing the stats exports every run again
+        columns = exportStats(self.db, 'test-export', 'sweep',
+                              ['system.cpu0.ipc'])
+        values = dict(zip(columns['run_id'],
+                          columns['system.cpu0.ipc'].tolist()))
+        self.assertEqual(values, {self.runs[0]: 7.0, self.runs[1]: 2.0})
+        self.assertNotIn('sim_seconds', loadStatsExport('test-export'))
+
+if __name__ == '__main__':
+    unittest.main()
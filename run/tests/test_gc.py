@@ -0,0 +1,161 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for the garbage collection of results"""
+
+import os
+import shutil
+import time
+import unittest
+from unittest import mock
+from uuid import UUID, uuid4
+
+from gem5art.artifact._artifactdb import getDBConnection
+from gem5art.run import ResultsGC
+from gem5art.run._gc import DAY
+
+class TestResultsGC(unittest.TestCase):
+
+    def setUp(self):
+        self.now = time.time()
+        with mock.patch.dict(os.environ, {'GEM5ART_STORAGE': 'test-gc'}):
+            self.db = getDBConnection('file://test-gc.json')
+        self.disk = self.addArtifact('disk image', 'disk.img', age=100 * DAY)
+
+    def tearDown(self):
+        for p in ['test-gc.json', 'test-gc.stats.json']:
+            if os.path.exists(p):
+                os.remove(p)
+        shutil.rmtree('test-gc', ignore_errors=True)
+
+    def addFile(self, key, size, age):
+        path = f'test-gc/{key}'
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        os.utime(path, (self.now - age, self.now - age))
+        return os.stat(path).st_blocks * 512
+
+    def addArtifact(self, typ, name, age, size=0, inputs=()):
+        key = uuid4()
+        self.db.put(key, {'_id': key, 'hash': str(key), 'type': typ,
+                          'name': name, 'time': self.now - age,
+                          'inputs': [str(i) for i in inputs]})
+        if size:
+            self.addFile(key, size, age)
+        return key
+
+    def addRun(self, hsh, status, age, size=4096, **kwargs):
+        results = self.addArtifact('directory', 'results', age, size)
+        key = uuid4()
+        doc = {'_id': key, 'hash': hsh, 'type': 'gem5 run',
+               'name': f'run-{hsh}', 'status': status,
+               'end_time': self.now - age, 'inputs': [str(self.disk)],
+               'results': str(results), 'result_artifacts': []}
+        doc.update(kwargs)
+        self.db.put(key, doc)
+        self.db.putStats(key, doc['name'], ['sim_seconds'], [[1.0]])
+        return key, results
+
+    def test_retention(self):
+        old, old_results = self.addRun('a', 'Finished', age=10 * DAY)
+        latest, latest_results = self.addRun('a', 'Finished', age=5 * DAY)
+        failed, failed_results = self.addRun('b', 'Failed', age=10 * DAY)
+        recent, _ = self.addRun('b', 'Failed', age=2 * DAY)
+        pinned, _ = self.addRun('c', 'Finished', age=20 * DAY)
+        self.addRun('c', 'Finished', age=1 * DAY, pinned=False)
+        orphan = uuid4()
+        self.addFile(orphan, 100, age=2 * DAY)
+        uploading = uuid4()
+        self.addFile(uploading, 100, age=60)
+
+        gc = ResultsGC(self.db, pinned=[pinned])
+        report = gc.collect(dry_run=True, now=self.now)
+        self.assertEqual(report['runs'], 2)
+        self.assertIn(old, self.db)
+
+        report = gc.collect(now=self.now)
+        self.assertEqual(report['runs'], 2)
+        self.assertEqual(report['results'], 2)
+        self.assertEqual(report['files'], 1)
+        self.assertEqual(report['remaining'], 0)
+        for key in [old, old_results, failed, failed_results]:
+            self.assertNotIn(key, self.db)
+            self.assertFalse(os.path.exists(f'test-gc/{key}'))
+        for key in [latest, latest_results, recent, pinned, self.disk]:
+            self.assertIn(key, self.db)
+        self.assertTrue(os.path.exists(f'test-gc/{latest_results}'))
+        self.assertFalse(os.path.exists(f'test-gc/{orphan}'))
+        self.assertTrue(os.path.exists(f'test-gc/{uploading}'))
+        self.assertIsNone(self.db.getStats(old))
+        self.assertIsNotNone(self.db.getStats(latest))
+
+        # Nothing is left
+        self.assertEqual(gc.collect(now=self.now)['runs'], 0)
+
+    def test_quota(self):
+        runs = [self.addRun('a', 'Failed', age=age * DAY, size=64 * 1024)
+                for age in [5, 4, 3]]
+        latest, _ = self.addRun('a', 'Finished', age=2 * DAY, size=64 * 1024)
+
+        # Only the newest failed run fits next to the latest run
+        size = 64 * 1024 * 2
+        gc = ResultsGC(self.db, keep_superseded=DAY, max_bytes=size)
+        report = gc.collect(max_runs=1, now=self.now)
+        self.assertEqual(report['runs'], 1)
+        self.assertEqual(report['remaining'], 1)
+        self.assertNotIn(runs[0][0], self.db)
+
+        gc.collect(now=self.now)
+        self.assertNotIn(runs[1][0], self.db)
+        self.assertIn(runs[2][0], self.db)
+        self.assertIn(latest, self.db)
+
+    def test_no_stats(self):
+        # The live results are deleted even if the stats cannot be
+        old, _ = self.addRun('a', 'Finished', age=10 * DAY)
+        self.addRun('a', 'Finished', age=5 * DAY)
+        self.db.putLiveResults(old, 'run-a', {'seq': 0, 'time': self.now})
+        with mock.patch.object(type(self.db), 'deleteStats',
+                               side_effect=NotImplementedError):
+            ResultsGC(self.db).collect(now=self.now)
+        self.assertNotIn(old, self.db)
+        self.assertEqual(self.db.getLiveResults(old), [])
+
+    def test_lost_runs(self):
+        lost = uuid4()
+        self.db.putLiveResults(lost, 'lost',
+                               {'seq': 0, 'time': self.now - 8 * DAY})
+        running = uuid4()
+        self.db.putLiveResults(running, 'running',
+                               {'seq': 0, 'time': self.now - 60})
+
+        report = ResultsGC(self.db).collect(now=self.now)
+        self.assertEqual(report['lost'], 1)
+        self.assertEqual(self.db.getLiveResults(lost), [])
+        self.assertNotEqual(self.db.getLiveResults(running), [])
+
+if __name__ == "__main__":
+    unittest.main()
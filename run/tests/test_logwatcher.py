@@ -0,0 +1,73 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for LogWatcher"""
+
+import os
+from pathlib import Path
+import unittest
+
+from gem5art.run import DEFAULT_FAILURE_SIGNATURES
+from gem5art.run._logwatcher import LogWatcher
+
+class TestLogWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.path = Path('test-terminal.txt')
+        self.path.write_bytes(b'Booting Linux\n')
+        self.watcher = LogWatcher(DEFAULT_FAILURE_SIGNATURES, [self.path])
+
+    def tearDown(self):
+        self.watcher.close()
+        os.remove(self.path)
+
+    def append(self, data):
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def test_no_failure(self):
+        self.assertIsNone(self.watcher.check())
+        self.append(b'Starting init\n')
+        self.assertIsNone(self.watcher.check())
+
+    def test_panic(self):
+        self.assertIsNone(self.watcher.check())
+        # Panics which have scrolled past are still found
+        self.append(b'Kernel panic - not syncing: VFS\nmore output\n')
+        self.assertEqual(self.watcher.check(),
+                         ('kernel panic', 'test-terminal.txt',
+                          'Kernel panic - not syncing: VFS'))
+
+    def test_split_line(self):
+        self.append(b'Kernel pa')
+        self.assertIsNone(self.watcher.check())
+        self.append(b'nic - not syncing\n')
+        self.assertEqual(self.watcher.check()[0], 'kernel panic')
+
+    def test_start_of_line(self):
+        self.assertIsNone(self.watcher.feed('simerr', b'info: not fatal: \n'))
+        self.assertEqual(self.watcher.feed('simerr', b'fatal: no file\n'),
+                         ('gem5 fatal', 'simerr', 'fatal: no file'))
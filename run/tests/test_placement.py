@@ -0,0 +1,86 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for placing gem5 processes on CPUs"""
+
+import os
+import shutil
+import subprocess
+import unittest
+
+from gem5art.run import CorePlacement
+from gem5art.run._placement import (
+    applyPlacement,
+    getPhysicalCores,
+    placeCommand,
+)
+
+class TestPlacement(unittest.TestCase):
+
+    def setUp(self):
+        self.placement = CorePlacement('test-placement', membind=False)
+
+    def tearDown(self):
+        shutil.rmtree('test-placement', ignore_errors=True)
+
+    def test_cores(self):
+        cores = getPhysicalCores()
+        cpus = [cpu for core in cores for cpu in core.cpus]
+        self.assertEqual(sorted(cpus), sorted(os.sched_getaffinity(0)))
+
+    def test_acquire(self):
+        n = len(getPhysicalCores())
+        with self.placement.acquire() as first:
+            self.assertEqual(len(first['cpus']), 1)
+            self.assertFalse(first['membind'])
+            with self.placement.acquire() as second:
+                if n == 1:
+                    # All of the cores are in use
+                    self.assertIsNone(second)
+                else:
+                    self.assertNotEqual(first['cpus'], second['cpus'])
+        # The core is free again
+        with self.placement.acquire() as again:
+            self.assertEqual(again, first)
+
+    def test_apply(self):
+        with self.placement.acquire() as placement:
+            self.assertEqual(placeCommand(placement, ['sleep', '1']),
+                             ['sleep', '1'])
+            proc = subprocess.Popen(['sleep', '1'])
+            applyPlacement(placement, proc.pid)
+            self.assertEqual(os.sched_getaffinity(proc.pid),
+                             set(placement['cpus']))
+            proc.kill()
+            proc.wait()
+
+    def test_membind(self):
+        placement = {'cpus': [0], 'numa_node': 1, 'membind': True}
+        self.assertEqual(placeCommand(placement, ['gem5']),
+                         ['numactl', '--membind=1', '--', 'gem5'])
+
+if __name__ == '__main__':
+    unittest.main()
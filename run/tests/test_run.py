@@ -26,14 +26,23 @@
 
 """Tests for gem5Run object"""
 
+import asyncio
 import hashlib
+import json
 from pathlib import Path
 import os
+import shutil
+import subprocess
+import time
 import unittest
+from unittest import mock
 from uuid import uuid4
+import zipfile
 
 from gem5art.artifact import artifact
-from gem5art.run import gem5Run
+from gem5art.artifact._artifactdb import getDBConnection
+from gem5art.run import (RunBatchWriter, gem5Run, getLiveResultsByNameLike,
+                         getStatsByNameLike)
 
 class TestSERun(unittest.TestCase):
 
@@ -87,6 +96,10 @@ class TestSERun(unittest.TestCase):
 		'extra','params'
 		)
 
+    def tearDown(self):
+        # Don't leave outputs for the next tests
+        shutil.rmtree('results/run_test', ignore_errors=True)
+
     def test_out_dir(self):
         relative_outdir = 'results/run_test/out'
         self.assertEqual(self.run.outdir.relative_to(Path('.').resolve()),
@@ -95,6 +108,27 @@ class TestSERun(unittest.TestCase):
         self.assertTrue(self.run.outdir.is_absolute(),
                         "outdir should be absolute directory")
 
+    def test_defaults_not_shared(self):
+        other = gem5Run.createSERun(
+            'other SE run',
+            'configs-tests/run_test.py',
+            'results/run_test/other',
+            self.gem5art,
+            self.gem5gitart,
+            self.runscptart,
+        )
+        self.run.failure_signatures['test'] = 'test failure'
+        self.run.archive_policy['exclude'] = ['cpt.*']
+        self.run.trace_flags.append('Exec')
+        self.run.trace['bytes'] = 1
+        self.run.result_artifacts.append(uuid4())
+        self.assertNotIn('test', other.failure_signatures)
+        self.assertEqual(other.archive_policy, {})
+        self.assertEqual(other.trace_flags, [])
+        self.assertEqual(other.trace, {})
+        self.assertEqual(other.result_artifacts, [])
+        self.assertNotIn('test', gem5Run.failure_signatures)
+
     def test_command(self):
         self.assertEqual(self.run.command,
         ['gem5/build/X86/gem5.opt', '-re',
@@ -104,5 +138,279 @@ class TestSERun(unittest.TestCase):
         'extra', 'params']
         )
 
+    def test_trace_command(self):
+        self.run.trace_flags = ['Exec', 'Cache']
+        self.run.trace_end = 1000
+        self.assertEqual(self.run._traceCommand(self.run.command),
+        ['gem5/build/X86/gem5.opt', '-re',
+        '--outdir={}'.format(os.path.abspath(
+        'results/run_test/out')),
+        '--debug-flags=Exec,Cache', '--debug-file=trace.fifo',
+        '--debug-end=1000',
+        'configs-tests/run_test.py',
+        'extra', 'params']
+        )
+
+    def test_supervise_exit(self):
+        # The run should be done as soon as the process exits, not after
+        # the next health check.
+        self.run.start_time = time.time()
+        proc = subprocess.Popen(['sleep', '0.1'])
+        self.run._supervise(proc)
+        self.assertEqual(proc.returncode, 0)
+        self.assertLess(time.time() - self.run.start_time, 2)
+        self.assertEqual(self.run.kill_reason, "")
+
+    def test_supervise_timeout(self):
+        self.run.timeout = 0.2
+        self.run.start_time = time.time()
+        proc = subprocess.Popen(['sleep', '10'])
+        self.run._supervise(proc)
+        self.assertEqual(self.run.kill_reason, "timeout")
+        self.assertLess(time.time() - self.run.start_time, 2)
+
+    def test_supervise_output(self):
+        # Failures in the captured output are detected
+        self.run.start_time = time.time()
+        self.run.check_interval = 0.05
+        os.makedirs(self.run.outdir, exist_ok=True)
+        proc = subprocess.Popen(
+            ['python3', '-c', 'print("fatal: no disk", flush=True); '
+                              'import time; time.sleep(10)'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.run._supervise(proc)
+        self.assertEqual(self.run.kill_reason, 'gem5 fatal')
+        self.assertEqual(self.run.kill_details, 'stdout: fatal: no disk')
+        self.assertEqual(self.run.output['stdout']['tail'], 'fatal: no disk\n')
+        self.assertEqual(self.run.output['stderr']['bytes'], 0)
+
+    def test_live_results(self):
+        db = getDBConnection('file://test-live.json')
+        try:
+            self.run.start_time = time.time()
+            self.run.check_interval = 0.05
+            self.run.sync_interval = 0.1
+            os.makedirs(self.run.outdir, exist_ok=True)
+            script = (
+                'import time\n'
+                'print("booting", flush=True)\n'
+                'with open("stats.txt", "w") as f:\n'
+                '    f.write("---------- Begin Simulation Statistics\\n"\n'
+                '            "sim_ticks 100 # ticks\\n"\n'
+                '            "---------- End Simulation Statistics\\n")\n'
+                'time.sleep(0.5)\n'
+            )
+            proc = subprocess.Popen(['python3', '-c', script],
+                                    cwd=self.run.outdir,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+            self.run._supervise(proc)
+
+            found = list(getLiveResultsByNameLike(db, 'SE'))
+            self.assertEqual(len(found), 1)
+            live = found[0]
+            self.assertEqual(live['_id'], self.run._id)
+            self.assertEqual(live['dumps'], [{'sim_ticks': 100.0}])
+            self.assertEqual(live['output']['stdout'], 'booting\n')
+            self.assertEqual(live['run']['hash'], self.run.hash)
+
+            # The partial results are removed when the run finishes
+            self.run.save_stats = False
+            with mock.patch.object(gem5Run, 'saveResults'):
+                self.run._finish(proc)
+            self.assertEqual(list(getLiveResultsByNameLike(db, 'SE')), [])
+        finally:
+            os.remove(self.run.outdir / 'stats.txt')
+            for p in ['test-live.json', 'test-live.stats.json']:
+                if os.path.exists(p):
+                    os.remove(p)
+
+    def test_resource_usage(self):
+        self.run.start_time = time.time()
+        self.run.check_interval = 0.05
+        proc = subprocess.Popen(['python3', '-c',
+            'import time; x = bytearray(64 << 20); time.sleep(0.3)'])
+        self.run._supervise(proc)
+        self.assertEqual(proc.returncode, 0)
+        usage = self.run.resource_usage
+        self.assertGreaterEqual(usage['max_rss'], 64 << 20)
+        self.assertGreater(usage['user_time'] + usage['system_time'], 0)
+        self.assertTrue(self.run.resource_samples)
+        self.assertEqual(len(self.run.resource_samples[0]), 3)
+        self.assertIn('resource_usage', self.run._getSerializable())
+
+    def test_stall(self):
+        self.run.start_time = time.time()
+        self.run.check_interval = 0.05
+        self.run.stall_timeout = 0.3
+        proc = subprocess.Popen(
+            ['python3', '-c', 'import time; print("booting", flush=True); '
+                              'time.sleep(10)'],
+            stdout=subprocess.PIPE)
+        self.run._supervise(proc)
+        self.assertEqual(self.run.kill_reason, 'stall')
+        self.assertLess(time.time() - self.run.start_time, 2)
+        self.assertEqual(self.run.last_progress['sources'], ['stdout'])
+
+    def test_supervise_async(self):
+        self.run.start_time = time.time()
+        self.run.check_interval = 0.05
+        self.run.timeout = 0.5
+        os.makedirs(self.run.outdir, exist_ok=True)
+
+        async def supervise():
+            procs = [subprocess.Popen(['python3', '-c', 'print("hello")'],
+                                      stdout=subprocess.PIPE),
+                     subprocess.Popen(['sleep', '10'])]
+            other = gem5Run.createSERun(
+                'test SE run 2', 'configs-tests/run_test.py',
+                'results/run_test/out2', self.gem5art, self.gem5gitart,
+                self.runscptart, timeout=0.5)
+            other.start_time = self.run.start_time
+            other.check_interval = 0.05
+            runs = [self.run, other]
+            await asyncio.gather(*(run._superviseAsync(proc)
+                                   for run, proc in zip(runs, procs)))
+            return runs, procs
+
+        (done, killed), procs = asyncio.run(supervise())
+        self.assertEqual(procs[0].returncode, 0)
+        self.assertEqual(done.output['stdout']['head'], 'hello\n')
+        self.assertIn('max_rss', done.resource_usage)
+        self.assertEqual(killed.kill_reason, 'timeout')
+        self.assertLess(time.time() - self.run.start_time, 2)
+
+    def test_supervise_cancelled(self):
+        self.run.start_time = time.time()
+        proc = subprocess.Popen(['sleep', '10'])
+
+        async def supervise():
+            task = asyncio.ensure_future(self.run._superviseAsync(proc))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(supervise())
+        self.assertEqual(self.run.kill_reason, 'cancelled')
+        self.assertEqual(proc.returncode, -9)
+
+    def test_batch_writer(self):
+        db = getDBConnection('file://test-runs.json')
+        try:
+            async def write():
+                writer = RunBatchWriter(batch_size=2)
+                await writer.put(self.run._getSerializable())
+                self.assertNotIn(self.run._id, db)
+                await writer.flush()
+            asyncio.run(write())
+            self.assertIn(self.run._id, db)
+        finally:
+            os.remove('test-runs.json')
+
+    def test_batch_writer_retry(self):
+        db = getDBConnection('file://test-runs.json')
+        put_many = type(db).putMany
+        calls = []
+        def flaky(self, docs):
+            calls.append(len(docs))
+            if len(calls) == 1:
+                raise Exception('database is down')
+            put_many(self, docs)
+        try:
+            async def write():
+                writer = RunBatchWriter(batch_size=2, interval=0.01)
+                await writer.put(self.run._getSerializable())
+                # The timer's write fails and is retried by the flush
+                await asyncio.sleep(0.1)
+                self.assertNotIn(self.run._id, db)
+                await writer.flush()
+            with mock.patch.object(type(db), 'putMany', flaky):
+                asyncio.run(write())
+            self.assertIn(self.run._id, db)
+            self.assertEqual(calls, [1, 1])
+        finally:
+            os.remove('test-runs.json')
+
+    def test_save_results(self):
+        db = getDBConnection('file://test-results.json')
+        try:
+            shutil.rmtree(self.run.outdir, ignore_errors=True)
+            os.makedirs(self.run.outdir / 'cpt.1')
+            (self.run.outdir / 'cpt.1' / 'mem.pmem').write_bytes(b'x' * 100)
+            (self.run.outdir / 'disk.img').write_bytes(b'y' * 100)
+            (self.run.outdir / 'stats.txt').write_bytes(b'sim_ticks 1\n')
+            self.run.archive_policy = {'exclude': ['cpt.*'],
+                                       'separate_size': 50}
+            self.run.saveResults()
+
+            self.assertIn(self.run.results._id, db)
+            self.assertEqual(len(self.run.result_artifacts), 1)
+            with zipfile.ZipFile(self.run.outdir / 'results.zip') as zf:
+                names = zf.namelist()
+                manifest = json.loads(zf.read('manifest.json'))
+            self.assertIn('out/stats.txt', names)
+            self.assertNotIn('out/disk.img', names)
+            self.assertNotIn('out/cpt.1/mem.pmem', names)
+            decisions = {f['path']: f['decision'] for f in manifest['files']}
+            self.assertEqual(decisions['disk.img'], 'artifact')
+            self.assertEqual(decisions['cpt.1/mem.pmem'], 'excluded')
+
+            with self.run.openResult('stats.txt') as f:
+                self.assertEqual(f.read(), b'sim_ticks 1\n')
+            with self.run.openResult('manifest.json') as f:
+                self.assertEqual(json.load(f), manifest)
+            # Results without an index
+            self.run.results.extra = {}
+            with self.run.openResult('stats.txt') as f:
+                self.assertEqual(f.read(), b'sim_ticks 1\n')
+        finally:
+            os.remove('test-results.json')
+
+    def test_save_stats(self):
+        db = getDBConnection('file://test-stats.json')
+        try:
+            os.makedirs(self.run.outdir, exist_ok=True)
+            (self.run.outdir / 'stats.txt').write_bytes(
+                b'---------- Begin Simulation Statistics ----------\n'
+                b'simSeconds    0.5    # Number of seconds simulated\n'
+                b'---------- End Simulation Statistics   ----------\n')
+            self.run.saveStats()
+            found = list(getStatsByNameLike(db, 'test', ['sim_seconds']))
+            self.assertEqual(found, [{'_id': self.run._id,
+                                      'name': self.run.name,
+                                      'stats': {'sim_seconds': [0.5]}}])
+
+            # A failure to store the stats never loses the run
+            with mock.patch.object(type(db), 'putStats',
+                                   side_effect=Exception('too large')):
+                self.run.saveStats()
+        finally:
+            os.remove(self.run.outdir / 'stats.txt')
+            os.remove('test-stats.stats.json')
+
+    def test_info_coalesced(self):
+        info = self.run.outdir / 'info.json'
+        self.run.dumpJson('info.json')
+        os.remove(info)
+
+        # Nothing but current_time changed
+        self.run.current_time = time.time()
+        self.run._info_time -= self.run.info_min_interval
+        self.run._updateInfo()
+        self.assertFalse(info.exists())
+
+        # Changes are written after the minimum interval
+        self.run.status = 'Running'
+        self.run._updateInfo()
+        self.assertTrue(info.exists())
+        self.assertEqual(os.listdir(self.run.outdir), ['info.json'])
+
+        # Unchanged info is written after the heartbeat interval
+        os.remove(info)
+        self.run._info_time -= self.run.info_heartbeat
+        self.run._updateInfo()
+        self.assertTrue(info.exists())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for reading stats.txt while gem5 is running"""
+
+import os
+from pathlib import Path
+import unittest
+from unittest.mock import patch
+
+from gem5art.run._stats import ProgressTracker, StatsTailer, readStats
+
+def dump(**stats):
+    lines = ['', '---------- Begin Simulation Statistics ----------']
+    lines += [f'{name:<40} {value:>20}   # description' for name, value
+              in stats.items()]
+    lines += ['system.cpu.dist::0-1     1   50.00%   50.00% # a distribution',
+              '', '---------- End Simulation Statistics   ----------', '']
+    return '\n'.join(lines).encode()
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        self.path = Path('test-stats.txt')
+        self.path.write_bytes(b'')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def append(self, data):
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def test_tailer(self):
+        tailer = StatsTailer(self.path)
+        data = dump(simTicks=1000, sim_insts=10)
+        # Only complete dumps are returned
+        self.append(data[:60])
+        self.assertEqual(tailer.read(), [])
+        self.append(data[60:])
+        self.assertEqual(tailer.read(), [{'sim_ticks': 1000.0,
+                                          'sim_insts': 10.0,
+                                          'system.cpu.dist::0-1': 1.0}])
+        self.assertEqual(tailer.read(), [])
+
+        # The file is replaced
+        Path('test-stats.tmp').write_bytes(dump(sim_ticks=5))
+        os.replace('test-stats.tmp', self.path)
+        self.assertEqual(tailer.read()[0]['sim_ticks'], 5.0)
+
+    def test_tailer_names(self):
+        tailer = StatsTailer(self.path, ['sim_insts'])
+        self.append(dump(sim_ticks=1, sim_insts=2) + dump(sim_insts=3))
+        self.assertEqual(tailer.read(), [{'sim_insts': 2.0},
+                                         {'sim_insts': 3.0}])
+
+    def test_progress(self):
+        tracker = ProgressTracker(self.path, {'sim_insts': 1000})
+        self.assertFalse(tracker.update(0.0))
+        self.append(dump(sim_insts=100, host_inst_rate=50))
+        self.assertTrue(tracker.update(10.0))
+        self.assertIsNone(tracker.progress['eta'])
+
+        self.append(dump(sim_insts=300, host_inst_rate=50))
+        self.assertTrue(tracker.update(20.0))
+        progress = tracker.progress
+        self.assertEqual(progress['dumps'], 2)
+        self.assertEqual(progress['sim_insts_rate'], 20.0)
+        self.assertEqual(progress['sim_insts_fraction'], 0.3)
+        self.assertEqual(progress['eta'], 35.0)
+
+    def test_read_stats(self):
+        self.append(dump(sim_ticks=1) + dump(sim_ticks=2, sim_insts=3))
+        names, dumps = readStats(self.path)
+        self.assertEqual(names, ['sim_ticks', 'system.cpu.dist::0-1',
+                                 'sim_insts'])
+        self.assertEqual(dumps, [[1.0, 1.0, None], [2.0, 1.0, 3.0]])
+
+    def test_chunks(self):
+        tailer = StatsTailer(self.path)
+        many = {f'stat{i}': i for i in range(100)}
+        self.append(dump(**many) * 3)
+        with patch('gem5art.run._stats._CHUNK_SIZE', 100):
+            dumps = tailer.read()
+        self.assertEqual(len(dumps), 3)
+        self.assertEqual(dumps[2]['stat99'], 99.0)
+
+if __name__ == '__main__':
+    unittest.main()
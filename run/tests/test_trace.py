@@ -0,0 +1,103 @@
+# Copyright (c) 2021 The Regents of the University of California
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met: redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer;
+# redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution;
+# neither the name of the copyright holders nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests for capturing gem5's debug traces"""
+
+import gzip
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import unittest
+
+from gem5art.run import readTrace
+from gem5art.run._trace import TickWindow, TraceCapture
+
+def traceLines(ticks):
+    lines = []
+    for tick in ticks:
+        lines.append(f"{tick:7d}: system.cpu: T0 : 0x400 : mov\n".encode())
+        lines.append(b"    continued\n")
+    return lines
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.outdir = Path('test-trace')
+        os.makedirs(self.outdir, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir, ignore_errors=True)
+
+    def test_window(self):
+        window = TickWindow(1000, 3000)
+        lines = traceLines(range(0, 5000, 500))
+        kept = window.filter(b"".join(lines[:4]))
+        self.assertEqual(kept, b"")
+        kept += window.filter(b"".join(lines[4:10]))
+        kept += window.filter(b"".join(lines[10:]))
+        self.assertEqual(kept, b"".join(lines[4:12]))
+        self.assertTrue(window.done)
+
+    def test_capture(self):
+        lines = traceLines(range(0, 100000, 10))
+        with TraceCapture(self.outdir, start=10000, end=90000,
+                          chunk_bytes=64 * 1024) as capture:
+            self.assertTrue(capture.fifo.exists())
+            # Like gem5 with --debug-file=trace.fifo
+            with open(capture.fifo, 'wb') as fifo:
+                subprocess.run(['python3', '-c',
+                                'import sys; sys.stdout.buffer.write('
+                                'sys.stdin.buffer.read())'],
+                               input=b"".join(lines), stdout=fifo,
+                               check=True)
+        self.assertFalse(capture.fifo.exists())
+
+        expected = lines[2000:18000]
+        with gzip.open(self.outdir / 'trace.gz') as f:
+            self.assertEqual(f.read(), b"".join(expected))
+
+        summary = capture.summary()
+        self.assertEqual(summary['bytes'], len(b"".join(lines)))
+        self.assertEqual(summary['kept_bytes'], len(b"".join(expected)))
+        self.assertGreater(summary['chunks'], 1)
+        self.assertEqual(summary['first_tick'], 10000)
+        self.assertEqual(summary['last_tick'], 89990)
+        self.assertEqual(summary['error'], '')
+
+        window = list(readTrace(self.outdir / 'trace.gz', 50000, 50020))
+        self.assertEqual(window, lines[10000:10004])
+        self.assertEqual(list(readTrace(self.outdir / 'trace.gz')), expected)
+
+    def test_never_opened(self):
+        # gem5 failed before it opened the trace
+        with TraceCapture(self.outdir) as capture:
+            pass
+        self.assertEqual(capture.summary()['chunks'], 0)
+        self.assertEqual(list(readTrace(self.outdir / 'trace.gz')), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -25,35 +25,155 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from .celery import gem5app
+import asyncio
+from functools import partial
 import multiprocessing as mp
+import threading
 import time
 
 @gem5app.task(bind=True, serializer='pickle')
-def run_gem5_instance(self, gem5_run, cwd = '.'):
+def run_gem5_instance(self, gem5_run, cwd = '.', placement = None):
     """
     Runs a gem5 instance with the script and any parameters to the script.
     Note: this is "bound" which means self is the task that is running this.
+    placement is an optional placement policy (e.g., CorePlacement) which
+    chooses the CPU that gem5 runs on.
     """
 
-    gem5_run.run(self, cwd = cwd)
+    gem5_run.run(self, cwd = cwd, placement = placement)
 
-def run_single_job(run):
+def run_single_job(run, placement = None):
     start_time = time.time()
     print(f"Running {' '.join(run.command)} at {time.time()}")
-    run.run()
+    run.run(placement = placement)
     finish_time = time.time()
     print(f"Finished {' '.join(run.command)} at {time.time()}. Total time = {finish_time - start_time}")
 
-def run_job_pool(job_list, num_parallel_jobs = mp.cpu_count() // 2):
+def run_job_pool(job_list, num_parallel_jobs = mp.cpu_count() // 2,
+                 placement = None, admission = None):
     """
     Runs gem5 jobs in parallel when Celery is not used.
     Creates as many parallel jobs as core count if no explicit
     job count is provided
     Receives a list of run objects created by the launch script
+    placement is an optional placement policy (e.g., CorePlacement) which
+    chooses the CPU that each gem5 instance runs on.
+    admission is an optional MemoryAdmission. With it, at most
+    num_parallel_jobs jobs run at once and jobs are only started while
+    their estimated memory fits in its budget.
     """
 
     pool = mp.Pool(num_parallel_jobs)
-    pool.map(run_single_job, job_list)
+    if admission is None:
+        pool.map(partial(run_single_job, placement = placement), job_list)
+    else:
+        run_admitted_jobs(pool, job_list, num_parallel_jobs, placement,
+                          admission)
     pool.close()
     pool.join()
     print(f"All jobs done running!")
+
+def run_admitted_jobs(pool, job_list, num_parallel_jobs, placement,
+                      admission):
+    """
+    Starts the jobs in the pool when the admission admits them. The first
+    waiting job which fits in the memory budget is started, so small jobs
+    fill the memory which is left by large ones.
+    """
+    waiting = list(zip(job_list, admission.estimate(job_list)))
+    changed = threading.Condition()
+    results = []
+
+    def finished(estimate):
+        with changed:
+            admission.release(estimate)
+            changed.notify()
+
+    with changed:
+        while waiting:
+            i = None
+            if admission.running < num_parallel_jobs:
+                i = admission.pick([estimate for _, estimate in waiting])
+            if i is None:
+                changed.wait()
+                continue
+            run, estimate = waiting.pop(i)
+            admission.admit(estimate)
+            callback = partial(lambda estimate, _: finished(estimate), estimate)
+            results.append(pool.apply_async(
+                run_single_job, (run, placement),
+                callback = callback, error_callback = callback))
+
+    # Raise the errors of the jobs like pool.map
+    for result in results:
+        result.get()
+
+def run_async_job_pool(job_list, num_parallel_jobs = mp.cpu_count() // 2,
+                       cwd = '.', placement = None, admission = None):
+    """
+    Runs gem5 jobs in parallel from a single process with asyncio.
+    Unlike run_job_pool, there is no Python process per job: one event loop
+    supervises all of the running gem5 instances (see gem5Run.run_async)
+    and the finished runs are stored in the database in batches.
+    placement is an optional placement policy (e.g., CorePlacement).
+    admission is an optional MemoryAdmission (see run_job_pool).
+    Receives a list of run objects created by the launch script
+    """
+    from gem5art.run import MemoryAdmission, RunBatchWriter
+
+    if admission is None:
+        # Only limit the number of jobs
+        admission = MemoryAdmission(budget = 0)
+        estimates = [0] * len(job_list)
+    else:
+        estimates = admission.estimate(job_list)
+
+    async def run_all():
+        writer = RunBatchWriter()
+        changed = asyncio.Condition()
+
+        async def run_one(run, estimate):
+            try:
+                start_time = time.time()
+                print(f"Running {' '.join(run.command)} at {start_time}")
+                await run.run_async(cwd, writer, placement = placement)
+                finish_time = time.time()
+                print(f"Finished {' '.join(run.command)} at {finish_time}. "
+                      f"Total time = {finish_time - start_time}")
+            finally:
+                async with changed:
+                    admission.release(estimate)
+                    changed.notify()
+
+        waiting = list(zip(job_list, estimates))
+        started = []
+        tasks = []
+        try:
+            async with changed:
+                while waiting:
+                    i = None
+                    if admission.running < num_parallel_jobs:
+                        i = admission.pick(
+                            [estimate for _, estimate in waiting])
+                    if i is None:
+                        await changed.wait()
+                        continue
+                    run, estimate = waiting.pop(i)
+                    admission.admit(estimate)
+                    started.append(run)
+                    tasks.append(asyncio.ensure_future(run_one(run, estimate)))
+            # A failed run must not cancel (and kill) the other runs
+            results = await asyncio.gather(*tasks, return_exceptions = True)
+        finally:
+            await writer.flush()
+
+        # Raise the errors of the jobs like pool.map, once all are done
+        errors = [(run, result) for run, result in zip(started, results)
+                  if isinstance(result, BaseException)]
+        for run, error in errors:
+            print(f"Error running {' '.join(run.command)}: {error!r}")
+        if errors:
+            raise errors[0][1]
+
+    asyncio.run(run_all())
+    print(f"All jobs done running!")